@@ -31,18 +31,163 @@ def init_db():
         )
     """)
     
-    # Таблица чатов
+    # Таблица чатов: партиционирована по месяцам created_at
+    cur.execute("""
+        SELECT c.relkind FROM pg_class c
+        WHERE c.relname = 'user_chats' AND c.relnamespace = 'public'::regnamespace
+    """)
+    row = cur.fetchone()
+    legacy_chats = row is not None and row[0] == 'r'
+    if legacy_chats:
+        print("Migrating user_chats to monthly partitions...")
+        conn.autocommit = False
+        cur.execute("ALTER TABLE user_chats RENAME TO user_chats_unpartitioned")
+        cur.execute("ALTER TABLE user_chats_unpartitioned RENAME CONSTRAINT user_chats_pkey TO user_chats_unpartitioned_pkey")
+        # Имена индексов заняты старой таблицей — для копирования они не нужны
+        for index_name in ("idx_user_thread_created", "idx_user_thread_created_id",
+                           "ix_user_chats_user_id", "ix_user_chats_thread_id", "ix_user_chats_created_at"):
+            cur.execute(f"DROP INDEX IF EXISTS {index_name}")
+    
     cur.execute("""
         CREATE TABLE IF NOT EXISTS user_chats (
-            id uuid primary key default gen_random_uuid(),
+            id uuid not null default gen_random_uuid(),
             user_id varchar(255) not null,
             thread_id varchar(255) not null,
             role varchar(50) not null,
             content text not null,
             metadata jsonb,
-            created_at timestamp with time zone default now()
+            created_at timestamp with time zone not null default now(),
+            primary key (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    
+    # Архив холодных месяцев: одна строка на тред за месяц, сообщения — сжатый jsonb
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_chats_archive (
+            user_id varchar(255) not null,
+            thread_id varchar(255) not null,
+            month date not null,
+            message_count integer not null,
+            messages jsonb not null,
+            archived_at timestamp with time zone default now(),
+            primary key (user_id, thread_id, month)
         )
     """)
+    try:
+        cur.execute("ALTER TABLE user_chats_archive ALTER COLUMN messages SET COMPRESSION lz4")
+    except Exception:
+        pass  # PostgreSQL < 14 или сборка без lz4: остается pglz
+    
+    # Партиция месяца (создается заранее фоновой задачей rag_backend, см. database/partitions.py)
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION ensure_user_chats_partition(month date)
+        RETURNS text
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            start_at date := date_trunc('month', month)::date;
+            end_at date := (date_trunc('month', month) + interval '1 month')::date;
+            part_name text := 'user_chats_' || to_char(start_at, 'YYYY_MM');
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtext('user_chats_partitions'));
+            IF to_regclass(part_name) IS NULL THEN
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF user_chats FOR VALUES FROM (%L) TO (%L)',
+                    part_name, start_at::text || ' 00:00:00+00', end_at::text || ' 00:00:00+00'
+                );
+            END IF;
+            RETURN part_name;
+        END;
+        $$;
+    """)
+    # Перенос партиции месяца в user_chats_archive (отсоединение, агрегация по тредам, удаление)
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION archive_user_chats_partition(month date)
+        RETURNS integer
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            start_at date := date_trunc('month', month)::date;
+            part_name text := 'user_chats_' || to_char(start_at, 'YYYY_MM');
+            archived integer;
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtext('user_chats_partitions'));
+            IF to_regclass(part_name) IS NULL THEN
+                RETURN 0;
+            END IF;
+            EXECUTE format('ALTER TABLE user_chats DETACH PARTITION %I', part_name);
+            EXECUTE format($q$
+                INSERT INTO user_chats_archive (user_id, thread_id, month, message_count, messages)
+                SELECT user_id, thread_id, %L::date, count(*),
+                       jsonb_agg(jsonb_build_object(
+                           'id', id, 'role', role, 'content', content,
+                           'metadata', metadata, 'created_at', created_at
+                       ) ORDER BY created_at, id)
+                FROM %I
+                GROUP BY user_id, thread_id
+                ON CONFLICT (user_id, thread_id, month) DO UPDATE
+                SET messages = user_chats_archive.messages || excluded.messages,
+                    message_count = user_chats_archive.message_count + excluded.message_count,
+                    archived_at = now()
+            $q$, start_at, part_name);
+            GET DIAGNOSTICS archived = ROW_COUNT;
+            EXECUTE format('DROP TABLE %I', part_name);
+            RETURN archived;
+        END;
+        $$;
+    """)
+    
+    if legacy_chats:
+        cur.execute("""
+            SELECT ensure_user_chats_partition(month::date)
+            FROM (SELECT DISTINCT date_trunc('month', coalesce(created_at, now()) AT TIME ZONE 'UTC') AS month
+                  FROM user_chats_unpartitioned) months
+        """)
+        cur.execute("""
+            INSERT INTO user_chats (id, user_id, thread_id, role, content, metadata, created_at)
+            SELECT id, user_id, thread_id, role, content, metadata, coalesce(created_at, now())
+            FROM user_chats_unpartitioned
+        """)
+        cur.execute("DROP TABLE user_chats_unpartitioned")
+        conn.commit()
+        conn.autocommit = True
+    
+    # Текущий месяц и два следующих
+    cur.execute("""
+        SELECT ensure_user_chats_partition((date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => m))::date)
+        FROM generate_series(0, 2) AS m
+    """)
+    
+    # Индекс тредов (список тредов без агрегации по user_chats)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS chat_threads (
+            user_id varchar(255) not null,
+            thread_id varchar(255) not null,
+            first_message_at timestamp with time zone default now(),
+            last_message_at timestamp with time zone default now(),
+            message_count integer not null default 0,
+            preview text,
+            primary key (user_id, thread_id)
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_chat_threads_user_last ON chat_threads (user_id, last_message_at DESC)")
+    # Первичное заполнение из существующей истории
+    cur.execute("""
+        INSERT INTO chat_threads (user_id, thread_id, first_message_at, last_message_at, message_count, preview)
+        SELECT DISTINCT ON (user_id, thread_id)
+               user_id, thread_id,
+               min(created_at) OVER w, max(created_at) OVER w, count(*) OVER w,
+               left(content, 200)
+        FROM user_chats
+        WINDOW w AS (PARTITION BY user_id, thread_id)
+        ORDER BY user_id, thread_id, created_at DESC, id DESC
+        ON CONFLICT (user_id, thread_id) DO NOTHING
+    """)
+    # Keyset-пагинация истории по (created_at, id)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_user_thread_created_id
+        ON user_chats (user_id, thread_id, created_at DESC, id DESC)
+    """)
     
     # Таблица идей для доски
     cur.execute("""
@@ -58,6 +203,22 @@ def init_db():
         )
     """)
     
+    # Пагинация колонки доски по статусу и дельта-синхронизация по updated_at
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_board_ideas_status_created_id
+        ON board_ideas (status, created_at DESC, id DESC)
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_board_ideas_updated_at ON board_ideas (updated_at)")
+    # Удаленные идеи для /planner/ideas/changes (хранятся ограниченное время)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS board_idea_tombstones (
+            id uuid primary key,
+            status varchar(50),
+            deleted_at timestamp with time zone not null default now()
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_board_idea_tombstones_deleted_at ON board_idea_tombstones (deleted_at)")
+    
     # Таблица стратегии пользователя
     cur.execute("""
         CREATE TABLE IF NOT EXISTS user_strategy (
@@ -91,6 +252,112 @@ def init_db():
     except:
         pass
     
+    # created_at нужен графу знаний и статистике (модель KnowledgeBase его уже содержит)
+    cur.execute("ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS created_at timestamp with time zone default now()")
+    
+    # Источник и батч загрузки отдельными индексируемыми колонками: замена документа
+    # вставляет новый батч невидимым и атомарно переключает видимость (jobs/ingest.py)
+    cur.execute("ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS source varchar(1024)")
+    cur.execute("ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS batch_id varchar(64)")
+    cur.execute("ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS visible boolean not null default true")
+    cur.execute("""
+        UPDATE knowledge_base SET source = metadata->>'source'
+        WHERE source IS NULL AND metadata->>'source' IS NOT NULL
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_knowledge_base_source ON knowledge_base (source)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_knowledge_base_batch_id ON knowledge_base (batch_id)")
+    
+    # Сводная статистика по источникам (поддерживается загрузкой и удалением)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS knowledge_sources (
+            source varchar(1024) primary key,
+            chunks_count integer not null default 0,
+            token_count bigint not null default 0,
+            char_count bigint not null default 0,
+            first_ingested_at timestamp with time zone default now(),
+            last_ingested_at timestamp with time zone default now()
+        )
+    """)
+    # Первичное заполнение из уже загруженных чанков
+    cur.execute("""
+        INSERT INTO knowledge_sources (source, chunks_count, token_count, char_count, first_ingested_at, last_ingested_at)
+        SELECT metadata->>'source', count(*),
+               coalesce(sum((metadata->>'token_count')::bigint), 0),
+               coalesce(sum(length(content)), 0),
+               min(created_at), max(created_at)
+        FROM knowledge_base
+        WHERE metadata->>'source' IS NOT NULL
+        GROUP BY metadata->>'source'
+        ON CONFLICT (source) DO NOTHING
+    """)
+    
+    # Реестр загруженных файлов (дедупликация по хэшу и версии одноименных файлов)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS document_files (
+            sha256 varchar(64) primary key,
+            filename varchar(1024) not null,
+            version integer not null default 1,
+            path text not null,
+            size_bytes bigint not null,
+            ingest_job_id varchar(64),
+            uploaded_by varchar(255),
+            uploaded_at timestamp with time zone default now()
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_document_files_filename ON document_files (filename)")
+    # Одна версия имени — один файл. Дубли версий от старых параллельных загрузок
+    # перенумеровываются по времени загрузки (путь файла хранится отдельно и не меняется)
+    cur.execute("""
+        UPDATE document_files d
+        SET version = r.new_version
+        FROM (
+            SELECT sha256, row_number() OVER (PARTITION BY filename ORDER BY version, uploaded_at, sha256) AS new_version
+            FROM document_files
+            WHERE filename IN (
+                SELECT filename FROM document_files GROUP BY filename, version HAVING count(*) > 1
+            )
+        ) r
+        WHERE d.sha256 = r.sha256 AND d.version <> r.new_version
+    """)
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_document_files_filename_version
+        ON document_files (filename, version)
+    """)
+    
+    # Поколения кэшей: изменение данных увеличивает счетчик и шлет NOTIFY (см. database/invalidation.py)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS cache_generations (
+            namespace varchar(64) primary key,
+            generation bigint not null default 0,
+            updated_at timestamp with time zone default now()
+        )
+    """)
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION bump_cache_generation(ns text, item text default null)
+        RETURNS bigint
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            gen bigint;
+        BEGIN
+            INSERT INTO cache_generations (namespace, generation, updated_at)
+            VALUES (ns, 1, now())
+            ON CONFLICT (namespace) DO UPDATE
+            SET generation = cache_generations.generation + 1, updated_at = now()
+            RETURNING generation INTO gen;
+            PERFORM pg_notify('cache_invalidation', ns || ':' || gen || coalesce(':' || item, ''));
+            RETURN gen;
+        END;
+        $$;
+    """)
+    
+    # ANN-индекс для kNN-запросов поиска
+    print("Ensuring HNSW index on knowledge_base.embedding...")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS knowledge_base_embedding_hnsw
+        ON knowledge_base USING hnsw (embedding vector_cosine_ops)
+    """)
+    
     print("Creating match_documents function...")
     cur.execute("""
         CREATE OR REPLACE FUNCTION match_documents (
@@ -115,7 +382,8 @@ def init_db():
                 knowledge_base.metadata,
                 1 - (knowledge_base.embedding <=> query_embedding) AS similarity
             FROM knowledge_base
-            WHERE 1 - (knowledge_base.embedding <=> query_embedding) > match_threshold
+            WHERE knowledge_base.visible
+                AND 1 - (knowledge_base.embedding <=> query_embedding) > match_threshold
                 AND (
                     filter = '{}'::jsonb
                     OR knowledge_base.metadata @> filter
@@ -3,33 +3,43 @@ FastAPI dependencies для аутентификации и получения 
 """
 
 from fastapi import Header, HTTPException, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from utils.llm_factory import get_llm
 
-from database.connection import get_db
-from database.repositories import UserRepository
-from database.models import User
+from database.connection import get_async_db
+from database.async_repositories import AsyncUserRepository
+from utils.auth_cache import UserSnapshot, get_auth_cache
 from graph.graph import get_graph
 from config.settings import settings
 from utils.logger import logger
-from duckduckgo_search import DDGS
-import json
+
+
+# Ключ кэша для тестового пользователя режима разработки
+DEV_USER_CACHE_KEY = "__dev_test_user__"
 
 
 async def get_current_user(
     authorization: str = Header(None, description="Session token"),
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_async_db)
+) -> UserSnapshot:
     """
     Получить текущего пользователя по session token.
     В режиме разработки возвращает тестового пользователя, если токен не указан.
+    Результат (в том числе неверный токен) кэшируется с коротким TTL.
     """
+    auth_cache = get_auth_cache()
+    
     # Режим разработки: создаем/возвращаем тестового пользователя если токен пуст
     if not authorization and settings.environment == "development":
-        user_repo = UserRepository(db)
-        test_user = user_repo.get_by_username("test_user")
-        if not test_user:
-            test_user = user_repo.create("test_user")
+        found, test_user = auth_cache.get(DEV_USER_CACHE_KEY)
+        if found and test_user:
+            return test_user
+        user_repo = AsyncUserRepository(db)
+        user = await user_repo.get_by_username("test_user")
+        if not user:
+            user = await user_repo.create("test_user")
+        test_user = UserSnapshot.from_orm(user)
+        auth_cache.put(DEV_USER_CACHE_KEY, test_user)
         return test_user
 
     if not authorization or not authorization.startswith("Bearer "):
@@ -40,8 +50,15 @@ async def get_current_user(
     
     session_token = authorization.replace("Bearer ", "")
     
-    user_repo = UserRepository(db)
-    user = user_repo.get_by_session_token(session_token)
+    found, user = auth_cache.get(session_token)
+    if not found:
+        user_repo = AsyncUserRepository(db)
+        db_user = await user_repo.get_by_session_token(session_token)
+        if db_user:
+            user = UserSnapshot.from_orm(db_user)
+            auth_cache.put(session_token, user)
+        else:
+            auth_cache.put_invalid(session_token)
     
     if not user:
         logger.warning(f"Invalid session token: {session_token[:10]}...")
@@ -61,28 +78,3 @@ def get_compiled_graph():
         CompiledGraph: Граф
     """
     return get_graph()
-
-
-def search_web_tool(query: str, max_results: int = 5) -> str:
-    """
-    Инструмент для поиска в интернете через DuckDuckGo.
-    
-    Args:
-        query: Поисковый запрос
-        max_results: Количество результатов
-        
-    Returns:
-        str: Текстовое описание результатов (JSON)
-    """
-    logger.info(f"Searching web for: {query}")
-    results = []
-    try:
-        with DDGS() as ddgs:
-            ddgs_gen = ddgs.text(query, max_results=max_results)
-            for r in ddgs_gen:
-                results.append(r)
-        return json.dumps(results, ensure_ascii=False)
-    except Exception as e:
-        logger.error(f"Search error: {e}")
-        return "[]"
-
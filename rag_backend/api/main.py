@@ -3,35 +3,57 @@ FastAPI приложение для Agentic RAG системы.
 Endpoints: auth, chat (SSE streaming), knowledge base upload, history.
 """
 
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Query, Request, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
-from langchain_core.messages import HumanMessage
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from langchain_core.messages import HumanMessage, AIMessage
 from pathlib import Path
+from datetime import datetime, timedelta, timezone
+import hashlib
 import uuid
 import json
 import asyncio
-from typing import AsyncGenerator, List
+from typing import AsyncGenerator, Any, Dict, List
 
 from config.settings import settings
-from database.connection import get_db, get_vector_store
-from database.repositories import UserRepository, ChatRepository, KnowledgeRepository
-from database.models import User, UserChat, KnowledgeBase, BoardIdea, UserStrategy
+from database.connection import get_async_db, get_embeddings, AsyncSessionLocal, pool_metrics
+from database.async_repositories import (
+    AsyncUserRepository, AsyncChatRepository, AsyncKnowledgeRepository,
+    AsyncDocumentFileRepository, AsyncBoardRepository, AsyncStrategyRepository
+)
+from database.write_behind import get_chat_writer
+from database.partitions import get_partition_maintainer
+from database.invalidation import get_invalidation_bus
+from utils.auth_cache import UserSnapshot, get_auth_cache
+from database.models import UserChat, KnowledgeBase
 from api.schemas import (
-    LoginRequest, LoginResponse, ChatRequest, ChatHistoryResponse,
-    UploadResponse, KnowledgeBaseStats, ErrorResponse, ChatMessage,
-    EnhanceRequest, EnhanceResponse, TrendRequest, TrendResponse,
-    IdeaCreate, IdeaUpdate, BoardIdeaResponse, StrategyUpdate, StrategyResponse
+    LoginRequest, LoginResponse, ChatRequest, ChatHistoryResponse, ChatThreadsResponse, ChatThreadInfo,
+    IngestJobResponse, IngestJobStatus, KnowledgeBaseStats, ErrorResponse, ChatMessage,
+    EnhanceRequest, EnhanceResponse, BatchEnhanceRequest, TrendRequest, TrendResponse,
+    IdeaCreate, IdeaUpdate, BoardIdeaResponse, BoardChangesResponse, BoardOperation, BoardBulkRequest, BoardBulkResponse,
+    StrategyUpdate, StrategyResponse
 )
 from api.dependencies import get_current_user, get_compiled_graph
 from graph.graph import get_graph
 from graph.state import create_initial_state
 from utils.logger import logger
-from utils.document_loader import load_document, is_supported_format
+from utils.document_loader import is_supported_format
 from utils.monitoring import get_langfuse_callback
-from utils.chunking import chunk_document
+from utils.answer_cache import get_answer_cache, CachedAnswer
+from utils.deadline import DEADLINE_CONFIG_KEY, make_deadline
+from utils.knowledge_graph import get_graph_snapshot_cache
+from utils.sse import sse_stream, SSE_HEADERS
+from utils.pagination import encode_cursor, decode_cursor
+from utils.json_stream import parse_json_tolerant, fit_to_model
+from utils.llm_factory import OUTPUT_SCHEMA_CONFIG_KEY
+from tools.rag_retriever import QUERY_EMBEDDING_CONFIG_KEY
+from tools.trend_scout import get_trend_scout, DEFAULT_TOPIC
+from utils.file_storage import UploadTooLargeError, stream_upload_to_disk, versioned_path, commit_upload
+from jobs.store import IngestJob, get_job_store
+from jobs.worker import get_ingest_worker
 
 # Создаем FastAPI приложение
 app = FastAPI(
@@ -47,6 +69,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 # Монтируем статические файлы (frontend)
@@ -56,6 +79,29 @@ if frontend_path.exists():
     logger.info(f"Mounted frontend at /static from {frontend_path}")
 
 
+# === Lifecycle ===
+
+@app.on_event("startup")
+async def start_background_workers():
+    """Запустить фоновые обработчики: загрузку документов (с продолжением прерванных задач) и запись чата"""
+    # Слушатель инвалидации кэшей (изменения из других воркеров)
+    get_invalidation_bus().start()
+    await get_ingest_worker().start()
+    # Партиции user_chats должны существовать до первой записи чата
+    await get_partition_maintainer().start()
+    await get_chat_writer().start()
+
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    """Остановить фоновые обработчики"""
+    await get_ingest_worker().stop()
+    # Дописать в БД сообщения чата из очереди
+    await get_chat_writer().stop()
+    await get_partition_maintainer().stop()
+    await asyncio.to_thread(get_invalidation_bus().stop)
+
+
 # === Root Endpoint ===
 
 @app.get("/")
@@ -75,7 +121,7 @@ async def root():
 @app.post("/api/auth/login", response_model=LoginResponse)
 async def login(
     request: LoginRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Авторизация пользователя (простая session-based).
@@ -84,16 +130,16 @@ async def login(
     """
     logger.info(f"Login attempt: {request.username}")
     
-    user_repo = UserRepository(db)
+    user_repo = AsyncUserRepository(db)
     
     # Проверяем, существует ли пользователь
-    user = user_repo.get_by_username(request.username)
+    user = await user_repo.get_by_username(request.username)
     
     if user:
         logger.info(f"Existing user: {user.username}")
     else:
         # Создаем нового пользователя
-        user = user_repo.create(request.username)
+        user = await user_repo.create(request.username)
         logger.info(f"Created new user: {user.username}")
     
     return LoginResponse(
@@ -117,115 +163,250 @@ def map_board_idea(idea):
         "updated_at": idea.updated_at
     }
 
+def board_etag(*version: Any) -> str:
+    """Слабый ETag по версии доски и параметрам запроса"""
+    digest = hashlib.sha1(json.dumps(version, default=str).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Совпадает ли ETag с заголовком If-None-Match"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
 @app.get("/planner/ideas", response_model=List[BoardIdeaResponse])
-async def get_ideas(db: Session = Depends(get_db)):
-    """Получить все идеи с доски"""
-    ideas = db.query(BoardIdea).order_by(BoardIdea.created_at.desc()).all()
+async def get_ideas(
+    response: Response,
+    status: str | None = Query(None, description="Колонка доски"),
+    limit: int | None = Query(None, ge=1, le=settings.board_page_max_size),
+    cursor: str | None = None,
+    if_none_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Получить идеи с доски.
+    С limit — страница (колонки status) от новых к старым; курсор следующей
+    страницы в заголовке X-Next-Cursor. Ответ помечается ETag по версии доски
+    (число идей, max(updated_at), последнее удаление): при совпадении
+    If-None-Match возвращается 304 без чтения идей.
+    """
+    board_repo = AsyncBoardRepository(db)
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    version = await board_repo.board_version(status)
+    etag = board_etag(*version, status, limit, cursor)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
+    ideas = await board_repo.list_ideas(status=status, limit=limit, after=after)
+    if limit and len(ideas) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(ideas[-1].created_at, ideas[-1].id)
+    response.headers.update(headers)
     return [map_board_idea(idea) for idea in ideas]
 
+@app.get("/planner/ideas/changes", response_model=BoardChangesResponse)
+async def get_idea_changes(
+    since: datetime = Query(..., description="server_time из предыдущего ответа"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Изменения доски после since: созданные/измененные идеи и ID удаленных.
+    Следующий запрос передает server_time из ответа. Если since старше срока
+    хранения tombstones, возвращается reset=true — клиент перечитывает доску.
+    """
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # Перекрытие окна: транзакции, начатые до server_time и закоммиченные позже
+    overlap = timedelta(seconds=settings.board_changes_overlap_seconds)
+    ideas, deleted, server_time = await AsyncBoardRepository(db).changes_since(since - overlap)
+    
+    if since < server_time - timedelta(days=settings.board_tombstone_retention_days):
+        return BoardChangesResponse(ideas=[], deleted=[], server_time=server_time, reset=True)
+    
+    return BoardChangesResponse(
+        ideas=[map_board_idea(idea) for idea in ideas],
+        deleted=deleted,
+        server_time=server_time
+    )
+
 @app.post("/planner/ideas", response_model=BoardIdeaResponse)
-async def create_idea(request: IdeaCreate, db: Session = Depends(get_db)):
+async def create_idea(request: IdeaCreate, db: AsyncSession = Depends(get_async_db)):
     """Создать новую идею"""
-    new_idea = BoardIdea(
+    new_idea = await AsyncBoardRepository(db).create(
         title=request.title,
         content=request.content,
         status=request.status,
         cover_type=request.cover_type,
         extra_metadata=request.metadata
     )
-    db.add(new_idea)
-    db.commit()
-    db.refresh(new_idea)
     return map_board_idea(new_idea)
 
+def fold_board_operations(operations: List[BoardOperation]):
+    """
+    Свести пакет операций к создаваемым, изменяемым и удаляемым идеям
+    (последовательные изменения одной идеи объединяются по порядку).
+
+    Returns:
+        Tuple: (поля новых идей, ID -> изменяемые поля, ID удаляемых)
+    """
+    creates: Dict[uuid.UUID, Dict[str, Any]] = {}
+    updates: Dict[uuid.UUID, Dict[str, Any]] = {}
+    deletes: List[uuid.UUID] = []
+    
+    for operation in operations:
+        if operation.op == "create":
+            idea_id = operation.id or uuid.uuid4()
+            creates[idea_id] = {**operation.model_dump(exclude={"op"}), "id": idea_id}
+        elif operation.op == "delete":
+            if creates.pop(operation.id, None) is None and operation.id not in deletes:
+                deletes.append(operation.id)
+            updates.pop(operation.id, None)
+        elif operation.id in creates or operation.id not in deletes:
+            # После delete + create изменения относятся к новой идее
+            if operation.op == "move":
+                fields = {"status": operation.status}
+            else:
+                fields = operation.model_dump(exclude={"op", "id"}, exclude_unset=True)
+            if not fields:
+                continue
+            if operation.id in creates:
+                creates[operation.id].update(fields)
+            else:
+                updates.setdefault(operation.id, {}).update(fields)
+    
+    return list(creates.values()), updates, deletes
+
+@app.post("/planner/ideas/bulk", response_model=BoardBulkResponse)
+async def bulk_update_ideas(request: BoardBulkRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Пакет операций над доской (create, update, move, delete) одной транзакцией:
+    перенос нескольких карточек или заполнение доски — один запрос.
+    """
+    if len(request.operations) > settings.board_bulk_max_operations:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many operations (max {settings.board_bulk_max_operations})"
+        )
+    creates, updates, deletes = fold_board_operations(request.operations)
+    try:
+        ideas, deleted, not_found = await AsyncBoardRepository(db).bulk_apply(creates, updates, deletes)
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Idea with this id already exists")
+    
+    return BoardBulkResponse(
+        ideas=[map_board_idea(idea) for idea in ideas],
+        deleted=deleted,
+        not_found=not_found
+    )
+
 @app.patch("/planner/ideas/{idea_id}", response_model=BoardIdeaResponse)
-async def update_idea(idea_id: uuid.UUID, request: IdeaUpdate, db: Session = Depends(get_db)):
+async def update_idea(idea_id: uuid.UUID, request: IdeaUpdate, db: AsyncSession = Depends(get_async_db)):
     """Обновить существующую идею"""
-    idea = db.query(BoardIdea).filter(BoardIdea.id == idea_id).first()
+    board_repo = AsyncBoardRepository(db)
+    idea = await board_repo.get(idea_id)
     if not idea:
         raise HTTPException(status_code=404, detail="Idea not found")
     
-    update_data = request.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        if key == "metadata":
-            idea.extra_metadata = value
-        else:
-            setattr(idea, key, value)
-    
-    db.commit()
-    db.refresh(idea)
+    idea = await board_repo.update(idea, request.model_dump(exclude_unset=True))
     return map_board_idea(idea)
 
 @app.delete("/planner/ideas/{idea_id}")
-async def delete_idea(idea_id: uuid.UUID, db: Session = Depends(get_db)):
+async def delete_idea(idea_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """Удалить идею"""
-    idea = db.query(BoardIdea).filter(BoardIdea.id == idea_id).first()
+    board_repo = AsyncBoardRepository(db)
+    idea = await board_repo.get(idea_id)
     if not idea:
         raise HTTPException(status_code=404, detail="Idea not found")
     
-    db.delete(idea)
-    db.commit()
+    await board_repo.delete(idea)
     return {"status": "success", "message": "Idea deleted"}
 
 
 # === User Strategy Endpoints ===
 
 @app.get("/planner/strategy", response_model=StrategyResponse)
-async def get_strategy(db: Session = Depends(get_db)):
+async def get_strategy(db: AsyncSession = Depends(get_async_db)):
     """Получить стратегию пользователя (пока один профиль на всю систему)"""
-    strategy = db.query(UserStrategy).first()
-    if not strategy:
-        # Создаем пустую стратегию по умолчанию
-        strategy = UserStrategy(user_id="default")
-        db.add(strategy)
-        db.commit()
-        db.refresh(strategy)
-    return strategy
+    # Создаем пустую стратегию по умолчанию, если ее нет
+    return await AsyncStrategyRepository(db).get_or_create()
 
 @app.post("/planner/strategy", response_model=StrategyResponse)
-async def update_strategy(request: StrategyUpdate, db: Session = Depends(get_db)):
+async def update_strategy(request: StrategyUpdate, db: AsyncSession = Depends(get_async_db)):
     """Обновить стратегию"""
-    strategy = db.query(UserStrategy).first()
-    if not strategy:
-        strategy = UserStrategy(user_id="default")
-        db.add(strategy)
-    
-    update_data = request.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(strategy, key, value)
-    
-    db.commit()
-    db.refresh(strategy)
-    return strategy
+    # Кэши, зависящие от стратегии, сбрасываются во всех воркерах (поколение strategy)
+    return await AsyncStrategyRepository(db).update(request.model_dump(exclude_unset=True))
 
 
 # === Chat Endpoints ===
 
+async def embed_for_cache(query: str) -> List[float] | None:
+    """Эмбеддинг запроса для семантического кэша (None, если кэш выключен или недоступен)."""
+    if not settings.answer_cache_enabled:
+        return None
+    try:
+        return await asyncio.to_thread(get_embeddings().embed_query, query)
+    except Exception as e:
+        logger.warning(f"Answer cache embedding failed: {e}")
+        return None
+
+
+async def stream_cached_answer(entry: CachedAnswer, similarity: float) -> AsyncGenerator[Dict[str, Any], None]:
+    """События закэшированного ответа в том же формате, что и у графа."""
+    if entry.sources:
+        yield {"type": "sources", "sources": entry.sources}
+
+    for word in entry.answer.split():
+        yield {"type": "token", "content": word + " "}
+
+    yield {
+        "type": "done",
+        "metadata": {
+            "sources_count": len(entry.sources),
+            "cached": True,
+            "cache_similarity": round(similarity, 4)
+        }
+    }
+
+
 @app.post("/api/chat/stream")
 async def chat_stream(
     request: ChatRequest,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    http_request: Request,
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Отправить сообщение и получить ответ через SSE streaming.
+    Сообщения пишутся в БД отложенно (write-behind), без commit на пути ответа.
     """
     logger.info(f"Chat request from {user.username}: {request.message[:50]}...")
     
     # Генерируем thread_id если не указан
     thread_id = request.thread_id or str(uuid.uuid4())
+    chat_writer = get_chat_writer()
+    
+    # Загружаем историю чата (с учетом еще не записанных сообщений треда)
+    await chat_writer.barrier(str(user.id), thread_id)
+    history = await AsyncChatRepository(db).get_history(str(user.id), thread_id, limit=10)
     
-    # Сохраняем сообщение пользователя
-    chat_repo = ChatRepository(db)
-    chat_repo.add_message(
+    # Ставим сообщение пользователя в очередь записи
+    chat_writer.add(
         user_id=str(user.id),
         thread_id=thread_id,
         role="user",
         content=request.message
     )
     
-    # Создаем генератор для SSE
-    async def generate() -> AsyncGenerator[str, None]:
+    # Генератор событий (кадры SSE формирует sse_stream)
+    async def generate() -> AsyncGenerator[Dict[str, Any], None]:
         full_answer = ""
         try:
             logger.info("🚀 Starting chat with RAG system")
@@ -234,8 +415,6 @@ async def chat_stream(
             logger.info("📊 Loading LangGraph...")
             graph = get_graph()
             
-            # Загружаем историю чата
-            history = chat_repo.get_history(str(user.id), thread_id, limit=10)
             messages = []
             for msg in history:
                 if msg.role == "user":
@@ -247,24 +426,45 @@ async def chat_stream(
             messages.append(HumanMessage(content=request.message))
             logger.info(f"📝 Loaded {len(messages)} messages from history")
             
+            # Семантический кэш: только для первого вопроса в треде (ответ не зависит от истории)
+            answer_cache = get_answer_cache()
+            cache_scope = answer_cache.scope(request.persona)
+            cache_embedding = await embed_for_cache(request.message) if not history else None
+            cached = answer_cache.lookup(cache_embedding, cache_scope) if cache_embedding else None
+            if cached:
+                entry, similarity = cached
+                async for event in stream_cached_answer(entry, similarity):
+                    yield event
+                chat_writer.add(
+                    user_id=str(user.id),
+                    thread_id=thread_id,
+                    role="assistant",
+                    content=entry.answer,
+                    metadata={"sources": entry.sources, "cached": True}
+                )
+                return
+            
             # Создаем начальное состояние
             from graph.state import GraphState
             initial_state = GraphState(
                 messages=messages,
                 user_id=str(user.id),
-                thread_id=thread_id
+                thread_id=thread_id,
+                persona=request.persona,
+                run={}
             )
             
             # Конфигурация для checkpointer
             config = {
                 "configurable": {
-                    "thread_id": thread_id
+                    "thread_id": thread_id,
+                    DEADLINE_CONFIG_KEY: make_deadline(request.deadline_seconds)
                 }
             }
             
-            # Запускаем граф
+            # Запускаем граф (отменяется при отключении клиента)
             logger.info("🔄 Invoking graph...")
-            final_state = graph.invoke(initial_state, config)
+            final_state = await graph.ainvoke(initial_state, config)
             logger.info("✅ Graph completed successfully")
             
             # Получаем ответ
@@ -279,38 +479,29 @@ async def chat_stream(
             
             # Отправляем источники (если есть)
             sources = final_state.get("sources", [])
+            # В кэш — только ответ, сгенерированный в этом запуске (не fallback)
+            if cache_embedding and answer_messages and (final_state.get("run") or {}).get("answered"):
+                answer_cache.store(request.message, cache_embedding, cache_scope, full_answer, sources)
             if sources:
                 logger.info(f"📚 Found {len(sources)} sources")
-                sources_data = json.dumps({
-                    "type": "sources",
-                    "sources": sources
-                }, ensure_ascii=False)
-                yield f"data: {sources_data}\n\n"
+                yield {"type": "sources", "sources": sources}
             
-            # Отправляем ответ частями (эффект печати)
-            words = full_answer.split()
-            for i, word in enumerate(words):
-                chunk_data = json.dumps({
-                    "type": "token",
-                    "content": word + " "
-                }, ensure_ascii=False)
-                yield f"data: {chunk_data}\n\n"
-                
-                # Небольшая задержка
-                if i % 5 == 0:
-                    await asyncio.sleep(0.05)
+            # Отправляем ответ частями (sse_stream склеивает токены в кадры)
+            for word in full_answer.split():
+                yield {"type": "token", "content": word + " "}
             
             # Отправляем сигнал завершения
-            done_data = json.dumps({
+            yield {
                 "type": "done",
                 "metadata": {
-                    "sources_count": len(sources)
+                    "sources_count": len(sources),
+                    "prompt_cache": final_state.get("metadata", {}).get("prompt_cache"),
+                    "degradations": (final_state.get("run") or {}).get("degradations", [])
                 }
-            }, ensure_ascii=False)
-            yield f"data: {done_data}\n\n"
+            }
             
-            # Сохраняем ответ в БД
-            chat_repo.add_message(
+            # Ставим ответ в очередь записи
+            chat_writer.add(
                 user_id=str(user.id),
                 thread_id=thread_id,
                 role="assistant",
@@ -319,48 +510,43 @@ async def chat_stream(
                     "sources": sources
                 }
             )
-            logger.info("💾 Answer saved to database")
+            logger.info("💾 Answer queued for saving")
             
         except Exception as e:
             logger.error(f"❌ Chat stream error: {e}", exc_info=True)
-            error_data = json.dumps({
+            yield {
                 "type": "error",
                 "content": f"Произошла ошибка: {str(e)}"
-            }, ensure_ascii=False)
-            yield f"data: {error_data}\n\n"
-            
-            logger.info("Chat response completed")
-            
-        except Exception as e:
-            logger.error(f"Chat error: {e}")
-            error_data = json.dumps({
-                "type": "error",
-                "content": str(e)
-            })
-            yield f"data: {error_data}\n\n"
+            }
     
     return StreamingResponse(
-        generate(),
+        sse_stream(generate(), http_request),
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-        }
+        headers=SSE_HEADERS
     )
 
 
 # Тестовый эндпоинт БЕЗ авторизации для проверки RAG
 @app.post("/api/test-rag")
-async def test_rag(request: ChatRequest):
+async def test_rag(request: ChatRequest, http_request: Request):
     """
     Тестовый эндпоинт для проверки RAG без авторизации.
     """
     logger.info(f"🧪 Test RAG request: {request.message[:50]}...")
     
-    async def generate() -> AsyncGenerator[str, None]:
+    async def generate() -> AsyncGenerator[Dict[str, Any], None]:
         try:
             logger.info("🚀 Starting RAG test")
             
+            answer_cache = get_answer_cache()
+            cache_scope = answer_cache.scope(request.persona)
+            cache_embedding = await embed_for_cache(request.message)
+            cached = answer_cache.lookup(cache_embedding, cache_scope) if cache_embedding else None
+            if cached:
+                async for event in stream_cached_answer(*cached):
+                    yield event
+                return
+            
             # Получаем граф
             graph = get_graph()
             logger.info("📊 Graph loaded")
@@ -374,18 +560,23 @@ async def test_rag(request: ChatRequest):
             initial_state = GraphState(
                 messages=[HumanMessage(content=request.message)],
                 user_id="test_user",
-                thread_id="test_thread"
+                thread_id="test_thread",
+                persona=request.persona,
+                run={}
             )
             
             # Конфигурация с Langfuse
             config = {
-                "configurable": {"thread_id": "test"},
+                "configurable": {
+                    "thread_id": "test",
+                    DEADLINE_CONFIG_KEY: make_deadline(request.deadline_seconds)
+                },
                 "callbacks": [langfuse_cb] if langfuse_cb else []
             }
             
             # Запускаем граф
             logger.info("🔄 Invoking graph...")
-            final_state = graph.invoke(initial_state, config)
+            final_state = await graph.ainvoke(initial_state, config)
             logger.info("✅ Graph completed")
             
             # Получаем ответ
@@ -401,6 +592,9 @@ async def test_rag(request: ChatRequest):
             # Детальное логирование источников
             sources = final_state.get("sources", [])
             context = final_state.get("context", "")
+            # В кэш — только ответ, сгенерированный в этом запуске (не fallback)
+            if cache_embedding and answer_messages and (final_state.get("run") or {}).get("answered"):
+                answer_cache.store(request.message, cache_embedding, cache_scope, full_answer, sources)
             
             logger.info("=" * 80)
             logger.info("📊 RAG QUALITY REPORT:")
@@ -430,52 +624,80 @@ async def test_rag(request: ChatRequest):
             logger.info("=" * 80)
             
             # Отправляем ответ
-            words = full_answer.split()
-            for word in words:
-                chunk = json.dumps({"type": "token", "content": word + " "}, ensure_ascii=False)
-                yield f"data: {chunk}\n\n"
-                await asyncio.sleep(0.03)
+            for word in full_answer.split():
+                yield {"type": "token", "content": word + " "}
             
             # Отправляем метрики
-            metrics = {
+            yield {
                 "type": "done",
                 "sources_count": len(sources),
-                "avg_similarity": sum([s.get('similarity', 0.0) for s in sources if isinstance(s, dict)]) / len(sources) if sources else 0.0
+                "avg_similarity": sum([s.get('similarity', 0.0) for s in sources if isinstance(s, dict)]) / len(sources) if sources else 0.0,
+                "prompt_cache": final_state.get("metadata", {}).get("prompt_cache"),
+                "degradations": (final_state.get("run") or {}).get("degradations", [])
             }
-            yield f"data: {json.dumps(metrics, ensure_ascii=False)}\n\n"
             
         except Exception as e:
             logger.error(f"❌ Test RAG error: {e}", exc_info=True)
-            error = json.dumps({"type": "error", "content": str(e)}, ensure_ascii=False)
-            yield f"data: {error}\n\n"
+            yield {"type": "error", "content": str(e)}
     
-    return StreamingResponse(generate(), media_type="text/event-stream")
+    return StreamingResponse(
+        sse_stream(generate(), http_request),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
 
 
 
-@app.get("/api/chat/threads")
+@app.get("/api/chat/threads", response_model=ChatThreadsResponse)
 async def get_user_threads(
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    limit: int = Query(200, ge=1, le=1000),
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Получить все треды пользователя, отсортированные по дате"""
-    chat_repo = ChatRepository(db)
-    threads = chat_repo.get_all_threads(str(user.id))
-    return {"threads": threads}
+    """Получить треды пользователя, отсортированные по последнему сообщению"""
+    chat_repo = AsyncChatRepository(db)
+    threads = await chat_repo.list_threads(str(user.id), limit)
+    return ChatThreadsResponse(
+        threads=[thread.thread_id for thread in threads],
+        items=[
+            ChatThreadInfo(
+                thread_id=thread.thread_id,
+                last_message_at=thread.last_message_at,
+                message_count=thread.message_count,
+                preview=thread.preview
+            )
+            for thread in threads
+        ]
+    )
 
 
 @app.get("/api/chat/history", response_model=ChatHistoryResponse)
 async def get_chat_history(
     thread_id: str,
-    limit: int = 50,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = None,
+    consistent: bool = True,
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Получить историю чата"""
+    """
+    Получить историю чата.
+    Без cursor — последние limit сообщений; с cursor — более старые
+    (включая архивные месяцы из user_chats_archive).
+    consistent=True дожидается записи сообщений треда из очереди write-behind.
+    """
     logger.info(f"Get history: user={user.username}, thread={thread_id}")
     
-    chat_repo = ChatRepository(db)
-    history = chat_repo.get_history(str(user.id), thread_id, limit)
+    try:
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if consistent:
+        await get_chat_writer().barrier(str(user.id), thread_id)
+    
+    chat_repo = AsyncChatRepository(db)
+    history = await chat_repo.get_history(str(user.id), thread_id, limit, before)
     
     messages = [
         ChatMessage(
@@ -487,22 +709,32 @@ async def get_chat_history(
         for msg in history
     ]
     
+    # Самое старое сообщение страницы — ключ следующей страницы
+    next_cursor = encode_cursor(history[0].created_at, history[0].id) if len(history) == limit else None
+    
     return ChatHistoryResponse(
         messages=messages,
         total=len(messages),
-        thread_id=thread_id
+        thread_id=thread_id,
+        next_cursor=next_cursor
     )
 
 
 # === Knowledge Base Endpoints ===
 
-@app.post("/api/knowledge/upload", response_model=UploadResponse)
+@app.post("/api/knowledge/upload", response_model=IngestJobResponse)
 async def upload_document(
     file: UploadFile = File(...),
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Загрузить документ в базу знаний"""
+    """
+    Загрузить документ в базу знаний.
+    Файл пишется на диск потоково, повторная загрузка того же содержимого
+    не индексируется заново. Новая версия файла с тем же именем атомарно
+    заменяет предыдущую. Разбор, чанкинг и индексация выполняются в фоне;
+    прогресс — через /api/knowledge/jobs/{job_id}.
+    """
     logger.info(f"Upload document: {file.filename} by {user.username}")
     
     # Проверка формата
@@ -512,154 +744,284 @@ async def upload_document(
             detail=f"Unsupported file format. Supported: PDF, DOCX, TXT"
         )
     
-    # Сохраняем файл
-    upload_dir = Path("data/documents")
-    upload_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        stored = await stream_upload_to_disk(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     
-    file_path = upload_dir / file.filename
+    documents = AsyncDocumentFileRepository(db)
+    worker = get_ingest_worker()
     
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    job_id = uuid.uuid4().hex
+    existing = await documents.get_by_hash(stored.sha256)
+    if existing is None:
+        # Версия занимается строкой реестра (UNIQUE filename, version) до переноса файла:
+        # проигравшая гонку загрузка удаляет только свой временный файл
+        document, created = await documents.register_version(
+            stored.sha256,
+            file.filename,
+            lambda version: str(versioned_path(file.filename, version, stored.sha256)),
+            size_bytes=stored.size_bytes,
+            uploaded_by=user.username,
+            ingest_job_id=job_id
+        )
+        if created:
+            try:
+                commit_upload(stored, Path(document.path))
+            except OSError:
+                await documents.delete(document)
+                raise
+        else:
+            # Параллельная загрузка того же содержимого успела зарегистрироваться и ставит свою задачу
+            stored.temp_path.unlink(missing_ok=True)
+            logger.info(f"Concurrent duplicate upload of {document.filename} ({stored.sha256[:12]})")
+            return IngestJobResponse(
+                job_id=document.ingest_job_id,
+                status="queued",
+                filename=document.filename,
+                message="Document with identical content already uploaded",
+                sha256=document.sha256,
+                version=document.version,
+                duplicate=True
+            )
+    else:
+        stored.temp_path.unlink(missing_ok=True)
+        job = await asyncio.to_thread(get_job_store().get, existing.ingest_job_id) if existing.ingest_job_id else None
+        if job and job.status != "failed":
+            logger.info(f"Duplicate upload of {existing.filename} v{existing.version} ({stored.sha256[:12]})")
+            return IngestJobResponse(
+                job_id=job.id,
+                status=job.status,
+                filename=existing.filename,
+                message="Document with identical content already uploaded",
+                sha256=existing.sha256,
+                version=existing.version,
+                duplicate=True
+            )
+        # Предыдущая индексация не удалась — запускаем заново по сохраненному файлу
+        document = existing
     
-    logger.info(f"File saved: {file_path}")
+    logger.info(f"File saved: {document.path} ({stored.size_bytes} bytes, v{document.version})")
     
-    try:
-        # Загружаем и парсим документ
-        text, file_type = load_document(file_path)
-        
-        # Разбиваем на чанки
-        chunks = chunk_document(text, file.filename)
-        
-        # Сохраняем в векторную БД (параллельными батчами для скорости)
-        import asyncio
-        from functools import partial
-        
-        vector_store = get_vector_store()
-        
-        batch_size = 50
-        texts = [chunk["content"] for chunk in chunks]
-        metadatas = [chunk["metadata"] for chunk in chunks]
-        
-        tasks = []
-        loop = asyncio.get_event_loop()
-        
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i + batch_size]
-            batch_metadatas = metadatas[i:i + batch_size]
-            # Используем to_thread (Python 3.9+) или run_in_executor для параллельности
-            tasks.append(asyncio.to_thread(vector_store.add_texts, batch_texts, batch_metadatas))
-            logger.info(f"Scheduled batch {i//batch_size + 1}/{(len(texts)-1)//batch_size + 1}")
-        
-        # Выполняем все батчи параллельно
-        await asyncio.gather(*tasks)
-        
-        logger.info(f"Successfully added {len(chunks)} chunks to vector store total (via parallel processing)")
-        
-        return UploadResponse(
-            filename=file.filename,
-            chunks_count=len(chunks),
-            message=f"Document uploaded successfully: {len(chunks)} chunks created and indexed"
-        )
-        
-    except Exception as e:
-        logger.error(f"Upload error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    job = await worker.submit(IngestJob(
+        id=job_id,
+        filename=document.filename,
+        file_path=document.path,
+        source=document.filename,
+        metadata={"replace": document.version > 1}
+    ))
+    if document.ingest_job_id != job.id:
+        await documents.set_job(document, job.id)
+    
+    return IngestJobResponse(
+        job_id=job.id,
+        status=job.status,
+        filename=document.filename,
+        message="Document accepted for indexing",
+        sha256=document.sha256,
+        version=document.version
+    )
+
+
+@app.post("/api/knowledge/sources/{source:path}/reingest", response_model=IngestJobResponse)
+async def reingest_source(
+    source: str,
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Переиндексировать источник из последней сохраненной версии файла.
+    Новые чанки пишутся невидимыми и заменяют старые одной транзакцией:
+    поиск не остается без документа на время индексации.
+    """
+    documents = AsyncDocumentFileRepository(db)
+    document = await documents.get_latest(source)
+    if document is None:
+        raise HTTPException(status_code=404, detail="No stored file for this source")
+    
+    job = await get_ingest_worker().submit(IngestJob(
+        filename=document.filename,
+        file_path=document.path,
+        source=document.filename,
+        metadata={"replace": True}
+    ))
+    await documents.set_job(document, job.id)
+    logger.info(f"Reingest of '{source}' v{document.version} by {user.username}: job {job.id}")
+    
+    return IngestJobResponse(
+        job_id=job.id,
+        status=job.status,
+        filename=document.filename,
+        message="Source accepted for reindexing",
+        sha256=document.sha256,
+        version=document.version
+    )
+
+
+@app.get("/api/knowledge/jobs/{job_id}", response_model=IngestJobStatus)
+async def get_ingest_job(
+    job_id: str,
+    user: UserSnapshot = Depends(get_current_user)
+):
+    """Получить состояние задачи загрузки"""
+    job = await asyncio.to_thread(get_job_store().get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.get("/api/knowledge/jobs/{job_id}/events")
+async def stream_ingest_job(
+    job_id: str,
+    http_request: Request,
+    user: UserSnapshot = Depends(get_current_user)
+):
+    """Прогресс задачи загрузки через SSE (до завершения задачи)"""
+    store = get_job_store()
+    job = await asyncio.to_thread(store.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def generate() -> AsyncGenerator[Dict[str, Any], None]:
+        last_update = None
+        while True:
+            current = await asyncio.to_thread(store.get, job_id)
+            if current is None:
+                yield {"type": "error", "content": "Job not found"}
+                return
+            if current.updated_at != last_update:
+                last_update = current.updated_at
+                finished = current.status in ("done", "failed")
+                event_type = "progress" if not finished else ("done" if current.status == "done" else "error")
+                yield {"type": event_type, "job": current.to_dict()}
+                if finished:
+                    return
+            await asyncio.sleep(0.5)
+    
+    return StreamingResponse(
+        sse_stream(generate(), http_request),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
 
 
 @app.get("/api/knowledge/graph")
 async def get_knowledge_graph(
-    limit: int = 100,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1, le=settings.knowledge_graph_max_nodes),
+    neighbors: int = Query(settings.knowledge_graph_neighbors, ge=0, le=20),
+    offset: int = Query(0, ge=0),
+    page_size: int = Query(settings.knowledge_graph_page_size, ge=1, le=settings.knowledge_graph_max_nodes),
+    user: UserSnapshot = Depends(get_current_user)
 ):
     """
     Получить данные для 3D графа знаний.
-    Возвращает узлы (chunks) и связи (links).
+    Возвращает узлы (chunks) и связи (links) постранично из кэшированного снимка:
+    связи по источнику (соседние чанки) и семантические (pgvector kNN).
     """
     logger.info(f"Fetching knowledge graph for {user.username}")
     
-    # Получаем последние чанки
-    from database.connection import engine
-    from sqlalchemy import text
-    
-    sql = text("""
-        SELECT id, content, metadata
-        FROM knowledge_base
-        WHERE metadata->>'author' = 'Nikolay Velizhanin'
-        ORDER BY created_at DESC
-        LIMIT :limit
-    """)
-    
-    nodes = []
-    links = []
-    
     try:
-        with engine.connect() as conn:
-            result = conn.execute(sql, {"limit": limit})
-            rows = result.fetchall()
-            
-            for row in rows:
-                metadata = row[2] or {}
-                nodes.append({
-                    "id": str(row[0]),
-                    "name": metadata.get("source", "Chunk"),
-                    "val": 1,
-                    "content": row[1][:200] + "...",
-                    "color": "#4f46e5" if "vtt" in metadata.get("source", "") else "#10b981"
-                })
-            
-            # Создаем связи на основе общего источника (source)
-            # В будущем здесь можно добавить связи по семантике
-            for i in range(len(nodes)):
-                for j in range(i + 1, len(nodes)):
-                    if nodes[i]["name"] == nodes[j]["name"]:
-                        links.append({
-                            "source": nodes[i]["id"],
-                            "target": nodes[j]["id"]
-                        })
-                        
+        snapshot = await asyncio.to_thread(get_graph_snapshot_cache().get, limit, neighbors)
     except Exception as e:
         logger.error(f"Graph fetch error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
         
-    return {"nodes": nodes, "links": links}
+    return snapshot.page(offset, page_size)
 
 
 @app.get("/api/knowledge/stats", response_model=KnowledgeBaseStats)
 async def get_knowledge_stats(
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить статистику базы знаний"""
-    knowledge_repo = KnowledgeRepository(db)
-    
-    total_chunks = knowledge_repo.count_chunks()
-    sources = knowledge_repo.get_sources_list()
+    knowledge_repo = AsyncKnowledgeRepository(db)
     
-    documents = []
-    for source in sources:
-        chunks = knowledge_repo.get_by_source(source)
-        documents.append({
-            "source": source,
-            "chunks_count": len(chunks),
-            "created_at": chunks[0].created_at if chunks else None
-        })
+    # Сводная таблица поддерживается загрузкой/удалением; пока она пуста — один GROUP BY
+    documents = await knowledge_repo.get_source_stats()
+    if not documents:
+        documents = await knowledge_repo.aggregate_source_stats()
     
     return KnowledgeBaseStats(
-        total_chunks=total_chunks,
+        total_chunks=sum(doc["chunks_count"] for doc in documents),
         total_documents=len(documents),
+        total_tokens=sum(doc["token_count"] or 0 for doc in documents),
         documents=documents
     )
 
 
 # === Planner Endpoints ===
 
+def enhance_prompt(title: str, content: str | None, focus: str | None) -> str:
+    """Запрос к графу на улучшение идеи."""
+    return f"""Улучши эту идею:
+        Название: {title}
+        Контент: {content}
+        Фокус: {focus}"""
+
+
+def build_enhance_run(
+    user_id: str,
+    prompt_text: str,
+    persona: str | None,
+    strategy: str | None = None,
+    passport: str | None = None,
+    query_embedding: List[float] | None = None
+) -> tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Состояние и конфиг прогона графа для улучшения идеи.
+    Предзагруженные стратегия/паспорт и эмбеддинг запроса
+    избавляют узлы от повторной загрузки (пакетный режим).
+    """
+    initial_state = create_initial_state(
+        user_id=user_id,
+        thread_id=f"enhance_{uuid.uuid4()}",
+        messages=[HumanMessage(content=prompt_text)]
+    )
+    initial_state["persona"] = persona or "velizhanin"
+    initial_state["strategy"] = strategy
+    initial_state["summary"] = passport
+    # Узлы пропускают загрузку только для значений, переданных в этот запуск
+    initial_state["run"]["preloaded"] = [
+        key for key, value in (("strategy", strategy), ("summary", passport)) if value is not None
+    ]
+    
+    # Конфигурация с мониторингом; генератор сразу отвечает JSON по схеме EnhanceResponse
+    langfuse_cb = get_langfuse_callback(user_id=user_id, thread_id=initial_state["thread_id"])
+    configurable = {
+        "thread_id": initial_state["thread_id"],
+        DEADLINE_CONFIG_KEY: make_deadline(),
+        OUTPUT_SCHEMA_CONFIG_KEY: EnhanceResponse
+    }
+    if query_embedding is not None:
+        configurable[QUERY_EMBEDDING_CONFIG_KEY] = query_embedding
+    config = {
+        "configurable": configurable,
+        "callbacks": [langfuse_cb] if langfuse_cb else []
+    }
+    return initial_state, config
+
+
+def parse_enhance_answer(final_state: Dict[str, Any]) -> EnhanceResponse:
+    """
+    Толерантный разбор ответа генератора вместо повторного LLM-вызова на исправление формата.
+    
+    Raises:
+        ValueError: Если в ответе нет JSON-объекта
+    """
+    answer_messages = final_state.get("messages", [])
+    answer_text = answer_messages[-1].content if answer_messages else ""
+    try:
+        return fit_to_model(parse_json_tolerant(answer_text), EnhanceResponse)
+    except ValueError as e:
+        logger.error(f"Enhance output is not JSON: {e}. Answer: {answer_text[:200]}")
+        raise
+
+
 @app.post("/api/enhance-idea", response_model=EnhanceResponse)
 async def enhance_idea(
     request: EnhanceRequest,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: UserSnapshot = Depends(get_current_user)
 ):
     """
     Улучшить идею с помощью AI.
@@ -669,77 +1031,128 @@ async def enhance_idea(
 
     # Используем LangGraph для глубокого анализа с RAG
     try:
-        from langchain_openai import ChatOpenAI
-        from langchain_core.output_parsers import JsonOutputParser
-        from api.dependencies import get_compiled_graph
-        from graph.state import create_initial_state
-        
-        graph = get_compiled_graph()
-        
-        # Формируем запрос для графа
-        prompt_text = f"""Улучши эту идею:
-        Название: {request.title}
-        Контент: {request.content}
-        Фокус: {request.focus}"""
-        
-        # Создаем начальное состояние с указанной персоной
-        initial_state = create_initial_state(
-            user_id=str(user.id),
-            thread_id=f"enhance_{uuid.uuid4()}",
-            messages=[HumanMessage(content=prompt_text)]
+        graph = get_graph()
+        initial_state, config = build_enhance_run(
+            str(user.id),
+            enhance_prompt(request.title, request.content, request.focus),
+            request.persona
         )
-        initial_state["persona"] = request.persona or "velizhanin"
-        
-        # Конфигурация с мониторингом
-        langfuse_cb = get_langfuse_callback(user_id=str(user.id), thread_id=initial_state["thread_id"])
-        config = {
-            "configurable": {"thread_id": initial_state["thread_id"]},
-            "callbacks": [langfuse_cb] if langfuse_cb else []
-        }
         
         # Запускаем граф
         logger.info(f"Invoking RAG graph (persona: {initial_state['persona']}) with monitoring")
-        final_state = graph.invoke(initial_state, config)
+        final_state = await graph.ainvoke(initial_state, config)
+        
+    except Exception as e:
+        logger.error(f"Enhance error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    try:
+        return parse_enhance_answer(final_state)
+    except ValueError as e:
+        raise HTTPException(status_code=502, detail=f"Model returned malformed output: {e}")
+
+
+@app.post("/api/enhance-ideas/batch")
+async def enhance_ideas_batch(
+    request: BatchEnhanceRequest,
+    http_request: Request,
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Пакетно улучшить идеи доски (SSE).
+    Стратегия и паспорт загружаются один раз, эмбеддинги запросов считаются
+    одним вызовом, прогоны графа идут с ограниченной параллельностью.
+    События: result / item_error по мере готовности, затем done.
+    """
+    if len(request.idea_ids) > settings.enhance_batch_max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many ideas: {len(request.idea_ids)} > {settings.enhance_batch_max_items}"
+        )
+    
+    board_repo = AsyncBoardRepository(db)
+    ideas = await board_repo.get_many(request.idea_ids)
+    if not ideas:
+        raise HTTPException(status_code=404, detail="Ideas not found")
+    logger.info(f"Batch enhance for {user.username}: {len(ideas)} ideas")
+    
+    async def generate() -> AsyncGenerator[Dict[str, Any], None]:
+        from graph.nodes import load_strategy_context, load_book_passport
         
-        # Получаем ответ
-        answer_messages = final_state.get("messages", [])
-        answer_text = answer_messages[-1].content if answer_messages else ""
+        graph = get_graph()
+        prompts = [enhance_prompt(idea.title, idea.content, request.focus) for idea in ideas]
         
-        # Если ответ не в JSON (агент мог выдать текст), просим LLM привести его к схеме
-        # Но для начала попробуем распарсить напрямую
-        try:
-            import re
-            json_match = re.search(r"\{.*\}", answer_text, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group(0))
-        except:
-            pass
-            
-        # Fallback: Парсинг через промпт (если агент выдал просто текст)
-        from api.dependencies import get_llm
-        parser = JsonOutputParser(pydantic_object=EnhanceResponse)
-        llm = get_llm(temperature=0)
+        # Общие для всего пакета данные: стратегия, паспорт, эмбеддинги запросов
+        shared = await asyncio.gather(
+            asyncio.to_thread(load_strategy_context),
+            asyncio.to_thread(load_book_passport),
+            asyncio.to_thread(get_embeddings().embed_documents, prompts),
+            return_exceptions=True
+        )
+        strategy, passport, embeddings = [None if isinstance(item, Exception) else item for item in shared]
+        for name, item in zip(("strategy", "passport", "embeddings"), shared):
+            if isinstance(item, Exception):
+                logger.warning(f"Batch enhance: shared {name} load failed, nodes will load per idea: {item}")
         
-        correction_prompt = ChatPromptTemplate.from_messages([
-            ("system", "Convert the following AI assistant response into a valid JSON object according to the schema."),
-            ("user", "{text}\n\n{format_instructions}")
-        ])
+        semaphore = asyncio.Semaphore(settings.enhance_batch_concurrency)
         
-        correction_chain = correction_prompt | llm | parser
-        return correction_chain.invoke({
-            "text": answer_text,
-            "format_instructions": parser.get_format_instructions()
-        })
+        async def enhance_one(index: int) -> tuple[int, EnhanceResponse | None, str | None]:
+            async with semaphore:
+                try:
+                    initial_state, config = build_enhance_run(
+                        str(user.id),
+                        prompts[index],
+                        request.persona,
+                        strategy=strategy,
+                        passport=passport,
+                        query_embedding=embeddings[index] if embeddings else None
+                    )
+                    final_state = await graph.ainvoke(initial_state, config)
+                    return index, parse_enhance_answer(final_state), None
+                except Exception as e:
+                    logger.error(f"Batch enhance failed for idea {ideas[index].id}: {e}")
+                    return index, None, str(e)
         
-    except Exception as e:
-        logger.error(f"Enhance error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        tasks = [asyncio.create_task(enhance_one(i)) for i in range(len(ideas))]
+        succeeded = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                index, result, error = await finished
+                idea = ideas[index]
+                if result is None:
+                    yield {"type": "item_error", "idea_id": str(idea.id), "content": error}
+                    continue
+                succeeded += 1
+                if request.write_back:
+                    # Сессия запроса закрывается до начала стриминга — пишем в своей
+                    async with AsyncSessionLocal() as write_db:
+                        write_repo = AsyncBoardRepository(write_db)
+                        fresh = await write_repo.get(idea.id)
+                        if fresh is not None:
+                            metadata = dict(fresh.extra_metadata or {})
+                            metadata["enhanced"] = result.model_dump()
+                            await write_repo.update(fresh, {"metadata": metadata})
+                yield {"type": "result", "idea_id": str(idea.id), "result": result.model_dump()}
+        finally:
+            # Клиент отключился — отменяем оставшиеся прогоны
+            for task in tasks:
+                task.cancel()
+        
+        yield {"type": "done", "total": len(ideas), "succeeded": succeeded, "failed": len(ideas) - succeeded}
+    
+    return StreamingResponse(
+        sse_stream(generate(), http_request),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
 
 
 @app.post("/api/chat/stream")
 async def chat_stream(
     request: ChatRequest,
-    user: User = Depends(get_current_user)
+    http_request: Request,
+    user: UserSnapshot = Depends(get_current_user)
 ):
     """
     Стриминг чата через LangGraph.
@@ -757,84 +1170,108 @@ async def chat_stream(
         messages=[HumanMessage(content=request.message)]
     )
     
-    config = {"configurable": {"thread_id": initial_state["thread_id"]}}
+    config = {
+        "configurable": {
+            "thread_id": initial_state["thread_id"],
+            DEADLINE_CONFIG_KEY: make_deadline(request.deadline_seconds)
+        }
+    }
     
-    async def event_generator():
+    async def event_generator() -> AsyncGenerator[Dict[str, Any], None]:
         try:
             # Используем astream для получения событий в реальном времени
             async for event in graph.astream(initial_state, config, stream_mode="messages"):
                 # event - это кортеж (message, metadata) в некоторых версиях или просто message
                 # В текущей реализации LangGraph упростим до токенов
                 if hasattr(event[0], "content") and event[0].content:
-                    chunk = {"type": "token", "content": event[0].content}
-                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    yield {"type": "token", "content": event[0].content}
             
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
+            yield {"type": "done"}
         except Exception as e:
             logger.error(f"Stream error: {e}")
-            yield f"data: {json.dumps({'type': 'error', 'content': str(e)})}\n\n"
+            yield {"type": "error", "content": str(e)}
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return StreamingResponse(
+        sse_stream(event_generator(), http_request),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
 
 
 @app.post("/api/trend-ideas", response_model=TrendResponse)
 async def generate_trend_ideas(
     request: TrendRequest,
-    user: User = Depends(get_current_user)
+    user: UserSnapshot = Depends(get_current_user)
 ):
     """
     Найти трендовые идеи через веб-поиск и знания Велижанина.
     """
     logger.info(f"Trend scouting for {user.username} (Topic: {request.topic})")
     
-    from api.dependencies import search_web_tool, get_llm
-    from langchain_core.prompts import ChatPromptTemplate
-    from langchain_core.output_parsers import JsonOutputParser
-    
-    # 1. Поиск в интернете
-    topic_query = request.topic or "viral youtube shorts trends 2025"
+    topic_query = request.topic or DEFAULT_TOPIC
     try:
-        search_results = search_web_tool(f"trending YouTube Shorts topics 2025 {topic_query}")
-    except Exception as e:
-        logger.warning(f"Search tool failed: {e}. Using LLM internal knowledge.")
-        search_results = "Data unavailable, use your internal knowledge about 2025 trends."
-    
-    try:
-        # 2. Генерация идей на основе поиска
-        llm = get_llm(temperature=0.8)
-        
-        parser = JsonOutputParser(pydantic_object=TrendResponse)
-        
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """Ты - тренд-аналитик и ИИ-Продюсер. 
-Твоя задача: на основе свежих данных поиска предложить 3 самых горячих и виральных темы для коротких видео (Shorts/Reels).
-Темы должны быть в стиле 'Bento' или 'Nikolay Velizhanin' - четкие, бьющие в боли и обещающие результат.
-
-Формат ответа: JSON со списком 'ideas', где у каждой идеи есть 'title' (яркий заголовок) и 'description' (краткая суть).
-{format_instructions}"""),
-            ("user", "Тема пользователя: {topic}\nДанные из интернета: {search_results}")
-        ])
-        
-        chain = prompt | llm | parser
-        return chain.invoke({
-            "topic": topic_query,
-            "search_results": search_results,
-            "format_instructions": parser.get_format_instructions()
-        })
-        
+        return await get_trend_scout().scout(request.topic)
     except Exception as e:
         logger.error(f"Trend generation error: {e}")
-        # Fallback на старую логику если LLM/Parser упал
+        # Fallback на шаблонные идеи, если LLM/Parser упал (не кэшируется)
         return {
             "ideas": [
                 {"title": f"Тренд: {topic_query} в 2025", "description": "Как использовать ИИ для автоматизации этой сферы."},
-                {"title": "Секрет виральности в нише {topic_query}", "description": "Разбор структуры видео, которое набирает 100к+ просмотров."},
-                {"title": "Ошибка новичков в {topic_query}", "description": "Почему контент не заходит и как это исправить за 15 секунд."}
+                {"title": f"Секрет виральности в нише {topic_query}", "description": "Разбор структуры видео, которое набирает 100к+ просмотров."},
+                {"title": f"Ошибка новичков в {topic_query}", "description": "Почему контент не заходит и как это исправить за 15 секунд."}
             ]
         }
-    except Exception as e:
-        logger.error(f"Trend error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+
+
+# === Metrics ===
+
+@app.get("/api/metrics/prompt-cache")
+async def get_prompt_cache_metrics():
+    """Метрики переиспользования стабильного префикса промпта"""
+    from utils.prompt_layout import get_prefix_tracker
+    return get_prefix_tracker().stats()
+
+
+@app.get("/api/metrics/answer-cache")
+async def get_answer_cache_metrics():
+    """Метрики семантического кэша ответов"""
+    return get_answer_cache().stats()
+
+
+@app.get("/api/metrics/chat-writes")
+async def get_chat_write_metrics():
+    """Состояние очереди отложенной записи сообщений"""
+    return get_chat_writer().stats()
+
+
+@app.get("/api/metrics/chat-partitions")
+async def get_chat_partition_metrics():
+    """Партиции user_chats и результат последнего обслуживания"""
+    return await asyncio.to_thread(get_partition_maintainer().stats)
+
+
+@app.get("/api/metrics/cache-invalidation")
+async def get_cache_invalidation_metrics():
+    """Поколения кэшей и состояние слушателя LISTEN/NOTIFY"""
+    return get_invalidation_bus().stats()
+
+
+@app.get("/api/metrics/auth-cache")
+async def get_auth_cache_metrics():
+    """Статистика кэша аутентификации"""
+    return get_auth_cache().stats()
+
+
+@app.get("/api/metrics/db-pools")
+async def get_db_pool_metrics():
+    """Состояние пулов соединений PostgreSQL (занятые, overflow, ожидание)"""
+    return {"pools": pool_metrics()}
+
+
+@app.get("/api/metrics/trend-cache")
+async def get_trend_cache_metrics():
+    """Статистика кэшей поиска трендов"""
+    return get_trend_scout().stats()
 
 
 # === Health Check ===
@@ -2,9 +2,10 @@
 Pydantic схемы для валидации запросов и ответов API.
 """
 
-from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Dict, Any, Literal, Optional
 from datetime import datetime
+import uuid
 
 
 # === Auth Schemas ===
@@ -28,6 +29,8 @@ class ChatRequest(BaseModel):
     """Запрос на отправку сообщения"""
     message: str = Field(..., min_length=1, description="Сообщение пользователя")
     thread_id: Optional[str] = Field(None, description="ID треда (если не указан, создается новый)")
+    persona: Optional[str] = Field(None, description="Персона для фильтрации базы знаний (velizhanin, esther)")
+    deadline_seconds: Optional[float] = Field(None, gt=0, description="Бюджет времени на ответ (по умолчанию из настроек)")
 
 
 class ChatMessage(BaseModel):
@@ -43,6 +46,21 @@ class ChatHistoryResponse(BaseModel):
     messages: List[ChatMessage]
     total: int
     thread_id: str
+    next_cursor: Optional[str] = Field(None, description="Курсор для загрузки более старых сообщений")
+
+
+class ChatThreadInfo(BaseModel):
+    """Тред в списке тредов пользователя"""
+    thread_id: str
+    last_message_at: Optional[datetime] = None
+    message_count: int
+    preview: Optional[str] = None
+
+
+class ChatThreadsResponse(BaseModel):
+    """Список тредов пользователя"""
+    threads: List[str] = Field(..., description="ID тредов (от нового к старому)")
+    items: List[ChatThreadInfo]
 
 
 # === Knowledge Base Schemas ===
@@ -55,17 +73,46 @@ class UploadResponse(BaseModel):
     message: str
 
 
+class IngestJobResponse(BaseModel):
+    """Ответ на загрузку документа: задача поставлена в очередь"""
+    job_id: str
+    status: str
+    filename: str
+    message: str
+    sha256: Optional[str] = None
+    version: Optional[int] = None
+    duplicate: bool = Field(False, description="Такое содержимое уже загружалось — повторной индексации нет")
+
+
+class IngestJobStatus(BaseModel):
+    """Состояние задачи загрузки"""
+    id: str
+    filename: str
+    source: str
+    status: str = Field(..., description="queued, running, done, failed")
+    stage: Optional[str] = Field(None, description="parse, chunk, embed, store, publish")
+    total_chunks: int
+    stored_chunks: int
+    progress: float
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+
 class DocumentInfo(BaseModel):
     """Информация о документе"""
     source: str
     chunks_count: int
+    token_count: int = 0
     created_at: Optional[datetime] = None
+    last_ingested_at: Optional[datetime] = None
 
 
 class KnowledgeBaseStats(BaseModel):
     """Статистика базы знаний"""
     total_chunks: int
     total_documents: int
+    total_tokens: int = 0
     documents: List[DocumentInfo]
 
 
@@ -105,6 +152,13 @@ class EnhanceResponse(BaseModel):
     script_outline: str
     suggested_title: str
 
+class BatchEnhanceRequest(BaseModel):
+    """Запрос на пакетное улучшение идей доски"""
+    idea_ids: List[uuid.UUID] = Field(..., min_length=1, description="ID идей board_ideas")
+    focus: Optional[str] = "viral_shorts"
+    persona: Optional[str] = "velizhanin"
+    write_back: bool = Field(False, description="Сохранить результат в board_ideas.metadata.enhanced")
+
 class IdeaCandidate(BaseModel):
     """Кандидат на идею из трендов"""
     title: str
@@ -152,6 +206,47 @@ class BoardIdeaResponse(BaseModel):
         from_attributes = True
 
 
+class BoardOperation(BaseModel):
+    """Одна операция пакетного изменения доски"""
+    op: Literal["create", "update", "move", "delete"]
+    id: Optional[uuid.UUID] = Field(None, description="Обязателен для update/move/delete; для create — необязательный ID клиента")
+    title: Optional[str] = Field(None, min_length=1, max_length=255)
+    content: Optional[str] = None
+    status: Optional[str] = None
+    cover_type: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = None
+
+    @model_validator(mode="after")
+    def check_fields(self):
+        if self.op != "create" and self.id is None:
+            raise ValueError(f"'{self.op}' requires id")
+        if self.op == "create" and not self.title:
+            raise ValueError("'create' requires title")
+        if self.op == "move" and not self.status:
+            raise ValueError("'move' requires status")
+        return self
+
+
+class BoardBulkRequest(BaseModel):
+    """Пакет операций над доской (применяется одной транзакцией)"""
+    operations: List[BoardOperation] = Field(..., min_length=1)
+
+
+class BoardBulkResponse(BaseModel):
+    """Результат пакетного изменения доски"""
+    ideas: List[BoardIdeaResponse] = Field(default_factory=list, description="Созданные и измененные идеи")
+    deleted: List[uuid.UUID] = Field(default_factory=list)
+    not_found: List[uuid.UUID] = Field(default_factory=list, description="ID из update/move/delete, которых нет на доске")
+
+
+class BoardChangesResponse(BaseModel):
+    """Изменения доски с момента since"""
+    ideas: List[BoardIdeaResponse] = Field(default_factory=list, description="Созданные или измененные идеи")
+    deleted: List[uuid.UUID] = Field(default_factory=list, description="ID удаленных идей")
+    server_time: datetime = Field(..., description="Передать как since в следующем запросе")
+    reset: bool = Field(False, description="since слишком старый — перечитать доску целиком")
+
+
 # === Strategy Schemas ===
 
 class StrategyUpdate(BaseModel):
@@ -26,6 +26,19 @@ class Settings(BaseSettings):
     
     # PostgreSQL (долгосрочная память)
     postgres_db_url: str
+    postgres_async_db_url: Optional[str] = None  # По умолчанию выводится из postgres_db_url (asyncpg)
+    postgres_replica_url: Optional[str] = None  # Реплика для векторных запросов (по умолчанию — основная БД)
+    replica_max_lag_seconds: int = 30  # Столько после инвалидации кэши пересобираются по основной БД
+    
+    # Пулы соединений: OLTP (авторизация, чат, доска) и retrieval (ANN-запросы)
+    db_pool_pre_ping: bool = True
+    db_pool_recycle_seconds: int = 1800
+    oltp_pool_size: int = 5
+    oltp_max_overflow: int = 10
+    oltp_statement_timeout_ms: int = 15000  # 0 — без ограничения
+    retrieval_pool_size: int = 5
+    retrieval_max_overflow: int = 5
+    retrieval_statement_timeout_ms: int = 30000  # 0 — без ограничения
     
     # Langfuse (Мониторинг)
     langfuse_public_key: Optional[str] = None
@@ -45,14 +58,111 @@ class Settings(BaseSettings):
     ollama_embedding_model: str = "bge-m3"
     temperature: float = 0.7
     max_tokens: int = 2000
-    
+
+    # Настройки KV-кэша Ollama (переиспользование префикса промпта)
+    ollama_keep_alive: str = "30m"  # Сколько держать модель загруженной между запросами
+    ollama_num_ctx: Optional[int] = None  # Фиксированный размер контекста (смена num_ctx перезагружает модель)
+    prompt_prefix_tracker_size: int = 1024  # Сколько тредов отслеживать для метрик префикса
+
     # Настройки chunking
     chunk_size: int = 1000
     chunk_overlap: int = 200
+    chunk_size_unit: str = "chars"  # "chars" или "tokens" — в чем измеряются размер чанка и перекрытие
+    chunk_size_tokens: int = 350  # Размер чанка в токенах (режим tokens)
+    chunk_overlap_tokens: int = 70  # Перекрытие в токенах (режим tokens)
+    tokenizer_threads: int = 4  # Потоков tiktoken encode_batch при загрузке
+    token_count_batch_size: int = 64  # Чанков в одном encode_batch при потоковой разбивке
+    
+    # Кэш аутентификации по session token
+    auth_cache_ttl_seconds: int = 60
+    auth_negative_cache_ttl_seconds: int = 30  # Неверные токены (замедляет перебор)
+    auth_cache_max_entries: int = 10000
+    
+    # Межпроцессная инвалидация кэшей (LISTEN/NOTIFY)
+    cache_invalidation_enabled: bool = True  # Слушатель в каждом воркере
+    cache_invalidation_poll_seconds: float = 5.0  # Ожидание уведомлений / опрос без LISTEN
+    cache_invalidation_resync_seconds: float = 60.0  # Сверка поколений с таблицей (потерянные уведомления)
+    
+    # Отложенная (write-behind) запись сообщений чата
+    chat_write_flush_ms: int = 50  # Интервал сброса очереди сообщений в БД
+    chat_write_batch_size: int = 500  # Сообщений в одном multi-row INSERT
+    chat_write_max_retries: int = 5  # Попыток записи пакета, затем он уходит в dead-letter файл
+    chat_write_stop_timeout_seconds: float = 30.0  # Максимальное ожидание сброса очереди при остановке
+    chat_dead_letter_path: str = "data/chat_dead_letter.jsonl"  # Неудавшиеся пакеты сообщений (для ручного восстановления)
+    chat_partition_months_ahead: int = 2  # Партиции user_chats создаются заранее на N месяцев
+    chat_retention_months: int = 12  # Месяцы старше — в архив user_chats_archive (0 — не архивировать)
+    chat_history_window_months: int = 3  # Страница истории читает партиции за N месяцев до курсора; более старые — только если страница не заполнена
+    chat_partition_maintenance_hours: int = 6  # Период обслуживания партиций
+    
+    # Хранение загруженных файлов
+    documents_dir: str = "data/documents"
+    max_upload_size_mb: int = 200  # Больше — 413
+    upload_chunk_size: int = 1024 * 1024  # Размер блока потоковой записи на диск
+    
+    # Фоновая загрузка документов (очередь задач)
+    ingest_jobs_dir: str = "data/jobs"  # Промежуточные артефакты задач (чанки) для возобновления
+    ingest_jobs_db_path: str = "data/jobs/jobs.sqlite3"  # SQLite-хранилище задач (если нет Redis)
+    ingest_workers: int = 2  # Сколько задач обрабатывается одновременно
+    ingest_job_concurrency: int = 4  # Параллельных батчей эмбеддинга внутри одной задачи
+    ingest_batch_size: int = 50
+    ingest_job_lease_seconds: int = 60  # Аренда задачи процессом; продлевается каждые lease/3 секунд
+    pdf_parallel_extraction: bool = True  # Извлекать текст PDF пулом процессов
+    pdf_extract_workers: int = 4  # Процессов извлечения на один документ
+    pdf_pages_per_task: int = 16  # Страниц в одной задаче процесса
+    pdf_parallel_min_pages: int = 48  # Файлы короче извлекаются последовательно
+    redis_url: Optional[str] = None  # redis://redis:6379/0 — хранить задачи в Redis из docker-compose
+    
+    # SSE-стриминг
+    sse_flush_interval_ms: int = 50  # Токены копятся в один кадр не дольше этого интервала
+    sse_flush_bytes: int = 1024  # ...или пока не наберется столько байт
+    sse_heartbeat_seconds: float = 15.0  # Комментарий-пинг при простое (не дает прокси закрыть соединение)
+    sse_disconnect_check_seconds: float = 1.0  # Как часто проверять, что клиент еще подключен
     
     # Настройки RAG
     top_k_results: int = 20  # Количество релевантных чанков для поиска
     similarity_threshold: float = 0.45  # Минимальная схожесть для включения в контекст
+
+    # Граф знаний (/api/knowledge/graph)
+    knowledge_graph_max_nodes: int = 2000  # Верхняя граница limit
+    knowledge_graph_neighbors: int = 5  # Семантических соседей (kNN) на узел
+    knowledge_graph_page_size: int = 500  # Узлов на страницу ответа
+    knowledge_graph_cache_ttl_seconds: int = 300
+    knowledge_graph_cache_max_entries: int = 32  # Снимков в кэше (по одному на limit/neighbors/author)
+
+    # Бюджет времени запроса и политика деградации
+    request_deadline_seconds: float = 60.0  # Бюджет на весь прогон графа
+    degrade_router_below_seconds: float = 50.0  # Пропустить LLM-классификацию намерения
+    degrade_chapter_extraction_below_seconds: float = 45.0  # Пропустить LLM-извлечение главы
+    degrade_top_k_below_seconds: float = 35.0  # Уменьшить top_k
+    degraded_top_k: int = 5
+    degrade_passport_below_seconds: float = 30.0  # Не загружать паспорт книги
+    degrade_model_below_seconds: float = 20.0  # Генерировать быстрой моделью
+    ollama_fast_model: str = "llama3.2:3b"
+    fast_llm_model: str = "gpt-4o-mini"
+
+    # Семантический кэш ответов
+    answer_cache_enabled: bool = True
+    answer_cache_similarity_threshold: float = 0.92  # Косинусная близость для попадания в кэш
+    answer_cache_max_entries_per_scope: int = 256  # LRU-лимит на (персона, стратегия, корпус)
+    answer_cache_max_scopes: int = 32
+    answer_cache_ttl_seconds: int = 3600
+    
+    # Пакетное улучшение идей
+    enhance_batch_concurrency: int = 3  # Одновременных прогонов графа в пакете
+    enhance_batch_max_items: int = 100
+    
+    # Доска планирования
+    board_page_max_size: int = 500  # Максимальный limit страницы /planner/ideas
+    board_tombstone_retention_days: int = 30  # Срок хранения отметок об удалении идей
+    board_changes_overlap_seconds: int = 5  # Перекрытие окна /planner/ideas/changes
+    board_bulk_max_operations: int = 1000  # Операций в одном /planner/ideas/bulk
+    
+    # Поиск трендов
+    search_provider: str = "duckduckgo"  # duckduckgo или static (офлайн-заглушка для тестов)
+    search_max_results: int = 5
+    trend_search_cache_ttl_seconds: int = 3600  # Результаты поиска по нормализованной теме
+    trend_ideas_cache_ttl_seconds: int = 1800  # Сгенерированные идеи по нормализованной теме
+    trend_cache_max_entries: int = 256
     
     # Настройки API
     api_host: str = "0.0.0.0"
@@ -0,0 +1,824 @@
+"""
+Асинхронные репозитории для работы с базой данных.
+Повторяют API синхронных репозиториев поверх AsyncSession,
+чтобы async-обработчики FastAPI не блокировали event loop.
+"""
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import select, insert, update, delete, desc, func, tuple_, values, column, BigInteger
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Dict, Any, Tuple
+import secrets
+import uuid
+
+from config.settings import settings
+from database.repositories import (
+    thread_index_upsert, thread_partition_bound, history_window_bound,
+    archived_history_query, unpack_archived_messages
+)
+from database.invalidation import AUTH, CORPUS, STRATEGY, generation_statement, get_invalidation_bus
+from database.models import (
+    User, UserChat, UserChatArchive, ChatThread, KnowledgeBase, KnowledgeSource, DocumentFile,
+    BoardIdea, BoardIdeaTombstone, UserStrategy
+)
+
+
+class AsyncUserRepository:
+    """Асинхронный репозиторий для работы с пользователями"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_by_username(self, username: str) -> Optional[User]:
+        """
+        Получить пользователя по username.
+
+        Args:
+            username: Имя пользователя
+
+        Returns:
+            User или None
+        """
+        result = await self.db.execute(select(User).where(User.username == username))
+        return result.scalars().first()
+
+    async def get_by_session_token(self, session_token: str) -> Optional[User]:
+        """
+        Получить пользователя по session token.
+
+        Args:
+            session_token: Токен сессии
+
+        Returns:
+            User или None
+        """
+        result = await self.db.execute(select(User).where(User.session_token == session_token))
+        return result.scalars().first()
+
+    async def create(self, username: str) -> User:
+        """
+        Создать нового пользователя.
+
+        Args:
+            username: Имя пользователя
+
+        Returns:
+            User: Созданный пользователь
+        """
+        user = User(
+            username=username,
+            session_token=secrets.token_urlsafe(32)
+        )
+
+        self.db.add(user)
+        await self.db.commit()
+        await self.db.refresh(user)
+
+        return user
+
+    async def update_session_token(self, user: User) -> User:
+        """
+        Обновить session token пользователя.
+
+        Args:
+            user: Пользователь
+
+        Returns:
+            User: Обновленный пользователь
+        """
+        old_token = user.session_token
+        user.session_token = secrets.token_urlsafe(32)
+        # Старый токен сбрасывается в кэшах всех воркеров (NOTIFY после commit)
+        generation = (await self.db.execute(generation_statement(AUTH, old_token))).scalar() if old_token else None
+        await self.db.commit()
+        await self.db.refresh(user)
+        if generation is not None:
+            get_invalidation_bus().apply(AUTH, generation, old_token)
+
+        return user
+
+
+class AsyncChatRepository:
+    """Асинхронный репозиторий для работы с историей чатов"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def add_message(
+        self,
+        user_id: str,
+        thread_id: str,
+        role: str,
+        content: str,
+        metadata: Optional[dict] = None
+    ) -> UserChat:
+        """
+        Добавить сообщение в историю чата.
+
+        Args:
+            user_id: ID пользователя
+            thread_id: ID треда (сессии)
+            role: Роль ('user' или 'assistant')
+            content: Содержимое сообщения
+            metadata: Дополнительные метаданные
+
+        Returns:
+            UserChat: Созданное сообщение
+        """
+        message = UserChat(
+            user_id=user_id,
+            thread_id=thread_id,
+            role=role,
+            content=content,
+            extra_metadata=metadata or {}
+        )
+
+        self.db.add(message)
+        await self.db.execute(thread_index_upsert(user_id, thread_id, content))
+        await self.db.commit()
+        await self.db.refresh(message)
+
+        return message
+
+    async def get_history(
+        self,
+        user_id: str,
+        thread_id: str,
+        limit: int = 10,
+        before: Optional[Tuple[datetime, uuid.UUID]] = None
+    ) -> List[UserChat]:
+        """
+        Получить историю чата (keyset-пагинация по (created_at, id)).
+        Читаются партиции за chat_history_window_months до курсора; если страница
+        не заполнена — более ранние партиции треда и архив user_chats_archive.
+
+        Args:
+            user_id: ID пользователя
+            thread_id: ID треда
+            limit: Максимальное количество сообщений
+            before: Ключ (created_at, id) — вернуть сообщения старше него
+
+        Returns:
+            List[UserChat]: Список сообщений (от старых к новым)
+        """
+        window_start = history_window_bound(user_id, thread_id, before[0] if before else None)
+        messages = await self._history_page(user_id, thread_id, before, limit, UserChat.created_at >= window_start)
+        if len(messages) < limit:
+            # Тред старше окна: дочитываем более ранние партиции
+            messages += await self._history_page(
+                user_id, thread_id, before, limit - len(messages),
+                UserChat.created_at >= thread_partition_bound(user_id, thread_id),
+                UserChat.created_at < window_start
+            )
+        if len(messages) < limit and settings.chat_retention_months > 0:
+            result = await self.db.execute(archived_history_query(user_id, thread_id, before[0] if before else None))
+            messages += unpack_archived_messages(result.scalars().all(), before, limit - len(messages))
+
+        # Возвращаем в хронологическом порядке (от старых к новым)
+        return list(reversed(messages))
+
+    async def _history_page(self, user_id: str, thread_id: str, before, limit: int, *bounds) -> List[UserChat]:
+        query = select(UserChat).where(
+            UserChat.user_id == user_id,
+            UserChat.thread_id == thread_id,
+            *bounds
+        )
+        if before is not None:
+            query = query.where(tuple_(UserChat.created_at, UserChat.id) < tuple_(*before))
+        result = await self.db.execute(
+            query
+            .order_by(desc(UserChat.created_at), desc(UserChat.id))
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def get_all_threads(self, user_id: str) -> List[str]:
+        """
+        Получить все thread_id пользователя, отсортированные по последнему сообщению.
+
+        Args:
+            user_id: ID пользователя
+
+        Returns:
+            List[str]: Список thread_id (от нового к старому)
+        """
+        return [thread.thread_id for thread in await self.list_threads(user_id)]
+
+    async def list_threads(self, user_id: str, limit: Optional[int] = None) -> List[ChatThread]:
+        """
+        Получить треды пользователя из индекса chat_threads.
+
+        Args:
+            user_id: ID пользователя
+            limit: Максимальное количество тредов
+
+        Returns:
+            List[ChatThread]: Треды (от нового к старому)
+        """
+        query = (
+            select(ChatThread)
+            .where(ChatThread.user_id == user_id)
+            .order_by(desc(ChatThread.last_message_at))
+        )
+        if limit:
+            query = query.limit(limit)
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
+
+    async def delete_thread(self, user_id: str, thread_id: str) -> int:
+        """
+        Удалить всю историю треда.
+
+        Args:
+            user_id: ID пользователя
+            thread_id: ID треда
+
+        Returns:
+            int: Количество удаленных сообщений
+        """
+        result = await self.db.execute(
+            delete(UserChat).where(
+                UserChat.user_id == user_id,
+                UserChat.thread_id == thread_id,
+                UserChat.created_at >= thread_partition_bound(user_id, thread_id)
+            )
+        )
+        await self.db.execute(
+            delete(UserChatArchive).where(
+                UserChatArchive.user_id == user_id,
+                UserChatArchive.thread_id == thread_id
+            )
+        )
+        await self.db.execute(
+            delete(ChatThread).where(
+                ChatThread.user_id == user_id,
+                ChatThread.thread_id == thread_id
+            )
+        )
+
+        await self.db.commit()
+        return result.rowcount
+
+
+class AsyncKnowledgeRepository:
+    """Асинхронный репозиторий для работы с базой знаний"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_by_source(self, source: str) -> List[KnowledgeBase]:
+        """
+        Получить все чанки из определенного источника.
+
+        Args:
+            source: Название источника (например, "book.pdf")
+
+        Returns:
+            List[KnowledgeBase]: Список чанков
+        """
+        result = await self.db.execute(
+            select(KnowledgeBase)
+            .where(KnowledgeBase.source == source, KnowledgeBase.visible)
+        )
+        return list(result.scalars().all())
+
+    async def delete_by_source(self, source: str) -> int:
+        """
+        Удалить все чанки из определенного источника.
+
+        Args:
+            source: Название источника
+
+        Returns:
+            int: Количество удаленных чанков
+        """
+        result = await self.db.execute(
+            delete(KnowledgeBase)
+            .where(KnowledgeBase.source == source)
+        )
+        await self.db.execute(delete(KnowledgeSource).where(KnowledgeSource.source == source))
+        generation = (await self.db.execute(generation_statement(CORPUS))).scalar()
+
+        await self.db.commit()
+        get_invalidation_bus().apply(CORPUS, generation)
+        return result.rowcount
+
+    async def get_sources_list(self) -> List[str]:
+        """
+        Получить список всех уникальных источников.
+
+        Returns:
+            List[str]: Список названий источников
+        """
+        result = await self.db.execute(
+            select(KnowledgeBase.source).where(KnowledgeBase.visible).distinct()
+        )
+
+        return [source for source in result.scalars().all() if source]
+
+    async def count_chunks(self) -> int:
+        """
+        Подсчитать общее количество чанков в базе знаний.
+
+        Returns:
+            int: Количество чанков
+        """
+        result = await self.db.execute(select(func.count()).select_from(KnowledgeBase))
+        return result.scalar_one()
+
+    async def get_source_stats(self) -> List[Dict[str, Any]]:
+        """
+        Статистика по источникам из сводной таблицы knowledge_sources.
+
+        Returns:
+            List[Dict[str, Any]]: source, chunks_count, token_count, created_at, last_ingested_at
+        """
+        result = await self.db.execute(
+            select(KnowledgeSource).order_by(KnowledgeSource.last_ingested_at.desc())
+        )
+        return [
+            {
+                "source": row.source,
+                "chunks_count": row.chunks_count,
+                "token_count": row.token_count,
+                "created_at": row.first_ingested_at,
+                "last_ingested_at": row.last_ingested_at
+            }
+            for row in result.scalars().all()
+        ]
+
+    async def aggregate_source_stats(self) -> List[Dict[str, Any]]:
+        """
+        Статистика по источникам одним GROUP BY по knowledge_base
+        (fallback, пока сводная таблица не заполнена).
+
+        Returns:
+            List[Dict[str, Any]]: Формат как у get_source_stats
+        """
+        source_col = KnowledgeBase.source
+        result = await self.db.execute(
+            select(
+                source_col,
+                func.count(),
+                func.coalesce(func.sum(KnowledgeBase.extra_metadata["token_count"].astext.cast(BigInteger)), 0),
+                func.min(KnowledgeBase.created_at),
+                func.max(KnowledgeBase.created_at)
+            )
+            .where(source_col.isnot(None), KnowledgeBase.visible)
+            .group_by(source_col)
+            .order_by(func.max(KnowledgeBase.created_at).desc())
+        )
+        return [
+            {
+                "source": row[0],
+                "chunks_count": row[1],
+                "token_count": row[2],
+                "created_at": row[3],
+                "last_ingested_at": row[4]
+            }
+            for row in result.all()
+        ]
+
+
+class AsyncDocumentFileRepository:
+    """Асинхронный репозиторий реестра загруженных файлов"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_by_hash(self, sha256: str) -> Optional[DocumentFile]:
+        """
+        Найти файл по хэшу содержимого.
+
+        Args:
+            sha256: SHA-256 содержимого
+
+        Returns:
+            DocumentFile или None
+        """
+        return await self.db.get(DocumentFile, sha256)
+
+    async def next_version(self, filename: str) -> int:
+        """
+        Номер следующей версии для имени файла.
+
+        Args:
+            filename: Имя файла
+
+        Returns:
+            int: Версия (с 1)
+        """
+        result = await self.db.execute(
+            select(func.coalesce(func.max(DocumentFile.version), 0))
+            .where(DocumentFile.filename == filename)
+        )
+        return result.scalar_one() + 1
+
+    async def create(self, **fields: Any) -> DocumentFile:
+        """
+        Зарегистрировать файл.
+
+        Args:
+            fields: Поля модели DocumentFile
+
+        Returns:
+            DocumentFile: Созданная запись
+        """
+        document = DocumentFile(**fields)
+        self.db.add(document)
+        await self.db.commit()
+        return document
+
+    async def register_version(
+        self,
+        sha256: str,
+        filename: str,
+        path_for: Callable[[int], str],
+        attempts: int = 5,
+        **fields: Any
+    ) -> Tuple[DocumentFile, bool]:
+        """
+        Зарегистрировать файл под следующей свободной версией имени.
+        Конкурирующая загрузка с тем же именем получает ту же версию и упирается
+        в UNIQUE (filename, version) — тогда версия выделяется заново.
+
+        Args:
+            sha256: SHA-256 содержимого
+            filename: Имя файла
+            path_for: Путь хранения для номера версии
+            attempts: Попыток выделить версию
+            fields: Остальные поля модели DocumentFile
+
+        Returns:
+            Tuple[DocumentFile, bool]: (запись, создана ли она этим вызовом;
+            False — то же содержимое уже зарегистрировано параллельной загрузкой)
+
+        Raises:
+            IntegrityError: Если версию не удалось выделить за attempts попыток
+        """
+        for attempt in range(attempts):
+            version = await self.next_version(filename)
+            try:
+                document = await self.create(
+                    sha256=sha256, filename=filename, version=version, path=path_for(version), **fields
+                )
+                return document, True
+            except IntegrityError:
+                await self.db.rollback()
+                existing = await self.get_by_hash(sha256)
+                if existing is not None:
+                    return existing, False
+                if attempt == attempts - 1:
+                    raise
+        raise RuntimeError("unreachable")
+
+    async def delete(self, document: DocumentFile) -> None:
+        """
+        Удалить запись реестра.
+
+        Args:
+            document: Запись
+        """
+        await self.db.delete(document)
+        await self.db.commit()
+
+    async def get_latest(self, filename: str) -> Optional[DocumentFile]:
+        """
+        Последняя версия файла по имени.
+
+        Args:
+            filename: Имя файла (он же источник в базе знаний)
+
+        Returns:
+            DocumentFile или None
+        """
+        result = await self.db.execute(
+            select(DocumentFile)
+            .where(DocumentFile.filename == filename)
+            .order_by(DocumentFile.version.desc())
+            .limit(1)
+        )
+        return result.scalars().first()
+
+    async def set_job(self, document: DocumentFile, job_id: str) -> DocumentFile:
+        """
+        Привязать задачу индексации к файлу.
+
+        Args:
+            document: Запись реестра
+            job_id: ID задачи загрузки
+
+        Returns:
+            DocumentFile: Обновленная запись
+        """
+        document.ingest_job_id = job_id
+        await self.db.commit()
+        return document
+
+
+class AsyncBoardRepository:
+    """Асинхронный репозиторий для идей доски планирования"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def list_ideas(
+        self,
+        status: Optional[str] = None,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[datetime, uuid.UUID]] = None
+    ) -> List[BoardIdea]:
+        """
+        Получить идеи (от новых к старым), keyset-пагинация по (created_at, id).
+
+        Args:
+            status: Колонка доски (None — все)
+            limit: Размер страницы (None — без ограничения)
+            after: Ключ (created_at, id) последней идеи предыдущей страницы
+
+        Returns:
+            List[BoardIdea]: Список идей
+        """
+        query = select(BoardIdea)
+        if status is not None:
+            query = query.where(BoardIdea.status == status)
+        if after is not None:
+            query = query.where(tuple_(BoardIdea.created_at, BoardIdea.id) < tuple_(*after))
+        query = query.order_by(BoardIdea.created_at.desc(), BoardIdea.id.desc())
+        if limit:
+            query = query.limit(limit)
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
+
+    async def board_version(self, status: Optional[str] = None) -> Tuple[int, Optional[datetime], Optional[datetime]]:
+        """
+        Версия доски для ETag: число идей, max(updated_at) и время последнего удаления.
+
+        Args:
+            status: Колонка доски (None — вся доска)
+
+        Returns:
+            Tuple[int, Optional[datetime], Optional[datetime]]: (count, max updated_at, max deleted_at)
+        """
+        ideas = select(func.count(), func.max(BoardIdea.updated_at))
+        if status is not None:
+            ideas = ideas.where(BoardIdea.status == status)
+        count, updated_at = (await self.db.execute(ideas)).one()
+        deleted_at = (await self.db.execute(select(func.max(BoardIdeaTombstone.deleted_at)))).scalar()
+        return count, updated_at, deleted_at
+
+    async def changes_since(self, since: datetime) -> Tuple[List[BoardIdea], List[uuid.UUID], datetime]:
+        """
+        Идеи, созданные или измененные после since, и ID удаленных после since.
+
+        Args:
+            since: Момент последней синхронизации клиента
+
+        Returns:
+            Tuple: (идеи, ID удаленных идей, текущее время БД)
+        """
+        server_time = (await self.db.execute(select(func.now()))).scalar_one()
+        ideas = await self.db.execute(
+            select(BoardIdea)
+            .where(BoardIdea.updated_at > since)
+            .order_by(BoardIdea.updated_at)
+        )
+        deleted = await self.db.execute(
+            select(BoardIdeaTombstone.id).where(BoardIdeaTombstone.deleted_at > since)
+        )
+        return list(ideas.scalars().all()), list(deleted.scalars().all()), server_time
+
+    async def get_many(self, idea_ids: List[uuid.UUID]) -> List[BoardIdea]:
+        """
+        Получить идеи по списку ID (в порядке списка, отсутствующие пропускаются).
+
+        Args:
+            idea_ids: ID идей
+
+        Returns:
+            List[BoardIdea]: Найденные идеи
+        """
+        result = await self.db.execute(select(BoardIdea).where(BoardIdea.id.in_(idea_ids)))
+        by_id = {idea.id: idea for idea in result.scalars().all()}
+        return [by_id[idea_id] for idea_id in idea_ids if idea_id in by_id]
+
+    async def get(self, idea_id: uuid.UUID) -> Optional[BoardIdea]:
+        """
+        Получить идею по ID.
+
+        Args:
+            idea_id: ID идеи
+
+        Returns:
+            BoardIdea или None
+        """
+        return await self.db.get(BoardIdea, idea_id)
+
+    async def create(self, **fields: Any) -> BoardIdea:
+        """
+        Создать идею.
+
+        Args:
+            fields: Поля модели BoardIdea
+
+        Returns:
+            BoardIdea: Созданная идея
+        """
+        idea = BoardIdea(**fields)
+        self.db.add(idea)
+        await self.db.commit()
+        await self.db.refresh(idea)
+        return idea
+
+    async def update(self, idea: BoardIdea, update_data: Dict[str, Any]) -> BoardIdea:
+        """
+        Обновить поля идеи.
+
+        Args:
+            idea: Идея
+            update_data: Новые значения (ключ metadata пишется в extra_metadata)
+
+        Returns:
+            BoardIdea: Обновленная идея
+        """
+        for key, value in update_data.items():
+            if key == "metadata":
+                idea.extra_metadata = value
+            else:
+                setattr(idea, key, value)
+
+        await self.db.commit()
+        await self.db.refresh(idea)
+        return idea
+
+    async def bulk_apply(
+        self,
+        creates: List[Dict[str, Any]],
+        updates: Dict[uuid.UUID, Dict[str, Any]],
+        deletes: List[uuid.UUID]
+    ) -> Tuple[List[BoardIdea], List[uuid.UUID], List[uuid.UUID]]:
+        """
+        Применить пакет изменений доски одной транзакцией:
+        DELETE по списку ID с tombstones, multi-row INSERT
+        и UPDATE ... FROM (VALUES ...) на каждый набор полей.
+
+        Args:
+            creates: Поля новых идей (id назначается, если не задан)
+            updates: ID -> новые значения полей (metadata пишется в extra_metadata)
+            deletes: ID удаляемых идей
+
+        Returns:
+            Tuple: (созданные и обновленные идеи, ID удаленных, ID ненайденных)
+        """
+        ideas: List[BoardIdea] = []
+        deleted: List[uuid.UUID] = []
+        not_found: List[uuid.UUID] = []
+
+        # Удаление раньше вставки: delete + create с тем же ID в одном пакете не конфликтуют
+        if deletes:
+            result = await self.db.execute(
+                delete(BoardIdea)
+                .where(BoardIdea.id.in_(deletes))
+                .returning(BoardIdea.id, BoardIdea.status)
+            )
+            removed = result.all()
+            deleted = [row.id for row in removed]
+            deleted_ids = set(deleted)
+            not_found = [idea_id for idea_id in deletes if idea_id not in deleted_ids]
+            if removed:
+                stmt = pg_insert(BoardIdeaTombstone).values(
+                    [{"id": row.id, "status": row.status} for row in removed]
+                )
+                await self.db.execute(
+                    stmt.on_conflict_do_update(index_elements=[BoardIdeaTombstone.id], set_={"deleted_at": func.now()})
+                )
+                await self._prune_tombstones()
+
+        if creates:
+            rows = [
+                {
+                    "id": fields.get("id") or uuid.uuid4(),
+                    "title": fields["title"],
+                    "content": fields.get("content"),
+                    "status": fields.get("status") or "todo",
+                    "cover_type": fields.get("cover_type"),
+                    "extra_metadata": fields.get("metadata")
+                }
+                for fields in creates
+            ]
+            result = await self.db.scalars(insert(BoardIdea).returning(BoardIdea), rows)
+            ideas.extend(result.all())
+            # Идея, удаленная и заново созданная в этом пакете, больше не удалена
+            await self.db.execute(
+                delete(BoardIdeaTombstone).where(BoardIdeaTombstone.id.in_([row["id"] for row in rows]))
+            )
+
+        # Один UPDATE на каждый набор изменяемых полей (перенос карточек — только status)
+        groups: Dict[Tuple[str, ...], List[uuid.UUID]] = {}
+        for idea_id, fields in updates.items():
+            groups.setdefault(tuple(sorted(fields)), []).append(idea_id)
+        updated_ids = set()
+        for field_names, idea_ids in groups.items():
+            attributes = ["extra_metadata" if name == "metadata" else name for name in field_names]
+            data = values(
+                column("id", BoardIdea.id.type),
+                *(column(attr, getattr(BoardIdea, attr).type) for attr in attributes),
+                name="changes"
+            ).data([
+                (idea_id, *(updates[idea_id][name] for name in field_names))
+                for idea_id in idea_ids
+            ])
+            stmt = (
+                update(BoardIdea)
+                .where(BoardIdea.id == data.c.id)
+                .values({**{attr: data.c[attr] for attr in attributes}, "updated_at": func.now()})
+                .returning(BoardIdea)
+                .execution_options(synchronize_session=False)
+            )
+            result = await self.db.scalars(stmt)
+            for idea in result.all():
+                updated_ids.add(idea.id)
+                ideas.append(idea)
+        not_found.extend(idea_id for idea_id in updates if idea_id not in updated_ids)
+
+        await self.db.commit()
+        return ideas, deleted, not_found
+
+    async def delete(self, idea: BoardIdea) -> None:
+        """
+        Удалить идею, оставив tombstone для дельта-синхронизации.
+
+        Args:
+            idea: Идея
+        """
+        await self.db.delete(idea)
+        await self.db.execute(
+            pg_insert(BoardIdeaTombstone)
+            .values(id=idea.id, status=idea.status)
+            .on_conflict_do_update(index_elements=[BoardIdeaTombstone.id], set_={"deleted_at": func.now()})
+        )
+        await self._prune_tombstones()
+        await self.db.commit()
+
+    async def _prune_tombstones(self) -> int:
+        # Старые tombstones не нужны: клиент с более старым since получает reset
+        result = await self.db.execute(
+            delete(BoardIdeaTombstone).where(
+                BoardIdeaTombstone.deleted_at < func.now() - timedelta(days=settings.board_tombstone_retention_days)
+            )
+        )
+        return result.rowcount
+
+
+class AsyncStrategyRepository:
+    """Асинхронный репозиторий для стратегии пользователя"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_or_create(self, user_id: str = "default") -> UserStrategy:
+        """
+        Получить стратегию (пока один профиль на всю систему) или создать пустую.
+
+        Args:
+            user_id: ID владельца для новой стратегии
+
+        Returns:
+            UserStrategy: Стратегия
+        """
+        result = await self.db.execute(select(UserStrategy).limit(1))
+        strategy = result.scalars().first()
+        if not strategy:
+            strategy = UserStrategy(user_id=user_id)
+            self.db.add(strategy)
+            await self.db.commit()
+            await self.db.refresh(strategy)
+        return strategy
+
+    async def update(self, update_data: Dict[str, Any], user_id: str = "default") -> UserStrategy:
+        """
+        Обновить стратегию (создается, если ее еще нет).
+
+        Args:
+            update_data: Новые значения полей
+            user_id: ID владельца для новой стратегии
+
+        Returns:
+            UserStrategy: Обновленная стратегия
+        """
+        result = await self.db.execute(select(UserStrategy).limit(1))
+        strategy = result.scalars().first()
+        if not strategy:
+            strategy = UserStrategy(user_id=user_id)
+            self.db.add(strategy)
+
+        for key, value in update_data.items():
+            setattr(strategy, key, value)
+        generation = (await self.db.execute(generation_statement(STRATEGY))).scalar()
+
+        await self.db.commit()
+        get_invalidation_bus().apply(STRATEGY, generation)
+        await self.db.refresh(strategy)
+        return strategy
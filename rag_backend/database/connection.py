@@ -3,25 +3,91 @@
 Инициализация клиентов для работы с векторным хранилищем.
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from supabase import create_client, Client
 from langchain_community.vectorstores import SupabaseVectorStore
 from langchain_ollama import OllamaEmbeddings
-from typing import Generator
+from typing import Any, Dict, Generator, AsyncGenerator
 import os
 
 from config.settings import settings
+from database.pool_metrics import (
+    PoolMetrics,
+    InstrumentedQueuePool,
+    InstrumentedAsyncQueuePool,
+    pool_status
+)
 from utils.logger import logger
 
 
-# SQLAlchemy Engine для PostgreSQL
-engine = create_engine(
+def _set_statement_timeout(engine: Engine, timeout_ms: int) -> None:
+    """
+    Выставлять statement_timeout на каждом новом соединении пула.
+    
+    Args:
+        engine: Синхронный engine
+        timeout_ms: Таймаут запроса в миллисекундах (0 — без ограничения)
+    """
+    if not timeout_ms:
+        return
+    
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET statement_timeout = {int(timeout_ms)}")
+        cursor.close()
+        dbapi_connection.commit()
+
+
+def _create_pooled_engine(name: str, url: str, pool_size: int, max_overflow: int, timeout_ms: int) -> Engine:
+    """
+    Создать синхронный engine с именованным инструментированным пулом.
+    
+    Args:
+        name: Имя пула (для метрик)
+        url: URL базы данных
+        pool_size: Постоянных соединений
+        max_overflow: Дополнительных соединений сверх pool_size
+        timeout_ms: statement_timeout для соединений пула
+        
+    Returns:
+        Engine: SQLAlchemy engine
+    """
+    pooled_engine = create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_pre_ping=settings.db_pool_pre_ping,  # Проверка соединения перед использованием
+        pool_recycle=settings.db_pool_recycle_seconds,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        logging_name=name,
+        echo=settings.environment == "development"  # Логирование SQL в dev режиме
+    )
+    pooled_engine.pool.metrics = PoolMetrics(name)
+    _set_statement_timeout(pooled_engine, timeout_ms)
+    return pooled_engine
+
+
+# SQLAlchemy Engine для PostgreSQL: OLTP (пользователи, чат, доска, загрузка)
+engine = _create_pooled_engine(
+    "oltp",
     settings.postgres_db_url,
-    pool_pre_ping=True,  # Проверка соединения перед использованием
-    pool_size=5,
-    max_overflow=10,
-    echo=settings.environment == "development"  # Логирование SQL в dev режиме
+    settings.oltp_pool_size,
+    settings.oltp_max_overflow,
+    settings.oltp_statement_timeout_ms
+)
+
+# Отдельный пул для векторных запросов: долгие ANN-запросы не занимают соединения OLTP.
+# Может смотреть на read-реплику.
+retrieval_engine = _create_pooled_engine(
+    "retrieval",
+    settings.postgres_replica_url or settings.postgres_db_url,
+    settings.retrieval_pool_size,
+    settings.retrieval_max_overflow,
+    settings.retrieval_statement_timeout_ms
 )
 
 # Session factory
@@ -42,6 +108,61 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+def _async_db_url(url: str) -> str:
+    """
+    Преобразовать URL PostgreSQL в URL для асинхронного драйвера asyncpg.
+    
+    Args:
+        url: Синхронный URL (postgresql://, postgresql+psycopg2:// и т.д.)
+        
+    Returns:
+        str: URL с драйвером postgresql+asyncpg
+    """
+    return make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
+# Асинхронный engine для async-обработчиков FastAPI (не блокирует event loop), пул OLTP
+async_engine = create_async_engine(
+    settings.postgres_async_db_url or _async_db_url(settings.postgres_db_url),
+    poolclass=InstrumentedAsyncQueuePool,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    pool_recycle=settings.db_pool_recycle_seconds,
+    pool_size=settings.oltp_pool_size,
+    max_overflow=settings.oltp_max_overflow,
+    connect_args={"server_settings": {"statement_timeout": str(settings.oltp_statement_timeout_ms)}},
+    echo=settings.environment == "development"
+)
+async_engine.pool.metrics = PoolMetrics("oltp_async")
+
+# Async session factory (expire_on_commit=False: объекты читаются после commit без доп. запросов)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency для получения асинхронной сессии БД в FastAPI.
+    
+    Yields:
+        AsyncSession: Асинхронная SQLAlchemy сессия
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def pool_metrics() -> list[Dict[str, Any]]:
+    """
+    Метрики всех пулов соединений.
+    
+    Returns:
+        list[Dict[str, Any]]: Состояние каждого пула
+    """
+    return [
+        pool_status("oltp", engine.pool),
+        pool_status("oltp_async", async_engine.pool),
+        {**pool_status("retrieval", retrieval_engine.pool), "replica": bool(settings.postgres_replica_url)}
+    ]
+
+
 # Supabase клиент
 _supabase_client: Client | None = None
 
@@ -99,34 +220,103 @@ class LocalVectorStore:
         """
         try:
             query_embedding = self.embeddings.embed_query(query)
-            
-            with engine.connect() as conn:
-                from sqlalchemy import text
-                import json
-                
-                # Вызываем нашу SQL функцию
-                result = conn.execute(text("""
-                    SELECT content, metadata, similarity 
-                    FROM match_documents(:emb, :threshold, :limit, :filter)
-                """), {
-                    "emb": query_embedding,
-                    "threshold": settings.similarity_threshold,
-                    "limit": k,
-                    "filter": json.dumps(filter or {})
-                })
-                
-                from langchain_core.documents import Document
-                docs = []
-                for row in result:
-                    docs.append(Document(
-                        page_content=row[0],
-                        metadata=row[1]
-                    ))
-                return docs
+            return [doc for doc, _ in self.similarity_search_by_vector_with_scores(query_embedding, k, filter)]
         except Exception as e:
             logger.error(f"Error in similarity_search: {e}")
             return []
 
+    def similarity_search_by_vector_with_scores(
+        self,
+        embedding: list[float],
+        k: int = 5,
+        filter: dict | None = None,
+        threshold: float | None = None
+    ) -> list:
+        """
+        Поиск по готовому эмбеддингу через match_documents в retrieval-пуле
+        (реплика, если задан postgres_replica_url) — отдельно от OLTP-трафика.
+
+        Args:
+            embedding: Эмбеддинг запроса
+            k: Количество результатов
+            filter: Фильтр по метаданным
+            threshold: Минимальная похожесть (по умолчанию из settings)
+
+        Returns:
+            list[tuple[Document, float]]: Документы с оценками похожести
+        """
+        from sqlalchemy import text
+        from langchain_core.documents import Document
+        import json
+
+        with retrieval_engine.connect() as conn:
+            result = conn.execute(text("""
+                SELECT content, metadata, similarity 
+                FROM match_documents(CAST(:emb AS vector), :threshold, :limit, CAST(:filter AS jsonb))
+            """), {
+                "emb": "[" + ",".join(map(str, embedding)) + "]",
+                "threshold": settings.similarity_threshold if threshold is None else threshold,
+                "limit": k,
+                "filter": json.dumps(filter or {})
+            })
+            return [(Document(page_content=row[0], metadata=row[1]), row[2]) for row in result]
+
+    def add_embeddings(
+        self,
+        texts: list[str],
+        embeddings: list[list[float]],
+        metadatas: list[dict] | None = None,
+        batch_id: str | None = None,
+        visible: bool = True
+    ) -> int:
+        """
+        Сохранить готовые эмбеддинги чанков в knowledge_base одним multi-row INSERT.
+        
+        Args:
+            texts: Тексты чанков
+            embeddings: Эмбеддинги чанков
+            metadatas: Метаданные чанков (source копируется в колонку source)
+            batch_id: Батч загрузки (ID задачи)
+            visible: Сразу видимы в поиске; False — до публикации батча
+        
+        Returns:
+            int: Количество вставленных строк
+        """
+        from sqlalchemy import text
+        import json
+        
+        metadatas = metadatas or [{} for _ in texts]
+        rows = [
+            {
+                "content": content,
+                "embedding": "[" + ",".join(map(str, embedding)) + "]",
+                "metadata": json.dumps(metadata, ensure_ascii=False),
+                "source": metadata.get("source"),
+                "batch_id": batch_id,
+                "visible": visible
+            }
+            for content, embedding, metadata in zip(texts, embeddings, metadatas)
+        ]
+        if not rows:
+            return 0
+        
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO knowledge_base (content, embedding, metadata, source, batch_id, visible)
+                VALUES (:content, CAST(:embedding AS vector), CAST(:metadata AS jsonb), :source, :batch_id, :visible)
+            """), rows)
+        return len(rows)
+
+    def add_texts(self, texts: list[str], metadatas: list[dict] | None = None) -> int:
+        """
+        Посчитать эмбеддинги и сохранить чанки в knowledge_base.
+        
+        Returns:
+            int: Количество вставленных строк
+        """
+        embeddings = self.embeddings.embed_documents(texts)
+        return self.add_embeddings(texts, embeddings, metadatas)
+
 _local_vector_store: LocalVectorStore | None = None
 
 def get_vector_store() -> LocalVectorStore:
@@ -0,0 +1,245 @@
+"""
+Межпроцессная инвалидация кэшей через PostgreSQL LISTEN/NOTIFY.
+Счетчики поколений (corpus, strategy, auth) хранятся в cache_generations;
+bump_cache_generation() увеличивает счетчик и шлет NOTIFY в той же транзакции,
+что и изменение данных. Каждый воркер слушает канал в фоновом потоке
+и вызывает обработчики, зарегистрированные через @cache_namespace.
+"""
+
+from collections import defaultdict
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, List, Optional
+import select
+import time
+
+from sqlalchemy import text
+
+from config.settings import settings
+from utils.logger import logger
+
+
+# Канал NOTIFY (задан в функции bump_cache_generation в init_db.py)
+CHANNEL = "cache_invalidation"
+
+# Пространства имен кэшей
+CORPUS = "corpus"
+STRATEGY = "strategy"
+AUTH = "auth"
+
+# Обработчик: (поколение, ключ или None — сбросить все пространство)
+Handler = Callable[[int, Optional[str]], None]
+
+_handlers: Dict[str, List[Handler]] = defaultdict(list)
+
+
+def cache_namespace(*namespaces: str) -> Callable[[Handler], Handler]:
+    """
+    Декоратор: зарегистрировать обработчик смены поколения пространств имен.
+
+    Args:
+        namespaces: Пространства имен (CORPUS, STRATEGY, AUTH)
+
+    Returns:
+        Декоратор, возвращающий обработчик без изменений
+    """
+    def decorator(handler: Handler) -> Handler:
+        for namespace in namespaces:
+            _handlers[namespace].append(handler)
+        return handler
+    return decorator
+
+
+def generation_statement(namespace: str, key: Optional[str] = None):
+    """
+    SQL увеличения поколения. Выполняется в транзакции изменения данных:
+    NOTIFY доставляется другим воркерам только после commit.
+
+    Args:
+        namespace: Пространство имен
+        key: Ключ внутри пространства (None — все пространство)
+
+    Returns:
+        Выражение SELECT bump_cache_generation(...), возвращающее новое поколение
+    """
+    return text("SELECT bump_cache_generation(:namespace, :key)").bindparams(namespace=namespace, key=key)
+
+
+class InvalidationBus:
+    """Локальные поколения пространств имен и слушатель NOTIFY."""
+
+    def __init__(self, poll_seconds: float | None = None, resync_seconds: float | None = None):
+        self.poll_seconds = poll_seconds or settings.cache_invalidation_poll_seconds
+        self.resync_seconds = resync_seconds or settings.cache_invalidation_resync_seconds
+        self._generations: Dict[str, int] = {}
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread: Thread | None = None
+        self._metrics = {"notifications": 0, "applied": 0, "resyncs": 0, "reconnects": 0}
+        self._listening = False
+
+    def generation(self, namespace: str) -> int:
+        """Известное воркеру поколение пространства имен."""
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def apply(self, namespace: str, generation: int, key: Optional[str] = None) -> bool:
+        """
+        Применить новое поколение: вызвать обработчики, если оно новее известного.
+        Если пропущено промежуточное поколение, ключ игнорируется
+        и сбрасывается все пространство.
+
+        Args:
+            namespace: Пространство имен
+            generation: Поколение из БД
+            key: Ключ внутри пространства
+
+        Returns:
+            bool: Были ли вызваны обработчики
+        """
+        with self._lock:
+            known = self._generations.get(namespace, 0)
+            if generation <= known:
+                return False
+            self._generations[namespace] = generation
+            self._metrics["applied"] += 1
+        if generation > known + 1:
+            key = None
+        for handler in _handlers.get(namespace, []):
+            try:
+                handler(generation, key)
+            except Exception as e:
+                logger.error(f"Cache invalidation handler for '{namespace}' failed: {e}", exc_info=True)
+        return True
+
+    def publish(self, namespace: str, key: Optional[str] = None) -> int:
+        """
+        Увеличить поколение в отдельной транзакции и применить его локально.
+
+        Args:
+            namespace: Пространство имен
+            key: Ключ внутри пространства
+
+        Returns:
+            int: Новое поколение
+        """
+        from database.connection import engine
+
+        with engine.begin() as conn:
+            generation = conn.execute(generation_statement(namespace, key)).scalar()
+        self.apply(namespace, generation, key)
+        return generation
+
+    def start(self) -> None:
+        """Запустить поток-слушатель (по одному на воркер)."""
+        if self._thread is not None or not settings.cache_invalidation_enabled:
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="cache-invalidation", daemon=True)
+        self._thread.start()
+        logger.info(f"Cache invalidation listener started on channel '{CHANNEL}'")
+
+    def stop(self) -> None:
+        """Остановить слушатель."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=self.poll_seconds + 1)
+        self._thread = None
+
+    def _connect(self):
+        # Отдельное соединение вне пула: оно занято слушателем все время
+        from database.connection import engine
+
+        cargs, cparams = engine.dialect.create_connect_args(engine.url)
+        connection = engine.dialect.dbapi.connect(*cargs, **cparams)
+        connection.autocommit = True
+        return connection
+
+    def _resync(self, cursor) -> None:
+        # Поколения, изменившиеся без уведомления (переподключение, потерянный NOTIFY)
+        cursor.execute("SELECT namespace, generation FROM cache_generations")
+        for namespace, generation in cursor.fetchall():
+            self.apply(namespace, generation)
+        self._metrics["resyncs"] += 1
+
+    def _on_payload(self, payload: str) -> None:
+        self._metrics["notifications"] += 1
+        namespace, _, rest = payload.partition(":")
+        generation, _, key = rest.partition(":")
+        try:
+            self.apply(namespace, int(generation), key or None)
+        except ValueError:
+            logger.warning(f"Malformed cache invalidation payload: {payload[:100]}")
+
+    def _listen(self, connection) -> None:
+        cursor = connection.cursor()
+        # LISTEN доступен для драйверов с очередью notifies (psycopg2); иначе — опрос таблицы
+        supports_notify = hasattr(connection, "notifies") and hasattr(connection, "poll")
+        if supports_notify:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        self._listening = supports_notify
+        self._resync(cursor)
+        last_resync = time.monotonic()
+
+        while not self._stop.is_set():
+            if supports_notify:
+                if select.select([connection], [], [], self.poll_seconds) != ([], [], []):
+                    connection.poll()
+                    while connection.notifies:
+                        self._on_payload(connection.notifies.pop(0).payload)
+                resync_due = time.monotonic() - last_resync >= self.resync_seconds
+            else:
+                self._stop.wait(self.poll_seconds)
+                resync_due = True
+            if resync_due:
+                self._resync(cursor)
+                last_resync = time.monotonic()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            connection = None
+            try:
+                connection = self._connect()
+                self._listen(connection)
+            except Exception as e:
+                self._metrics["reconnects"] += 1
+                logger.warning(f"Cache invalidation listener error ({e}), reconnecting")
+            finally:
+                self._listening = False
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            self._stop.wait(self.poll_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние шины для API."""
+        with self._lock:
+            generations = dict(self._generations)
+        return {
+            **self._metrics,
+            "running": self._thread is not None,
+            "listening": self._listening,
+            "generations": generations,
+            "namespaces": {namespace: len(handlers) for namespace, handlers in _handlers.items()}
+        }
+
+
+# Singleton instance
+_bus: InvalidationBus | None = None
+
+
+def get_invalidation_bus() -> InvalidationBus:
+    """
+    Получить шину инвалидации кэшей (singleton).
+
+    Returns:
+        InvalidationBus: Экземпляр шины
+    """
+    global _bus
+
+    if _bus is None:
+        _bus = InvalidationBus()
+
+    return _bus
@@ -3,7 +3,7 @@ SQLAlchemy модели для таблиц базы данных.
 Соответствуют схеме из database/init_db.sql
 """
 
-from sqlalchemy import Column, String, Text, TIMESTAMP, UUID, Index
+from sqlalchemy import Column, String, Text, TIMESTAMP, UUID, Index, Integer, BigInteger, Date, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
@@ -42,17 +42,61 @@ class UserChat(Base):
     role = Column(String(50), nullable=False)  # 'user' или 'assistant'
     content = Column(Text, nullable=False)
     extra_metadata = Column("metadata", JSONB, nullable=True)  # Дополнительные данные
-    created_at = Column(TIMESTAMP, server_default=func.now(), index=True)
+    # Ключ партиционирования (партиции по месяцам), поэтому входит в первичный ключ
+    created_at = Column(TIMESTAMP, primary_key=True, server_default=func.now(), index=True)
     
     # Композитный индекс для быстрого поиска истории
     __table_args__ = (
         Index('idx_user_thread_created', 'user_id', 'thread_id', 'created_at'),
+        Index('idx_user_thread_created_id', 'user_id', 'thread_id', 'created_at', 'id'),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
     
     def __repr__(self):
         return f"<UserChat(id={self.id}, user_id={self.user_id}, role={self.role})>"
 
 
+class UserChatArchive(Base):
+    """
+    Архив сообщений из холодных партиций user_chats.
+    Одна строка на тред за месяц, сообщения хранятся сжатым jsonb.
+    """
+    __tablename__ = "user_chats_archive"
+    
+    user_id = Column(String(255), primary_key=True)
+    thread_id = Column(String(255), primary_key=True)
+    month = Column(Date, primary_key=True)
+    message_count = Column(Integer, nullable=False)
+    messages = Column(JSONB, nullable=False)  # [{id, role, content, metadata, created_at}, ...]
+    archived_at = Column(TIMESTAMP, server_default=func.now())
+    
+    def __repr__(self):
+        return f"<UserChatArchive(user_id={self.user_id}, thread_id={self.thread_id}, month={self.month})>"
+
+
+class ChatThread(Base):
+    """
+    Денормализованный индекс тредов пользователя.
+    Обновляется при каждом add_message, чтобы список тредов
+    не агрегировал всю историю сообщений.
+    """
+    __tablename__ = "chat_threads"
+    
+    user_id = Column(String(255), primary_key=True)
+    thread_id = Column(String(255), primary_key=True)
+    first_message_at = Column(TIMESTAMP, server_default=func.now())
+    last_message_at = Column(TIMESTAMP, server_default=func.now())
+    message_count = Column(Integer, nullable=False, default=0)
+    preview = Column(Text, nullable=True)  # Начало последнего сообщения
+    
+    __table_args__ = (
+        Index('idx_chat_threads_user_last', 'user_id', 'last_message_at'),
+    )
+    
+    def __repr__(self):
+        return f"<ChatThread(user_id={self.user_id}, thread_id={self.thread_id}, messages={self.message_count})>"
+
+
 class KnowledgeBase(Base):
     """
     Модель векторной базы знаний.
@@ -65,10 +109,57 @@ class KnowledgeBase(Base):
     # embedding - обрабатывается напрямую через SQL (тип vector(1024))
     extra_metadata = Column("metadata", JSONB, nullable=True)
     created_at = Column(TIMESTAMP, server_default=func.now())
+    source = Column(String(1024), nullable=True, index=True)  # Копия metadata->>'source' для индексных выборок
+    batch_id = Column(String(64), nullable=True, index=True)  # ID задачи загрузки, вставившей чанк
+    visible = Column(Boolean, nullable=False, server_default="true")  # false — батч еще не опубликован
+    
+    def __repr__(self):
+        return f"<KnowledgeBase(id={self.id}, source={self.source or 'unknown'})>"
+
+
+class KnowledgeSource(Base):
+    """
+    Сводная статистика по источнику базы знаний.
+    Поддерживается путями загрузки и удаления, чтобы статистика
+    не сканировала чанки.
+    """
+    __tablename__ = "knowledge_sources"
+    
+    source = Column(String(1024), primary_key=True)
+    chunks_count = Column(Integer, nullable=False, default=0)
+    token_count = Column(BigInteger, nullable=False, default=0)
+    char_count = Column(BigInteger, nullable=False, default=0)
+    first_ingested_at = Column(TIMESTAMP, server_default=func.now())
+    last_ingested_at = Column(TIMESTAMP, server_default=func.now())
     
     def __repr__(self):
-        source = self.extra_metadata.get("source", "unknown") if self.extra_metadata else "unknown"
-        return f"<KnowledgeBase(id={self.id}, source={source})>"
+        return f"<KnowledgeSource(source={self.source}, chunks={self.chunks_count})>"
+
+
+class DocumentFile(Base):
+    """
+    Реестр загруженных файлов по хэшу содержимого.
+    Повторная загрузка того же содержимого не индексируется заново,
+    а одноименные файлы хранятся как отдельные версии.
+    """
+    __tablename__ = "document_files"
+    
+    sha256 = Column(String(64), primary_key=True)
+    filename = Column(String(1024), nullable=False, index=True)
+    version = Column(Integer, nullable=False, default=1)
+    path = Column(Text, nullable=False)
+    size_bytes = Column(BigInteger, nullable=False)
+    ingest_job_id = Column(String(64), nullable=True)
+    uploaded_by = Column(String(255), nullable=True)
+    uploaded_at = Column(TIMESTAMP, server_default=func.now())
+    
+    __table_args__ = (
+        # Версия выделяется max(version) + 1; параллельная загрузка с той же версией получает конфликт
+        Index('uq_document_files_filename_version', 'filename', 'version', unique=True),
+    )
+    
+    def __repr__(self):
+        return f"<DocumentFile(filename={self.filename}, version={self.version}, sha256={self.sha256[:12]})>"
 
 
 class BoardIdea(Base):
@@ -83,13 +174,39 @@ class BoardIdea(Base):
     status = Column(String(50), default="todo") # 'todo', 'in_progress', 'done'
     cover_type = Column(String(50), nullable=True)
     extra_metadata = Column("metadata", JSONB, nullable=True)
-    created_at = Column(TIMESTAMP, server_default=func.now())
-    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+    # timestamptz как в init_db.py: since и курсоры приходят с часовым поясом
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # Keyset-пагинация колонки доски и дельта-синхронизация
+        Index('idx_board_ideas_status_created_id', 'status', 'created_at', 'id'),
+        Index('idx_board_ideas_updated_at', 'updated_at'),
+    )
 
     def __repr__(self):
         return f"<BoardIdea(id={self.id}, title={self.title})>"
 
 
+class BoardIdeaTombstone(Base):
+    """
+    Отметка об удалении идеи: по ним /planner/ideas/changes
+    сообщает клиентам об удаленных карточках.
+    """
+    __tablename__ = "board_idea_tombstones"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True)  # ID удаленной идеи
+    status = Column(String(50), nullable=True)
+    deleted_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        Index('idx_board_idea_tombstones_deleted_at', 'deleted_at'),
+    )
+    
+    def __repr__(self):
+        return f"<BoardIdeaTombstone(id={self.id}, deleted_at={self.deleted_at})>"
+
+
 class UserStrategy(Base):
     """
     Модель стратегии и позиционирования пользователя.
@@ -0,0 +1,192 @@
+"""
+Обслуживание месячных партиций user_chats.
+Партиции создаются заранее (запись в несуществующий месяц упала бы),
+холодные месяцы переносятся в сжатый архив user_chats_archive.
+SQL-функции ensure_user_chats_partition / archive_user_chats_partition
+создаются в init_db.py.
+"""
+
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List
+import asyncio
+import re
+
+from sqlalchemy import text
+
+from config.settings import settings
+from database.connection import engine
+from utils.logger import logger
+
+
+# user_chats_YYYY_MM
+PARTITION_NAME_RE = re.compile(r"^user_chats_(\d{4})_(\d{2})$")
+
+
+def add_months(month: date, months: int) -> date:
+    """Первое число месяца, сдвинутого на months."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def current_month() -> date:
+    """Первое число текущего месяца (UTC)."""
+    today = datetime.now(timezone.utc).date()
+    return today.replace(day=1)
+
+
+def list_partitions() -> List[date]:
+    """
+    Месяцы, для которых существуют партиции user_chats.
+
+    Returns:
+        List[date]: Первые числа месяцев по возрастанию
+    """
+    with engine.connect() as conn:
+        names = conn.execute(text("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'user_chats'::regclass
+        """)).scalars().all()
+    months = []
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def ensure_partitions(months_ahead: int | None = None) -> List[str]:
+    """
+    Создать партиции текущего месяца и months_ahead следующих.
+
+    Args:
+        months_ahead: Сколько месяцев вперед держать готовыми
+
+    Returns:
+        List[str]: Имена партиций (существующих или созданных)
+    """
+    months_ahead = settings.chat_partition_months_ahead if months_ahead is None else months_ahead
+    start = current_month()
+    names = []
+    with engine.begin() as conn:
+        for offset in range(months_ahead + 1):
+            names.append(conn.execute(
+                text("SELECT ensure_user_chats_partition(:month)"),
+                {"month": add_months(start, offset)}
+            ).scalar())
+    return names
+
+
+def archive_cold_partitions(retention_months: int | None = None) -> Dict[str, int]:
+    """
+    Перенести в архив партиции старше retention_months месяцев.
+    Каждая партиция архивируется в своей транзакции.
+
+    Args:
+        retention_months: Сколько последних месяцев хранить в user_chats (0 — не архивировать)
+
+    Returns:
+        Dict[str, int]: Партиция -> количество архивированных тредов
+    """
+    retention_months = settings.chat_retention_months if retention_months is None else retention_months
+    if retention_months <= 0:
+        return {}
+
+    cutoff = add_months(current_month(), -retention_months)
+    archived = {}
+    for month in list_partitions():
+        if month >= cutoff:
+            break
+        with engine.begin() as conn:
+            # Перенос целого месяца дольше OLTP-таймаута пула
+            conn.execute(text("SET LOCAL statement_timeout = 0"))
+            threads = conn.execute(
+                text("SELECT archive_user_chats_partition(:month)"),
+                {"month": month}
+            ).scalar()
+        name = f"user_chats_{month:%Y_%m}"
+        archived[name] = threads
+        logger.info(f"Archived chat partition {name}: {threads} threads")
+    return archived
+
+
+def run_maintenance() -> Dict[str, Any]:
+    """
+    Один проход обслуживания: создать будущие партиции и архивировать холодные.
+
+    Returns:
+        Dict[str, Any]: Результат прохода
+    """
+    return {
+        "partitions": ensure_partitions(),
+        "archived": archive_cold_partitions()
+    }
+
+
+class PartitionMaintainer:
+    """Фоновая задача обслуживания партиций user_chats."""
+
+    def __init__(self, interval_seconds: float | None = None):
+        self.interval_seconds = (
+            interval_seconds if interval_seconds is not None
+            else settings.chat_partition_maintenance_hours * 3600
+        )
+        self.last_run: Dict[str, Any] | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """Создать партиции сразу (до первой записи чата) и запустить периодическое обслуживание."""
+        if self._task is not None:
+            return
+        try:
+            await asyncio.to_thread(ensure_partitions)
+        except Exception as e:
+            logger.error(f"Failed to ensure chat partitions: {e}", exc_info=True)
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Остановить обслуживание."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                self.last_run = await asyncio.to_thread(run_maintenance)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Chat partition maintenance failed: {e}", exc_info=True)
+            await asyncio.sleep(self.interval_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние партиций для API."""
+        return {
+            "partitions": [f"user_chats_{month:%Y_%m}" for month in list_partitions()],
+            "retention_months": settings.chat_retention_months,
+            "months_ahead": settings.chat_partition_months_ahead,
+            "last_run": self.last_run
+        }
+
+
+# Singleton instance
+_maintainer: PartitionMaintainer | None = None
+
+
+def get_partition_maintainer() -> PartitionMaintainer:
+    """
+    Получить обслуживание партиций чата (singleton).
+
+    Returns:
+        PartitionMaintainer: Экземпляр
+    """
+    global _maintainer
+
+    if _maintainer is None:
+        _maintainer = PartitionMaintainer()
+
+    return _maintainer
@@ -0,0 +1,101 @@
+"""
+Инструментированные пулы соединений SQLAlchemy.
+Считают выдачи соединений, время ожидания свободного соединения
+и таймауты; состояние пулов отдается эндпоинтом метрик.
+"""
+
+from threading import Lock
+from typing import Any, Dict
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+
+class PoolMetrics:
+    """Счетчики ожидания соединений одного пула"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = Lock()
+
+    def record(self, waited: float, timed_out: bool = False) -> None:
+        """Учесть одну попытку получить соединение."""
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Счетчики для API."""
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total / attempts * 1000, 3) if attempts else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3)
+            }
+
+
+class _InstrumentedPoolMixin:
+    """Замер ожидания в _do_get (ожидание свободного соединения или открытие нового)."""
+
+    metrics: PoolMetrics | None = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.record(time.perf_counter() - started, timed_out=True)
+            raise
+        if self.metrics is not None:
+            self.metrics.record(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() пересоздает пул — счетчики сохраняем
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    """QueuePool с метриками ожидания."""
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool с метриками ожидания."""
+
+
+def pool_status(name: str, pool: Any) -> Dict[str, Any]:
+    """
+    Состояние пула: размер, занятые соединения, overflow и счетчики ожидания.
+
+    Args:
+        name: Имя пула
+        pool: Пул SQLAlchemy (engine.pool)
+
+    Returns:
+        Dict[str, Any]: Метрики пула
+    """
+    status = {
+        "name": name,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow()
+    }
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        status.update(metrics.snapshot())
+    return status
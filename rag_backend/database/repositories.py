@@ -4,12 +4,169 @@
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
-from typing import List, Optional
+from sqlalchemy import desc, func, tuple_, select, literal_column, text, bindparam, TIMESTAMP
+from sqlalchemy.dialects.postgresql import insert
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence, Tuple
 import secrets
 import uuid
 
-from database.models import User, UserChat, KnowledgeBase
+from config.settings import settings
+from database.invalidation import AUTH, CORPUS, generation_statement, get_invalidation_bus
+from database.models import User, UserChat, UserChatArchive, ChatThread, KnowledgeBase, KnowledgeSource
+
+
+# Длина превью последнего сообщения в chat_threads
+THREAD_PREVIEW_CHARS = 200
+
+
+def thread_partition_bound(user_id: str, thread_id: str):
+    """
+    Нижняя граница created_at сообщений треда (first_message_at из chat_threads).
+    Условие created_at >= bound отсекает партиции user_chats старше треда,
+    так что запросы по треду читают только его месяцы.
+
+    Args:
+        user_id: ID пользователя
+        thread_id: ID треда
+
+    Returns:
+        Скалярное SQL-выражение (-infinity, если треда нет в индексе)
+    """
+    first_message_at = (
+        select(ChatThread.first_message_at)
+        .where(ChatThread.user_id == user_id, ChatThread.thread_id == thread_id)
+        .scalar_subquery()
+    )
+    return func.coalesce(first_message_at, literal_column("'-infinity'::timestamptz"))
+
+
+def history_window_bound(user_id: str, thread_id: str, before_at: Optional[datetime] = None):
+    """
+    Нижняя граница created_at для страницы истории: chat_history_window_months
+    месяцев до якоря (курсор страницы или последнее сообщение треда), но не раньше
+    начала треда. Долгоживущий тред читает только последние партиции.
+
+    Args:
+        user_id: ID пользователя
+        thread_id: ID треда
+        before_at: created_at курсора страницы
+
+    Returns:
+        Скалярное SQL-выражение
+    """
+    if before_at is not None:
+        anchor = bindparam("history_before_at", _as_utc(before_at), type_=TIMESTAMP(timezone=True))
+    else:
+        anchor = (
+            select(ChatThread.last_message_at)
+            .where(ChatThread.user_id == user_id, ChatThread.thread_id == thread_id)
+            .scalar_subquery()
+        )
+    months = max(1, settings.chat_history_window_months)
+    window_start = func.date_trunc("month", anchor) - literal_column(f"interval '{months - 1} months'")
+    return func.greatest(thread_partition_bound(user_id, thread_id), window_start)
+
+
+def archived_history_query(user_id: str, thread_id: str, before_at: Optional[datetime] = None):
+    """
+    Архивные месяцы треда (user_chats_archive), от новых к старым.
+
+    Args:
+        user_id: ID пользователя
+        thread_id: ID треда
+        before_at: created_at курсора страницы (месяцы после него не нужны)
+
+    Returns:
+        Select: Запрос строк UserChatArchive
+    """
+    query = select(UserChatArchive).where(
+        UserChatArchive.user_id == user_id,
+        UserChatArchive.thread_id == thread_id
+    )
+    if before_at is not None:
+        query = query.where(UserChatArchive.month <= _as_utc(before_at).date())
+    return query.order_by(desc(UserChatArchive.month))
+
+
+def unpack_archived_messages(
+    archives: Sequence[UserChatArchive],
+    before: Optional[Tuple[datetime, uuid.UUID]],
+    limit: int
+) -> List[UserChat]:
+    """
+    Сообщения из архивных месяцев в виде UserChat (без привязки к сессии).
+
+    Args:
+        archives: Строки archived_history_query (от новых месяцев к старым)
+        before: Ключ (created_at, id) — вернуть сообщения старше него
+        limit: Максимальное количество сообщений
+
+    Returns:
+        List[UserChat]: Сообщения от новых к старым
+    """
+    key = (_as_utc(before[0]), before[1]) if before is not None else None
+    messages: List[UserChat] = []
+    for archive in archives:
+        # Повторная архивация месяца дописывает сообщения в конец: сортируем явно
+        items = sorted(
+            ((_as_utc(datetime.fromisoformat(item["created_at"])), uuid.UUID(item["id"]), item)
+             for item in archive.messages),
+            key=lambda entry: entry[:2],
+            reverse=True
+        )
+        for created_at, message_id, item in items:
+            if key is not None and (created_at, message_id) >= key:
+                continue
+            messages.append(UserChat(
+                id=message_id,
+                user_id=archive.user_id,
+                thread_id=archive.thread_id,
+                role=item["role"],
+                content=item["content"],
+                extra_metadata=item.get("metadata"),
+                created_at=created_at
+            ))
+            if len(messages) >= limit:
+                return messages
+    return messages
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Партиции и архив нарезаны по месяцам UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def thread_index_upsert(user_id: str, thread_id: str, content: str):
+    """
+    INSERT ... ON CONFLICT для chat_threads: выполняется в одной транзакции
+    с добавлением сообщения.
+
+    Args:
+        user_id: ID пользователя
+        thread_id: ID треда
+        content: Текст нового сообщения
+
+    Returns:
+        Insert: Выражение для session.execute
+    """
+    preview = content[:THREAD_PREVIEW_CHARS]
+    stmt = insert(ChatThread).values(
+        user_id=user_id,
+        thread_id=thread_id,
+        first_message_at=func.now(),
+        last_message_at=func.now(),
+        message_count=1,
+        preview=preview
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[ChatThread.user_id, ChatThread.thread_id],
+        set_={
+            "last_message_at": func.now(),
+            "message_count": ChatThread.message_count + 1,
+            "preview": preview
+        }
+    )
 
 
 class UserRepository:
@@ -76,9 +233,14 @@ class UserRepository:
         Returns:
             User: Обновленный пользователь
         """
+        old_token = user.session_token
         user.session_token = secrets.token_urlsafe(32)
+        # Старый токен сбрасывается в кэшах всех воркеров (NOTIFY после commit)
+        generation = self.db.execute(generation_statement(AUTH, old_token)).scalar() if old_token else None
         self.db.commit()
         self.db.refresh(user)
+        if generation is not None:
+            get_invalidation_bus().apply(AUTH, generation, old_token)
         
         return user
 
@@ -119,6 +281,7 @@ class ChatRepository:
         )
         
         self.db.add(message)
+        self.db.execute(thread_index_upsert(user_id, thread_id, content))
         self.db.commit()
         self.db.refresh(message)
         
@@ -128,33 +291,54 @@ class ChatRepository:
         self,
         user_id: str,
         thread_id: str,
-        limit: int = 10
+        limit: int = 10,
+        before: Optional[Tuple[datetime, uuid.UUID]] = None
     ) -> List[UserChat]:
         """
-        Получить историю чата.
+        Получить историю чата (keyset-пагинация по (created_at, id)).
+        Читаются партиции за chat_history_window_months до курсора; если страница
+        не заполнена — более ранние партиции треда и архив user_chats_archive.
         
         Args:
             user_id: ID пользователя
             thread_id: ID треда
             limit: Максимальное количество сообщений
+            before: Ключ (created_at, id) — вернуть сообщения старше него
             
         Returns:
             List[UserChat]: Список сообщений (от старых к новым)
         """
-        messages = (
-            self.db.query(UserChat)
-            .filter(
-                UserChat.user_id == user_id,
-                UserChat.thread_id == thread_id
+        window_start = history_window_bound(user_id, thread_id, before[0] if before else None)
+        messages = self._history_page(user_id, thread_id, before, limit, UserChat.created_at >= window_start)
+        if len(messages) < limit:
+            # Тред старше окна: дочитываем более ранние партиции
+            messages += self._history_page(
+                user_id, thread_id, before, limit - len(messages),
+                UserChat.created_at >= thread_partition_bound(user_id, thread_id),
+                UserChat.created_at < window_start
             )
-            .order_by(desc(UserChat.created_at))
-            .limit(limit)
-            .all()
-        )
+        if len(messages) < limit and settings.chat_retention_months > 0:
+            archives = self.db.scalars(archived_history_query(user_id, thread_id, before[0] if before else None)).all()
+            messages += unpack_archived_messages(archives, before, limit - len(messages))
         
         # Возвращаем в хронологическом порядке (от старых к новым)
         return list(reversed(messages))
     
+    def _history_page(self, user_id: str, thread_id: str, before, limit: int, *bounds) -> List[UserChat]:
+        query = self.db.query(UserChat).filter(
+            UserChat.user_id == user_id,
+            UserChat.thread_id == thread_id,
+            *bounds
+        )
+        if before is not None:
+            query = query.filter(tuple_(UserChat.created_at, UserChat.id) < tuple_(*before))
+        return (
+            query
+            .order_by(desc(UserChat.created_at), desc(UserChat.id))
+            .limit(limit)
+            .all()
+        )
+    
     def get_all_threads(self, user_id: str) -> List[str]:
         """
         Получить все thread_id пользователя, отсортированные по последнему сообщению.
@@ -165,15 +349,27 @@ class ChatRepository:
         Returns:
             List[str]: Список thread_id (от нового к старому)
         """
-        threads = (
-            self.db.query(UserChat.thread_id)
-            .filter(UserChat.user_id == user_id)
-            .group_by(UserChat.thread_id)
-            .order_by(func.max(UserChat.created_at).desc())
-            .all()
-        )
+        return [thread.thread_id for thread in self.list_threads(user_id)]
+    
+    def list_threads(self, user_id: str, limit: Optional[int] = None) -> List[ChatThread]:
+        """
+        Получить треды пользователя из индекса chat_threads.
         
-        return [thread[0] for thread in threads]
+        Args:
+            user_id: ID пользователя
+            limit: Максимальное количество тредов
+            
+        Returns:
+            List[ChatThread]: Треды (от нового к старому)
+        """
+        query = (
+            self.db.query(ChatThread)
+            .filter(ChatThread.user_id == user_id)
+            .order_by(desc(ChatThread.last_message_at))
+        )
+        if limit:
+            query = query.limit(limit)
+        return query.all()
     
     def delete_thread(self, user_id: str, thread_id: str) -> int:
         """
@@ -190,10 +386,19 @@ class ChatRepository:
             self.db.query(UserChat)
             .filter(
                 UserChat.user_id == user_id,
-                UserChat.thread_id == thread_id
+                UserChat.thread_id == thread_id,
+                UserChat.created_at >= thread_partition_bound(user_id, thread_id)
             )
-            .delete()
+            .delete(synchronize_session=False)
         )
+        self.db.query(UserChatArchive).filter(
+            UserChatArchive.user_id == user_id,
+            UserChatArchive.thread_id == thread_id
+        ).delete()
+        self.db.query(ChatThread).filter(
+            ChatThread.user_id == user_id,
+            ChatThread.thread_id == thread_id
+        ).delete()
         
         self.db.commit()
         return deleted_count
@@ -226,7 +431,7 @@ class KnowledgeRepository:
         """
         return (
             self.db.query(KnowledgeBase)
-            .filter(KnowledgeBase.extra_metadata["source"].astext == source)
+            .filter(KnowledgeBase.source == source, KnowledgeBase.visible)
             .all()
         )
     
@@ -242,11 +447,14 @@ class KnowledgeRepository:
         """
         deleted_count = (
             self.db.query(KnowledgeBase)
-            .filter(KnowledgeBase.extra_metadata["source"].astext == source)
+            .filter(KnowledgeBase.source == source)
             .delete(synchronize_session=False)
         )
+        self.db.query(KnowledgeSource).filter(KnowledgeSource.source == source).delete()
+        generation = self.db.execute(generation_statement(CORPUS)).scalar()
         
         self.db.commit()
+        get_invalidation_bus().apply(CORPUS, generation)
         return deleted_count
     
     def get_sources_list(self) -> List[str]:
@@ -256,9 +464,9 @@ class KnowledgeRepository:
         Returns:
             List[str]: Список названий источников
         """
-        # Используем JSONB оператор для извлечения source
         sources = (
-            self.db.query(KnowledgeBase.extra_metadata["source"].astext)
+            self.db.query(KnowledgeBase.source)
+            .filter(KnowledgeBase.visible)
             .distinct()
             .all()
         )
@@ -273,3 +481,52 @@ class KnowledgeRepository:
             int: Количество чанков
         """
         return self.db.query(KnowledgeBase).count()
+    
+    def publish_batch(self, source: str, batch_id: str, replace: bool = False) -> int:
+        """
+        Опубликовать батч загрузки одной транзакцией: сделать его чанки видимыми,
+        при замене удалить ранее опубликованные чанки источника и пересчитать статистику.
+        Читатели видят либо старую версию документа, либо новую целиком.
+        Невидимые батчи параллельных загрузок не трогаются: побеждает последняя публикация.
+        
+        Args:
+            source: Название источника
+            batch_id: Батч (ID задачи загрузки)
+            replace: Удалить прежние опубликованные батчи источника
+            
+        Returns:
+            int: Количество удаленных старых чанков
+        """
+        params = {"source": source, "batch_id": batch_id}
+        self.db.execute(text("""
+            UPDATE knowledge_base SET visible = true
+            WHERE source = :source AND batch_id = :batch_id AND NOT visible
+        """), params)
+        deleted_count = 0
+        if replace:
+            deleted_count = self.db.execute(text("""
+                DELETE FROM knowledge_base
+                WHERE source = :source AND visible AND batch_id IS DISTINCT FROM :batch_id
+            """), params).rowcount
+        # Точные значения по индексу source вместо инкремента: замена уменьшает счетчики
+        self.db.execute(text("""
+            INSERT INTO knowledge_sources (source, chunks_count, token_count, char_count, first_ingested_at, last_ingested_at)
+            SELECT source, count(*),
+                   coalesce(sum((metadata->>'token_count')::bigint), 0),
+                   coalesce(sum(length(content)), 0),
+                   min(created_at), now()
+            FROM knowledge_base
+            WHERE source = :source AND visible
+            GROUP BY source
+            ON CONFLICT (source) DO UPDATE
+            SET chunks_count = excluded.chunks_count,
+                token_count = excluded.token_count,
+                char_count = excluded.char_count,
+                first_ingested_at = excluded.first_ingested_at,
+                last_ingested_at = excluded.last_ingested_at
+        """), params)
+        generation = self.db.execute(generation_statement(CORPUS)).scalar()
+        
+        self.db.commit()
+        get_invalidation_bus().apply(CORPUS, generation)
+        return deleted_count
@@ -0,0 +1,304 @@
+"""
+Отложенная (write-behind) запись сообщений чата.
+Сообщения копятся в памяти и сбрасываются в БД пакетами (multi-row INSERT
+в user_chats + один upsert в chat_threads) по короткому интервалу, так что
+путь ответа в чате не ждет commit. При остановке очередь сбрасывается
+(с ограничением по времени); barrier() дает read-your-writes для чтения
+истории треда. Пакет, который не удалось записать за chat_write_max_retries
+попыток, сохраняется в dead-letter файл, чтобы не блокировать очередь.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import json
+import uuid
+
+from sqlalchemy import insert, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from config.settings import settings
+from database.models import UserChat, ChatThread
+from database.repositories import THREAD_PREVIEW_CHARS
+from utils.logger import logger
+
+
+# Пауза перед повтором после ошибки записи
+RETRY_DELAY_SECONDS = 1.0
+
+
+class ChatWriteBehind:
+    """Очередь сообщений чата с пакетной записью в фоне."""
+
+    def __init__(self, flush_interval: float | None = None, batch_size: int | None = None):
+        self.flush_interval = (
+            flush_interval if flush_interval is not None else settings.chat_write_flush_ms / 1000
+        )
+        self.batch_size = batch_size or settings.chat_write_batch_size
+        self.max_retries = max(1, settings.chat_write_max_retries)
+        self.stop_timeout = settings.chat_write_stop_timeout_seconds
+        self._dead_lettered = 0
+        self._pending: List[Dict[str, Any]] = []
+        self._seq = 0  # Номер последнего поставленного в очередь сообщения
+        self._flushed_seq = 0  # Все сообщения с номером <= этого записаны
+        self._thread_seq: Dict[Tuple[str, str], int] = {}
+        self._last_ts: Optional[datetime] = None
+        self._wakeup: asyncio.Event | None = None
+        self._flushed: asyncio.Condition | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    async def start(self) -> None:
+        """Запустить фоновый сброс очереди."""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._flushed = asyncio.Condition()
+        self._stopping = False
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info(f"Chat write-behind started (flush every {self.flush_interval * 1000:.0f} ms)")
+
+    async def stop(self) -> None:
+        """Остановить фоновый сброс, дописав все сообщения из очереди."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        timed_out = False
+        try:
+            await asyncio.wait_for(self._task, timeout=self.stop_timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+        # Дальше add() отклоняется; сообщения, пришедшие после последнего сброса, дописываем здесь
+        self._task = None
+        pending, self._pending = self._pending, []
+        if pending and not timed_out:
+            try:
+                await asyncio.to_thread(write_batch, pending)
+                pending = []
+            except Exception as e:
+                logger.error(f"Chat write-behind final flush failed ({len(pending)} messages): {e}")
+        if pending:
+            # БД недоступна: не держим остановку процесса, недописанное — в dead-letter
+            await asyncio.to_thread(dead_letter, pending, "shutdown timeout" if timed_out else "shutdown flush failed")
+            self._dead_lettered += len(pending)
+        if timed_out:
+            logger.error(
+                f"Chat write-behind stop timed out after {self.stop_timeout:.0f}s, "
+                f"{len(pending)} messages moved to {settings.chat_dead_letter_path}"
+            )
+        else:
+            logger.info("Chat write-behind stopped, queue flushed")
+
+    def add(
+        self,
+        user_id: str,
+        thread_id: str,
+        role: str,
+        content: str,
+        metadata: Optional[dict] = None
+    ) -> Dict[str, Any]:
+        """
+        Поставить сообщение в очередь записи (без обращения к БД).
+
+        Args:
+            user_id: ID пользователя
+            thread_id: ID треда
+            role: Роль ('user' или 'assistant')
+            content: Содержимое сообщения
+            metadata: Дополнительные метаданные
+
+        Returns:
+            Dict[str, Any]: Строка сообщения (id и created_at назначены сразу)
+        """
+        if self._task is None:
+            raise RuntimeError("Chat write-behind is not started")
+
+        # created_at строго возрастает: порядок сообщений внутри пакета сохраняется
+        now = datetime.now(timezone.utc)
+        if self._last_ts is not None and now <= self._last_ts:
+            now = self._last_ts + timedelta(microseconds=1)
+        self._last_ts = now
+
+        self._seq += 1
+        row = {
+            "id": uuid.uuid4(),
+            "user_id": user_id,
+            "thread_id": thread_id,
+            "role": role,
+            "content": content,
+            "extra_metadata": metadata or {},
+            "created_at": now,
+            "_seq": self._seq
+        }
+        self._pending.append(row)
+        self._thread_seq[(user_id, thread_id)] = self._seq
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return row
+
+    async def barrier(self, user_id: str, thread_id: str, timeout: float = 5.0) -> bool:
+        """
+        Дождаться записи всех поставленных в очередь сообщений треда
+        (read-your-writes перед чтением истории).
+
+        Args:
+            user_id: ID пользователя
+            thread_id: ID треда
+            timeout: Максимальное ожидание (БД может быть недоступна)
+
+        Returns:
+            bool: True, если все сообщения треда записаны
+        """
+        target = self._thread_seq.get((user_id, thread_id), 0)
+        if self._task is None or target <= self._flushed_seq:
+            return True
+        self._wakeup.set()
+        try:
+            async with self._flushed:
+                await asyncio.wait_for(
+                    self._flushed.wait_for(lambda: self._flushed_seq >= target),
+                    timeout=timeout
+                )
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"Chat write-behind barrier timed out for thread {thread_id}")
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние очереди."""
+        return {
+            "pending": len(self._pending),
+            "enqueued": self._seq,
+            "flushed": self._flushed_seq,
+            "dead_lettered": self._dead_lettered
+        }
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            failures = 0
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                try:
+                    await asyncio.to_thread(write_batch, batch)
+                except Exception as e:
+                    failures += 1
+                    if failures < self.max_retries:
+                        logger.error(
+                            f"Chat write-behind flush failed ({len(batch)} messages, "
+                            f"attempt {failures}/{self.max_retries}), retrying: {e}"
+                        )
+                        await asyncio.sleep(RETRY_DELAY_SECONDS)
+                        continue
+                    # Пакет не блокирует очередь и barrier(): сохраняем его для ручного восстановления
+                    logger.error(
+                        f"Chat write-behind gave up on {len(batch)} messages after {failures} attempts, "
+                        f"moved to {settings.chat_dead_letter_path}: {e}"
+                    )
+                    try:
+                        await asyncio.to_thread(dead_letter, batch, str(e))
+                    except Exception as dead_letter_error:
+                        logger.error(f"Chat dead-letter write failed, messages lost: {dead_letter_error}")
+                    self._dead_lettered += len(batch)
+                failures = 0
+                del self._pending[:len(batch)]
+                async with self._flushed:
+                    self._flushed_seq = batch[-1]["_seq"]
+                    self._flushed.notify_all()
+
+            if self._stopping:
+                return
+
+
+def write_batch(batch: List[Dict[str, Any]]) -> None:
+    """
+    Записать пакет сообщений одной транзакцией: multi-row INSERT
+    в user_chats и агрегированный upsert в chat_threads.
+
+    Args:
+        batch: Строки из ChatWriteBehind.add
+    """
+    from database.connection import engine
+
+    rows = [
+        {
+            "id": row["id"],
+            "user_id": row["user_id"],
+            "thread_id": row["thread_id"],
+            "role": row["role"],
+            "content": row["content"],
+            "metadata": row["extra_metadata"],
+            "created_at": row["created_at"]
+        }
+        for row in batch
+    ]
+
+    threads: Dict[Tuple[str, str], Dict[str, Any]] = defaultdict(lambda: {"message_count": 0})
+    for row in batch:
+        thread = threads[(row["user_id"], row["thread_id"])]
+        thread.setdefault("first_message_at", row["created_at"])
+        thread["message_count"] += 1
+        thread["last_message_at"] = row["created_at"]
+        thread["preview"] = row["content"][:THREAD_PREVIEW_CHARS]
+
+    thread_rows = [
+        {"user_id": user_id, "thread_id": thread_id, **values}
+        for (user_id, thread_id), values in threads.items()
+    ]
+    thread_stmt = pg_insert(ChatThread)
+    thread_stmt = thread_stmt.on_conflict_do_update(
+        index_elements=[ChatThread.user_id, ChatThread.thread_id],
+        set_={
+            "last_message_at": func.greatest(ChatThread.last_message_at, thread_stmt.excluded.last_message_at),
+            "message_count": ChatThread.message_count + thread_stmt.excluded.message_count,
+            "preview": thread_stmt.excluded.preview
+        }
+    )
+
+    with engine.begin() as conn:
+        conn.execute(insert(UserChat.__table__), rows)
+        conn.execute(thread_stmt, thread_rows)
+
+
+def dead_letter(batch: List[Dict[str, Any]], reason: str) -> None:
+    """
+    Дописать неудавшийся пакет сообщений в dead-letter файл (JSON Lines).
+
+    Args:
+        batch: Строки из ChatWriteBehind.add
+        reason: Причина (текст ошибки)
+    """
+    path = Path(settings.chat_dead_letter_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    failed_at = datetime.now(timezone.utc).isoformat()
+    with open(path, "a", encoding="utf-8") as f:
+        for row in batch:
+            record = {key: value for key, value in row.items() if key != "_seq"}
+            f.write(json.dumps({**record, "failed_at": failed_at, "reason": reason}, ensure_ascii=False, default=str) + "\n")
+
+
+# Singleton instance
+_chat_writer: ChatWriteBehind | None = None
+
+
+def get_chat_writer() -> ChatWriteBehind:
+    """
+    Получить очередь отложенной записи сообщений (singleton).
+
+    Returns:
+        ChatWriteBehind: Экземпляр очереди
+    """
+    global _chat_writer
+
+    if _chat_writer is None:
+        _chat_writer = ChatWriteBehind()
+
+    return _chat_writer
@@ -4,39 +4,44 @@
 """
 
 from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.runnables import RunnableConfig
 from langchain_openai import ChatOpenAI
 # # from langchain_ollama import ChatOllama
 
 from graph.state import GraphState
 from tools.intent_classifier import get_intent_classifier
-from tools.rag_retriever import get_rag_retriever
+from tools.rag_retriever import get_rag_retriever, QUERY_EMBEDDING_CONFIG_KEY
 from config.settings import settings
-from config.prompts import GENERATOR_SYSTEM_PROMPT
-from utils.llm_factory import get_llm
+from config.prompts import GENERATOR_SYSTEM_PROMPT, GENERATOR_STAGE_PROMPT, STRUCTURED_OUTPUT_PROMPT
+from utils.llm_factory import get_llm, OUTPUT_SCHEMA_CONFIG_KEY
+from utils.prompt_layout import PromptLayout, get_prefix_tracker
+from utils.deadline import Deadline, record_degradation
 from utils.logger import logger
+import json
 
 
-def strategy_node(state: GraphState) -> GraphState:
+def load_strategy_context() -> str | None:
     """
-    Узел стратегии: подгружает личную стратегию пользователя из БД.
-    Это дает ИИ понимание 'Кто я', 'Что продаем', 'Какие кейсы'.
+    Загрузить стратегию пользователя из БД и оформить ее как контекст для LLM.
+    
+    Returns:
+        str | None: Контекст стратегии или None, если стратегии нет
     """
-    logger.info("=== Strategy Node ===")
+    from database.connection import get_db
+    from database.models import UserStrategy
+    
+    # Получаем сессию БД
+    db_gen = get_db()
+    db = next(db_gen)
     
     try:
-        from database.connection import get_db
-        from database.models import UserStrategy
-        
-        # Получаем сессию БД
-        db_gen = get_db()
-        db = next(db_gen)
-        
         # Получаем стратегию (default юзер)
         strategy = db.query(UserStrategy).filter(UserStrategy.user_id == "default").first()
+        if not strategy:
+            return None
         
-        if strategy:
-            # Формируем читаемый контекст для LLM
-            strategy_context = f"""
+        # Формируем читаемый контекст для LLM
+        strategy_context = f"""
 ### ЭТАЛОННЫЙ КОНТЕКСТ ЭКСПЕРТА (КТО Я):
 {strategy.full_context}
 
@@ -45,29 +50,78 @@ def strategy_node(state: GraphState) -> GraphState:
 - КЕЙСЫ: {strategy.cases}
 - ТРИГГЕРЫ: {strategy.triggers}
 """
-            # Логика Shorts
-            if strategy.shorts_logic:
-                sl = strategy.shorts_logic
-                if isinstance(sl, str):
-                    try: import json; sl = json.loads(sl)
-                    except: pass
-                
-                if isinstance(sl, dict):
-                    strategy_context += f"\n### ПРАВИЛА ВАШИХ SHORTS:\n"
-                    strategy_context += f"- СТРУКТУРА: {' -> '.join(sl.get('structure', []))}\n"
-                    strategy_context += f"- ПРИМЕРЫ ХУКОВ ДЛЯ МОДЕЛЕЙ: {', '.join(sl.get('hook_examples', []))}\n"
-            # Монетизация
-            if strategy.monetization:
-                m = strategy.monetization
-                if isinstance(m, str):
-                    try: import json; m = json.loads(m)
-                    except: pass
-                
-                if isinstance(m, dict):
-                    strategy_context += f"- МОНЕТИЗАЦИЯ: {m.get('product', 'Курс')} за {m.get('price', '50k')}\n"
-                    strategy_context += f"- АКТИВЫ: {', '.join(m.get('assets', []))}\n"
+        # Логика Shorts
+        if strategy.shorts_logic:
+            sl = strategy.shorts_logic
+            if isinstance(sl, str):
+                try: sl = json.loads(sl)
+                except: pass
+            
+            if isinstance(sl, dict):
+                strategy_context += f"\n### ПРАВИЛА ВАШИХ SHORTS:\n"
+                strategy_context += f"- СТРУКТУРА: {' -> '.join(sl.get('structure', []))}\n"
+                strategy_context += f"- ПРИМЕРЫ ХУКОВ ДЛЯ МОДЕЛЕЙ: {', '.join(sl.get('hook_examples', []))}\n"
+        # Монетизация
+        if strategy.monetization:
+            m = strategy.monetization
+            if isinstance(m, str):
+                try: m = json.loads(m)
+                except: pass
+            
+            if isinstance(m, dict):
+                strategy_context += f"- МОНЕТИЗАЦИЯ: {m.get('product', 'Курс')} за {m.get('price', '50k')}\n"
+                strategy_context += f"- АКТИВЫ: {', '.join(m.get('assets', []))}\n"
+        
+        return strategy_context
+    finally:
+        db_gen.close()
+
 
-            state["summary"] = (state.get("summary") or "") + "\n" + strategy_context
+def load_book_passport() -> str:
+    """
+    Загрузить "паспорт книги" (глобальный контекст) из базы знаний.
+    
+    Returns:
+        str: Паспорт или пояснение, что его нет
+    """
+    from database.connection import get_supabase_client
+    client = get_supabase_client()
+    
+    # Ищем опубликованный чанк с типом 'passport' (невидимые — недописанные батчи загрузки)
+    response = (
+        client.table("knowledge_base")
+        .select("content")
+        .filter("metadata->>type", "eq", "passport")
+        .eq("visible", True)
+        .execute()
+    )
+    
+    if response.data and len(response.data) > 0:
+        logger.info("Book passport found")
+        return response.data[0]["content"]
+    
+    # Если паспорта нет, можно попробовать вывести список источников для контекста
+    logger.info("No passport found in DB")
+    return "Глобальный паспорт книги не найден. Ассистент будет использовать только найденные фрагменты."
+
+
+def strategy_node(state: GraphState) -> GraphState:
+    """
+    Узел стратегии: подгружает личную стратегию пользователя из БД.
+    Это дает ИИ понимание 'Кто я', 'Что продаем', 'Какие кейсы'.
+    Стратегия, предзагруженная для этого запуска (пакетный режим), не перечитывается.
+    """
+    logger.info("=== Strategy Node ===")
+    
+    if "strategy" in (state.get("run") or {}).get("preloaded", ()):
+        logger.info("User strategy preloaded, skipping DB load")
+        return state
+    
+    try:
+        strategy_context = load_strategy_context()
+        if strategy_context:
+            # Стратегия хранится отдельно от паспорта: summary_node перезаписывает summary
+            state["strategy"] = strategy_context
             logger.info("User strategy successfully loaded into context")
         else:
             logger.info("No user strategy found in DB")
@@ -78,12 +132,13 @@ def strategy_node(state: GraphState) -> GraphState:
     return state
 
 
-def router_node(state: GraphState) -> GraphState:
+def router_node(state: GraphState, config: RunnableConfig = None) -> GraphState:
     """
     Узел маршрутизации: определяет намерение пользователя.
     
     Args:
         state: Текущее состояние графа
+        config: Конфиг прогона (содержит deadline)
         
     Returns:
         GraphState: Обновленное состояние с intent
@@ -108,9 +163,13 @@ def router_node(state: GraphState) -> GraphState:
         elif isinstance(msg, AIMessage):
             chat_history.append({"role": "assistant", "content": msg.content})
     
-    # Классифицируем намерение
-    classifier = get_intent_classifier()
-    intent = classifier.classify(user_message, chat_history)
+    # Классифицируем намерение (при нехватке бюджета — без вызова LLM)
+    if Deadline.from_config(config).should_degrade("skip_intent_classification"):
+        record_degradation(state, "skip_intent_classification")
+        intent = "knowledge_base_search"
+    else:
+        classifier = get_intent_classifier()
+        intent = classifier.classify(user_message, chat_history)
     
     logger.info(f"Intent classified: {intent}")
     
@@ -123,30 +182,26 @@ def router_node(state: GraphState) -> GraphState:
     return state
 
 
-def summary_node(state: GraphState) -> GraphState:
+def summary_node(state: GraphState, config: RunnableConfig = None) -> GraphState:
     """
     Узел Summary: подгружает "паспорт книги" (глобальный контекст).
     Это позволяет ИИ знать общее содержание книги, список глав и т.д.
+    Паспорт, предзагруженный для этого запуска, не перечитывается.
     """
     logger.info("=== Summary Node ===")
     
-    # Пытаемся получить паспорт книги из метаданных или специального поиска
-    # Для начала просто создаем заглушку-запрос к БД для поиска метаданных
+    if "summary" in (state.get("run") or {}).get("preloaded", ()):
+        logger.info("Book passport preloaded, skipping DB load")
+        return state
+    
+    if Deadline.from_config(config).should_degrade("skip_passport"):
+        record_degradation(state, "skip_passport")
+        state["summary"] = None
+        return state
+    
     try:
-        from database.connection import get_supabase_client
-        client = get_supabase_client()
-        
-        # Ищем чанк с типом 'summary' или 'passport'
-        response = client.table("knowledge_base").select("content").filter("metadata->>type", "eq", "passport").execute()
-        
-        if response.data and len(response.data) > 0:
-            state["summary"] = response.data[0]["content"]
-            logger.info("Book passport found and loaded into state")
-        else:
-            # Если паспорта нет, можно попробовать вывести список источников для контекста
-            logger.info("No passport found in DB")
-            state["summary"] = "Глобальный паспорт книги не найден. Ассистент будет использовать только найденные фрагменты."
-            
+        state["summary"] = load_book_passport()
+        logger.info("Book passport loaded into state")
     except Exception as e:
         logger.error(f"Error in summary_node: {e}")
         state["summary"] = None
@@ -154,12 +209,13 @@ def summary_node(state: GraphState) -> GraphState:
     return state
 
 
-def rag_node(state: GraphState) -> GraphState:
+def rag_node(state: GraphState, config: RunnableConfig = None) -> GraphState:
     """
     Узел RAG: выполняет векторный поиск в базе знаний.
     
     Args:
         state: Текущее состояние графа
+        config: Конфиг прогона (содержит deadline)
         
     Returns:
         GraphState: Обновленное состояние с context и sources
@@ -194,9 +250,28 @@ def rag_node(state: GraphState) -> GraphState:
         filter_metadata = {}
         logger.info("🔍 Diagnostic mode: searching across all documents without filter")
 
+    # Деградация по бюджету времени
+    deadline = Deadline.from_config(config)
+    extract_chapter = True
+    if deadline.should_degrade("skip_chapter_extraction"):
+        record_degradation(state, "skip_chapter_extraction")
+        extract_chapter = False
+    top_k = None
+    if deadline.should_degrade("shrink_top_k"):
+        record_degradation(state, "shrink_top_k")
+        top_k = settings.degraded_top_k
+
     # Выполняем поиск (graceful fallback если embeddings недоступны)
     try:
-        context, sources = retriever.retrieve_and_format(query, filter_metadata=filter_metadata, use_scores=True)
+        retriever = get_rag_retriever()
+        context, sources = retriever.retrieve_and_format(
+            query,
+            top_k=top_k,
+            filter_metadata=filter_metadata,
+            use_scores=True,
+            extract_chapter=extract_chapter,
+            query_embedding=((config or {}).get("configurable") or {}).get(QUERY_EMBEDDING_CONFIG_KEY)
+        )
         # Временно снижаем порог вручную в retriever если нужно, но лучше просто проверить что вернет.
         
         logger.info(f"RAG retrieved {len(sources)} sources")
@@ -225,12 +300,13 @@ def rag_node(state: GraphState) -> GraphState:
     return state
 
 
-def generator_node(state: GraphState) -> GraphState:
+def generator_node(state: GraphState, config: RunnableConfig = None) -> GraphState:
     """
     Узел генерации: создает финальный ответ пользователю.
     
     Args:
         state: Текущее состояние графа
+        config: Конфиг прогона (содержит deadline)
         
     Returns:
         GraphState: Обновленное состояние с ответом assistant
@@ -246,30 +322,15 @@ def generator_node(state: GraphState) -> GraphState:
         logger.info(f"Context (first 500 chars): {context[:500]}")
     # --- END DEBUG LOGGING ---
 
-    # Инициализируем LLM (OpenAI или Ollama)
-    # Инициализируем LLM (OpenAI или Ollama)
-    llm = get_llm(temperature=settings.temperature)
-    
-    # Формируем промпт
-    messages = [{"role": "system", "content": GENERATOR_SYSTEM_PROMPT}]
-    
-    # Добавляем контекст из RAG (если есть)
-    if context:
-        context_message = {
-            "role": "system",
-            "content": f"Контекст из базы знаний:\n\n{context}"
-        }
-        messages.append(context_message)
-    
-    # Добавляем "паспорт" книги (глобальный контекст)
-    if summary:
-        summary_message = {
-            "role": "system",
-            "content": f"Глобальный контекст книги (паспорт):\n\n{summary}"
-        }
-        messages.append(summary_message)
-    
-    # Форматируем системный промпт с учетом этапа и блюпринта
+    # Инициализируем LLM (OpenAI или Ollama); при нехватке бюджета — быструю модель
+    fast = Deadline.from_config(config).should_degrade("fast_model")
+    if fast:
+        record_degradation(state, "fast_model")
+    # Схема ответа (например, EnhanceResponse): генерация сразу в JSON-режиме
+    output_schema = ((config or {}).get("configurable") or {}).get(OUTPUT_SCHEMA_CONFIG_KEY)
+    llm = get_llm(temperature=settings.temperature, fast=fast, json_mode=output_schema is not None)
+    
+    # Форматируем этап и блюпринт
     current_stage = state.get("current_stage", 1)
     blueprint = state.get("blueprint", {})
     
@@ -282,21 +343,40 @@ def generator_node(state: GraphState) -> GraphState:
     else:
         blueprint_summary = "Стратегия еще не начата. Мы на ЭТАПЕ 1."
 
-    # Обновляем основной системный промпт данными
-    formatted_system_prompt = GENERATOR_SYSTEM_PROMPT.format(
+    # Формируем промпт: байтово-стабильные части первыми, изменчивые — в конце,
+    # чтобы Ollama переиспользовала KV-кэш общего префикса между ходами
+    layout = PromptLayout()
+    layout.add_stable("system", GENERATOR_SYSTEM_PROMPT)
+    strategy = state.get("strategy") or ""
+    if strategy:
+        layout.add_stable("system", strategy)
+    # "Паспорт" книги (глобальный контекст)
+    if summary:
+        layout.add_stable("system", f"Глобальный контекст книги (паспорт):\n\n{summary}")
+    
+    layout.add_volatile("system", GENERATOR_STAGE_PROMPT.format(
         current_stage=current_stage,
         blueprint_summary=blueprint_summary
-    )
+    ))
     
-    # Заменяем первый системный промпт на отформатированный
-    messages[0]["content"] = formatted_system_prompt
-    
-    # Добавляем историю чата (последние 10 сообщений)
-    for msg in state["messages"][-10:]:
+    # История чата (последние 10 сообщений); контекст из RAG — перед последней репликой
+    history = state["messages"][-10:]
+    for i, msg in enumerate(history):
+        if i == len(history) - 1 and context:
+            layout.add_volatile("system", f"Контекст из базы знаний:\n\n{context}")
         if isinstance(msg, HumanMessage):
-            messages.append({"role": "user", "content": msg.content})
+            layout.add_volatile("user", msg.content)
         elif isinstance(msg, AIMessage):
-            messages.append({"role": "assistant", "content": msg.content})
+            layout.add_volatile("assistant", msg.content)
+    if context and not history:
+        layout.add_volatile("system", f"Контекст из базы знаний:\n\n{context}")
+    if output_schema is not None:
+        layout.add_volatile("system", STRUCTURED_OUTPUT_PROMPT.format(
+            schema=json.dumps(output_schema.model_json_schema(), ensure_ascii=False)
+        ))
+    
+    messages = layout.build()
+    prompt_stats = get_prefix_tracker().record(state.get("thread_id") or "", layout)
     
     logger.info(f"Final prompt message count: {len(messages)}")
     # Log the system role messages to see context presence
@@ -312,34 +392,40 @@ def generator_node(state: GraphState) -> GraphState:
         
         logger.info(f"LLM call successful. Generated answer: {len(answer)} chars")
         
+        # Фактический prefill по данным Ollama (если модель его вернула)
+        response_metadata = getattr(response, "response_metadata", None) or {}
+        if response_metadata.get("prompt_eval_count") is not None:
+            prompt_stats["prompt_eval_count"] = response_metadata["prompt_eval_count"]
+        
         # Парсим ответ на наличие JSON-данных текущего этапа
         # Если агент выдал структурированный ответ по этапу, сохраняем его в блюпринт
-        try:
-            import re
-            import json
-            # Ищем JSON в блоках кода или просто в тексте
-            json_match = re.search(r"```json\s*(.*?)\s*```", answer, re.DOTALL) or re.search(r"(\{.*?\})", answer, re.DOTALL)
-            if json_match:
-                stage_data = json.loads(json_match.group(1))
-                stage_num = state.get("current_stage", 1)
+        # (в режиме схемы JSON — это ответ по схеме, а не данные этапа)
+        if output_schema is None:
+            try:
+                import re
+                # Ищем JSON в блоках кода или просто в тексте
+                json_match = re.search(r"```json\s*(.*?)\s*```", answer, re.DOTALL) or re.search(r"(\{.*?\})", answer, re.DOTALL)
+                if json_match:
+                    stage_data = json.loads(json_match.group(1))
+                    stage_num = state.get("current_stage", 1)
                 
-                # Сохраняем данные в блюпринт
-                if "blueprint" not in state or state["blueprint"] is None:
-                    state["blueprint"] = {}
+                    # Сохраняем данные в блюпринт
+                    if "blueprint" not in state or state["blueprint"] is None:
+                        state["blueprint"] = {}
                 
-                state["blueprint"][str(stage_num)] = stage_data
-                logger.info(f"✨ Stage {stage_num} data saved to blueprint")
+                    state["blueprint"][str(stage_num)] = stage_data
+                    logger.info(f"✨ Stage {stage_num} data saved to blueprint")
                 
-                # Если этап завершен успешно, переходим к следующему
-                if stage_num < 10:
-                    state["current_stage"] = stage_num + 1
-                    logger.info(f"🚀 Moving to Stage {state['current_stage']}")
+                    # Если этап завершен успешно, переходим к следующему
+                    if stage_num < 10:
+                        state["current_stage"] = stage_num + 1
+                        logger.info(f"🚀 Moving to Stage {state['current_stage']}")
                     
-                    # Специальная метка для фронтенда о сохранении этапа
-                    if "metadata" not in state: state["metadata"] = {}
-                    state["metadata"]["last_saved_stage"] = stage_num
-        except Exception as e:
-            logger.warning(f"Failed to auto-parse stage data: {e}")
+                        # Специальная метка для фронтенда о сохранении этапа
+                        if "metadata" not in state: state["metadata"] = {}
+                        state["metadata"]["last_saved_stage"] = stage_num
+            except Exception as e:
+                logger.warning(f"Failed to auto-parse stage data: {e}")
 
         # Добавляем ответ в messages
         state["messages"].append(AIMessage(content=answer))
@@ -350,6 +436,11 @@ def generator_node(state: GraphState) -> GraphState:
         # Добавляем метаданные
         state["metadata"]["sources"] = state.get("sources", [])
         state["metadata"]["intent"] = state.get("intent")
+        state["metadata"]["prompt_cache"] = prompt_stats
+        # Признак успешного ответа именно в этом запуске (metadata.intent переживает ходы треда)
+        if state.get("run") is None:
+            state["run"] = {}
+        state["run"]["answered"] = True
         
     except Exception as e:
         logger.error(f"Generation error: {e}")
@@ -19,9 +19,11 @@ class GraphState(TypedDict):
         intent: Определенное намерение (knowledge_base_search, creative_writing, direct_response)
         context: Контекст из RAG (если был поиск)
         sources: Метаданные источников (если был RAG)
+        strategy: Стратегия пользователя (стабильная часть промпта)
         current_stage: Текущий этап продюсерского пайплайна (1-10)
         blueprint: Данные стратегии, накопленные по этапам
-        metadata: Дополнительные метаданные
+        metadata: Дополнительные метаданные (сохраняются в checkpoint треда)
+        run: Данные текущего запуска (деградации и т.п.) — каждый вызов передает пустой dict
     """
     
     # История сообщений (добавляются через operator.add)
@@ -36,6 +38,7 @@ class GraphState(TypedDict):
     persona: str | None # Текущая роль (например, 'velizhanin', 'esther')
     
     # Контекст из RAG
+    strategy: str | None
     summary: str | None
     context: str | None
     sources: List[Dict[str, Any]] | None
@@ -46,6 +49,10 @@ class GraphState(TypedDict):
     
     # Дополнительные метаданные
     metadata: Dict[str, Any]
+    
+    # Данные одного запуска: checkpointer хранит состояние по thread_id,
+    # поэтому поле сбрасывается в initial state каждого вызова
+    run: Dict[str, Any]
 
 
 # Вспомогательная функция для создания начального состояния
@@ -70,10 +77,12 @@ def create_initial_state(
         "user_id": user_id,
         "thread_id": thread_id,
         "intent": None,
+        "strategy": None,
         "summary": None,
         "context": None,
         "sources": None,
         "current_stage": 1,
         "blueprint": {},
-        "metadata": {}
+        "metadata": {},
+        "run": {}
     }
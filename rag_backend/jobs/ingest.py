@@ -0,0 +1,245 @@
+"""
+Конвейер загрузки документа: parse → chunk → embed → store → publish.
+Промежуточные чанки и сохраненные батчи фиксируются, поэтому
+прерванная задача продолжается с места остановки. Чанки пишутся невидимыми
+под batch_id = ID задачи и публикуются одной транзакцией в конце.
+"""
+
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Iterator, Tuple
+import asyncio
+import json
+import shutil
+
+from sqlalchemy import text
+
+from config.settings import settings
+from jobs.store import IngestJob
+from utils.logger import logger
+
+
+def _artifacts_dir(job: IngestJob) -> Path:
+    return Path(settings.ingest_jobs_dir) / job.id
+
+
+def _chunks_path(job: IngestJob) -> Path:
+    return _artifacts_dir(job) / "chunks.jsonl"
+
+
+def parse_and_chunk(job: IngestJob, on_stage: Callable[[str], None]) -> int:
+    """
+    Этапы parse и chunk потоком: страницы документа читаются по одной,
+    чанки сразу дописываются в chunks.jsonl (память — на один чанк).
+    При повторном запуске готовый файл переиспользуется.
+
+    Args:
+        job: Задача
+        on_stage: Колбэк смены этапа
+
+    Returns:
+        int: Количество чанков
+    """
+    from utils.document_loader import iter_pages
+    from utils.chunking import iter_document_chunks
+
+    chunks_path = _chunks_path(job)
+    if chunks_path.exists():
+        with open(chunks_path, encoding="utf-8") as f:
+            total = sum(1 for _ in f)
+        logger.info(f"Job {job.id}: resumed with {total} stored chunks")
+        return total
+
+    on_stage("parse")
+    chunks_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = chunks_path.with_suffix(".tmp")
+    total = 0
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        chunks = iter_document_chunks(iter_pages(job.file_path), job.source, job.metadata.get("extra_metadata"))
+        for chunk in chunks:
+            if total == 0:
+                on_stage("chunk")
+            chunk["metadata"]["ingest_job"] = job.id
+            f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+            total += 1
+    tmp_path.replace(chunks_path)
+
+    logger.info(f"Job {job.id}: '{job.source}' chunked into {total} pieces")
+    return total
+
+
+def iter_chunk_batches(job: IngestJob, batch_size: int, skip: set) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    Батчи чанков из chunks.jsonl по мере чтения файла.
+
+    Args:
+        job: Задача
+        batch_size: Размер батча
+        skip: Начальные индексы уже сохраненных батчей
+
+    Yields:
+        Tuple[int, List[Dict[str, Any]]]: (индекс первого чанка, чанки)
+    """
+    batch: List[Dict[str, Any]] = []
+    start = 0
+    with open(_chunks_path(job), encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            if index % batch_size == 0:
+                if batch:
+                    yield start, batch
+                batch, start = [], index
+            if start not in skip:
+                batch.append(json.loads(line))
+    if batch:
+        yield start, batch
+
+
+def discard_unfinished_batches(job: IngestJob, pending_indexes: List[int]) -> int:
+    """
+    Удалить строки, которые могли попасть в БД из незавершенных батчей
+    (процесс упал между INSERT и фиксацией прогресса).
+
+    Returns:
+        int: Количество удаленных строк
+    """
+    from database.connection import engine
+
+    if not pending_indexes:
+        return 0
+    with engine.begin() as conn:
+        result = conn.execute(text("""
+            DELETE FROM knowledge_base
+            WHERE batch_id = :job_id
+              AND (metadata->>'chunk_index')::int = ANY(:indexes)
+        """), {"job_id": job.id, "indexes": pending_indexes})
+    return result.rowcount
+
+
+def discard_batch(job: IngestJob) -> int:
+    """
+    Удалить неопубликованные чанки задачи (после ошибки загрузки).
+
+    Returns:
+        int: Количество удаленных строк
+    """
+    from database.connection import engine
+
+    with engine.begin() as conn:
+        result = conn.execute(text("""
+            DELETE FROM knowledge_base WHERE batch_id = :job_id AND NOT visible
+        """), {"job_id": job.id})
+    return result.rowcount
+
+
+def finalize_job(job: IngestJob) -> None:
+    """
+    Опубликовать батч задачи (при замене — удалить прежнюю версию источника),
+    обновить статистику, сбросить кэши и удалить артефакты задачи.
+    """
+    from database.connection import SessionLocal
+    from database.repositories import KnowledgeRepository
+
+    replace = bool(job.metadata.get("replace"))
+    db = SessionLocal()
+    try:
+        replaced = KnowledgeRepository(db).publish_batch(job.source, job.id, replace=replace)
+    finally:
+        db.close()
+    if replace:
+        logger.info(f"Job {job.id}: '{job.source}' replaced ({replaced} old chunks removed)")
+
+    shutil.rmtree(_artifacts_dir(job), ignore_errors=True)
+
+
+async def run_ingest_job(job: IngestJob, save: Callable[[IngestJob], Any], concurrency: int | None = None) -> IngestJob:
+    """
+    Выполнить задачу загрузки.
+
+    Args:
+        job: Задача (может быть частично выполненной)
+        save: Синхронная функция сохранения состояния задачи
+        concurrency: Параллельных батчей эмбеддинга внутри задачи
+
+    Returns:
+        IngestJob: Завершенная задача
+    """
+    from database.connection import get_vector_store
+
+    concurrency = concurrency or settings.ingest_job_concurrency
+    batch_size = settings.ingest_batch_size
+    save_lock = asyncio.Lock()
+
+    async def persist() -> None:
+        async with save_lock:
+            await asyncio.to_thread(save, job)
+
+    def set_stage(stage: str) -> None:
+        job.stage = stage
+        save(job)
+
+    job.status = "running"
+    await persist()
+
+    total = await asyncio.to_thread(parse_and_chunk, job, set_stage)
+    job.total_chunks = total
+
+    done_batches = set(job.metadata.get("stored_batches", []))
+    pending = [start for start in range(0, total, batch_size) if start not in done_batches]
+    pending_indexes = [i for start in pending for i in range(start, min(start + batch_size, total))]
+    # Процесс мог упасть между INSERT батча и фиксацией прогресса: такие строки
+    # удаляются всегда, иначе при публикации они станут видимыми дубликатами
+    if done_batches:
+        removed = await asyncio.to_thread(discard_unfinished_batches, job, pending_indexes)
+        logger.info(f"Job {job.id}: resuming, {len(done_batches)} batches done, {removed} partial rows removed")
+    else:
+        removed = await asyncio.to_thread(discard_batch, job)
+        if removed:
+            logger.info(f"Job {job.id}: no progress recorded, {removed} partial rows removed")
+    job.stored_chunks = total - len(pending_indexes)
+    await persist()
+
+    vector_store = get_vector_store()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def process_batch(start: int, batch: List[Dict[str, Any]]) -> None:
+        try:
+            texts = [chunk["content"] for chunk in batch]
+            metadatas = [{**chunk["metadata"], "total_chunks": total} for chunk in batch]
+            job.stage = "embed"
+            embeddings = await asyncio.to_thread(vector_store.embeddings.embed_documents, texts)
+            job.stage = "store"
+            await asyncio.to_thread(
+                vector_store.add_embeddings, texts, embeddings, metadatas, job.id, False
+            )
+        finally:
+            semaphore.release()
+        job.metadata.setdefault("stored_batches", []).append(start)
+        job.stored_chunks += len(batch)
+        await persist()
+        logger.info(f"Job {job.id}: {job.stored_chunks}/{job.total_chunks} chunks stored")
+
+    # Батчи читаются из файла только когда есть свободный слот: в памяти не больше concurrency батчей
+    batches = iter_chunk_batches(job, batch_size, done_batches)
+    tasks: List[asyncio.Task] = []
+    try:
+        while True:
+            await semaphore.acquire()
+            failed = next((task for task in tasks if task.done() and task.exception()), None)
+            item = None if failed else await asyncio.to_thread(next, batches, None)
+            if item is None:
+                semaphore.release()
+                break
+            tasks.append(asyncio.create_task(process_batch(*item)))
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        batches.close()
+
+    job.stage = "publish"
+    await persist()
+    await asyncio.to_thread(finalize_job, job)
+    job.status = "done"
+    job.stage = None
+    await persist()
+    logger.info(f"Job {job.id}: '{job.source}' ingested ({job.total_chunks} chunks)")
+    return job
@@ -0,0 +1,280 @@
+"""
+Хранилище задач фоновой загрузки документов.
+SQLite по умолчанию, Redis — если задан REDIS_URL и установлен пакет redis.
+Состояние задач переживает перезапуск процесса. Задачу выполняет только
+владелец аренды (claim): аренда продлевается heartbeat'ом, после ее истечения
+задачу может забрать другой процесс.
+"""
+
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, List, Optional
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+
+from config.settings import settings
+from utils.logger import logger
+
+try:
+    import redis
+except ImportError:  # Redis опционален
+    redis = None
+
+
+# Этапы конвейера в порядке выполнения
+STAGES = ["parse", "chunk", "embed", "store", "publish"]
+
+# Конечные статусы задачи
+FINISHED_STATUSES = {"done", "failed"}
+
+
+def new_owner_id() -> str:
+    """Идентификатор владельца аренды задач: хост, PID и случайный суффикс."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+@dataclass
+class IngestJob:
+    """Задача загрузки документа"""
+    filename: str
+    file_path: str
+    source: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"  # queued, running, done, failed
+    stage: Optional[str] = None
+    total_chunks: int = 0
+    stored_chunks: int = 0
+    error: Optional[str] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    @property
+    def progress(self) -> float:
+        """Доля сохраненных чанков (0..1)."""
+        if self.status == "done":
+            return 1.0
+        if not self.total_chunks:
+            return 0.0
+        return self.stored_chunks / self.total_chunks
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Представление для API."""
+        data = asdict(self)
+        data["progress"] = round(self.progress, 4)
+        return data
+
+
+class SQLiteJobStore:
+    """Хранилище задач в локальном SQLite-файле."""
+
+    def __init__(self, path: str | None = None):
+        self.path = Path(path or settings.ingest_jobs_db_path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(ingest_jobs)")}
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE ingest_jobs ADD COLUMN owner TEXT")
+            if "lease_expires_at" not in columns:
+                conn.execute("ALTER TABLE ingest_jobs ADD COLUMN lease_expires_at REAL NOT NULL DEFAULT 0")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def save(self, job: IngestJob) -> IngestJob:
+        """Сохранить задачу целиком."""
+        job.updated_at = time.time()
+        with self._lock, self._connect() as conn:
+            # Колонки аренды не трогаем: ими управляют только claim/release
+            conn.execute(
+                """
+                INSERT INTO ingest_jobs (id, status, payload, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE
+                SET status = excluded.status, payload = excluded.payload, updated_at = excluded.updated_at
+                """,
+                (job.id, job.status, json.dumps(asdict(job), ensure_ascii=False), job.updated_at)
+            )
+        return job
+
+    def claim(self, job_id: str, owner: str, lease_seconds: float) -> Optional[IngestJob]:
+        """
+        Атомарно взять (или продлить) аренду незавершенной задачи.
+
+        Args:
+            job_id: ID задачи
+            owner: Идентификатор владельца (new_owner_id)
+            lease_seconds: Срок аренды
+
+        Returns:
+            IngestJob или None, если задача завершена или арендована другим владельцем
+        """
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            claimed = conn.execute(
+                """
+                UPDATE ingest_jobs SET owner = ?, lease_expires_at = ?
+                WHERE id = ? AND status NOT IN ('done', 'failed')
+                  AND (owner IS NULL OR owner = ? OR lease_expires_at < ?)
+                """,
+                (owner, now + lease_seconds, job_id, owner, now)
+            ).rowcount
+            row = conn.execute("SELECT payload FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone() if claimed else None
+        return IngestJob(**json.loads(row[0])) if row else None
+
+    def release(self, job_id: str, owner: str) -> None:
+        """Снять аренду, если она принадлежит owner."""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE ingest_jobs SET owner = NULL, lease_expires_at = 0 WHERE id = ? AND owner = ?",
+                (job_id, owner)
+            )
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        """Получить задачу по ID."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT payload FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        return IngestJob(**json.loads(row[0])) if row else None
+
+    def list_unfinished(self) -> List[IngestJob]:
+        """Задачи, которые не завершились (для возобновления после рестарта)."""
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT payload FROM ingest_jobs WHERE status NOT IN ('done', 'failed') ORDER BY updated_at"
+            ).fetchall()
+        return [IngestJob(**json.loads(row[0])) for row in rows]
+
+    def list_resumable(self) -> List[IngestJob]:
+        """Незавершенные задачи без действующей аренды (владелец умер или еще не назначен)."""
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT payload FROM ingest_jobs
+                WHERE status NOT IN ('done', 'failed') AND (owner IS NULL OR lease_expires_at < ?)
+                ORDER BY updated_at
+                """,
+                (time.time(),)
+            ).fetchall()
+        return [IngestJob(**json.loads(row[0])) for row in rows]
+
+
+class RedisJobStore:
+    """Хранилище задач в Redis (hash на задачу + множество незавершенных)."""
+
+    KEY_PREFIX = "ingest_job:"
+    LEASE_PREFIX = "ingest_job_lease:"
+    UNFINISHED_KEY = "ingest_jobs:unfinished"
+
+    # Взять аренду, если она свободна или уже принадлежит владельцу
+    CLAIM_SCRIPT = """
+        local current = redis.call('GET', KEYS[1])
+        if current and current ~= ARGV[1] then
+            return 0
+        end
+        redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+        return 1
+    """
+
+    # Снять аренду только своему владельцу
+    RELEASE_SCRIPT = """
+        if redis.call('GET', KEYS[1]) == ARGV[1] then
+            return redis.call('DEL', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self._claim = self.client.register_script(self.CLAIM_SCRIPT)
+        self._release = self.client.register_script(self.RELEASE_SCRIPT)
+
+    def save(self, job: IngestJob) -> IngestJob:
+        """Сохранить задачу целиком."""
+        job.updated_at = time.time()
+        pipe = self.client.pipeline()
+        pipe.set(self.KEY_PREFIX + job.id, json.dumps(asdict(job), ensure_ascii=False))
+        if job.status in FINISHED_STATUSES:
+            pipe.srem(self.UNFINISHED_KEY, job.id)
+        else:
+            pipe.sadd(self.UNFINISHED_KEY, job.id)
+        pipe.execute()
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        """Получить задачу по ID."""
+        payload = self.client.get(self.KEY_PREFIX + job_id)
+        return IngestJob(**json.loads(payload)) if payload else None
+
+    def list_unfinished(self) -> List[IngestJob]:
+        """Задачи, которые не завершились (для возобновления после рестарта)."""
+        jobs = [self.get(job_id) for job_id in self.client.smembers(self.UNFINISHED_KEY)]
+        return sorted((job for job in jobs if job), key=lambda job: job.updated_at)
+
+    def claim(self, job_id: str, owner: str, lease_seconds: float) -> Optional[IngestJob]:
+        """
+        Атомарно взять (или продлить) аренду незавершенной задачи.
+
+        Args:
+            job_id: ID задачи
+            owner: Идентификатор владельца (new_owner_id)
+            lease_seconds: Срок аренды
+
+        Returns:
+            IngestJob или None, если задача завершена или арендована другим владельцем
+        """
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return None
+        claimed = self._claim(keys=[self.LEASE_PREFIX + job_id], args=[owner, int(lease_seconds * 1000)])
+        return job if claimed else None
+
+    def release(self, job_id: str, owner: str) -> None:
+        """Снять аренду, если она принадлежит owner."""
+        self._release(keys=[self.LEASE_PREFIX + job_id], args=[owner])
+
+    def list_resumable(self) -> List[IngestJob]:
+        """Незавершенные задачи без действующей аренды (владелец умер или еще не назначен)."""
+        return [job for job in self.list_unfinished() if not self.client.exists(self.LEASE_PREFIX + job.id)]
+
+
+# Singleton instance
+_job_store: SQLiteJobStore | RedisJobStore | None = None
+
+
+def get_job_store() -> SQLiteJobStore | RedisJobStore:
+    """
+    Получить хранилище задач (singleton).
+    Redis используется, если задан REDIS_URL и доступен сервер; иначе SQLite.
+
+    Returns:
+        SQLiteJobStore | RedisJobStore: Хранилище
+    """
+    global _job_store
+
+    if _job_store is None:
+        if settings.redis_url and redis is not None:
+            try:
+                store = RedisJobStore(settings.redis_url)
+                store.client.ping()
+                _job_store = store
+                logger.info(f"Ingest jobs stored in Redis: {settings.redis_url}")
+            except Exception as e:
+                logger.warning(f"Redis unavailable for ingest jobs ({e}), falling back to SQLite")
+        if _job_store is None:
+            _job_store = SQLiteJobStore()
+            logger.info(f"Ingest jobs stored in SQLite: {_job_store.path}")
+
+    return _job_store
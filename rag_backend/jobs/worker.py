@@ -0,0 +1,183 @@
+"""
+Локальный пул обработчиков задач загрузки.
+Задачи берутся из in-process очереди. Перед выполнением задача арендуется
+в хранилище (claim), поэтому при нескольких процессах uvicorn (и CLI загрузки
+каталога) каждую задачу выполняет ровно один процесс. Незавершенные задачи
+с истекшей арендой периодически возвращаются в очередь.
+"""
+
+from typing import List, Optional, Set
+import asyncio
+
+from config.settings import settings
+from jobs.ingest import run_ingest_job, discard_batch
+from jobs.store import FINISHED_STATUSES, IngestJob, get_job_store, new_owner_id
+from utils.logger import logger
+
+
+# Пауза обработчика после сбоя хранилища (SQLite заблокирован, Redis недоступен)
+ERROR_BACKOFF_SECONDS = 5
+
+
+async def run_claimed_job(store, job_id: str, owner: str, job_concurrency: int) -> Optional[IngestJob]:
+    """
+    Арендовать задачу и выполнить ее, продлевая аренду heartbeat'ом.
+    Если аренда потеряна (процесс надолго завис и задачу забрал другой), выполнение
+    прерывается. Ошибка задачи фиксируется в хранилище, ее невидимый батч удаляется.
+
+    Args:
+        store: Хранилище задач
+        job_id: ID задачи
+        owner: Идентификатор владельца аренды
+        job_concurrency: Параллельных батчей эмбеддинга внутри задачи
+
+    Returns:
+        IngestJob: Выполненная (done/failed) задача; None — задача завершена или занята
+    """
+    lease_seconds = settings.ingest_job_lease_seconds
+    job = await asyncio.to_thread(store.claim, job_id, owner, lease_seconds)
+    if job is None:
+        return None
+
+    run_task = asyncio.create_task(run_ingest_job(job, store.save, job_concurrency))
+    lease_lost = False
+
+    async def heartbeat() -> None:
+        nonlocal lease_lost
+        while not run_task.done():
+            await asyncio.sleep(lease_seconds / 3)
+            if run_task.done():
+                return
+            if await asyncio.to_thread(store.claim, job_id, owner, lease_seconds) is None:
+                if job.status in FINISHED_STATUSES:
+                    return
+                logger.warning(f"Ingest job {job_id}: lease lost, stopping")
+                lease_lost = True
+                run_task.cancel()
+                return
+
+    heartbeat_task = asyncio.create_task(heartbeat())
+    try:
+        await run_task
+    except asyncio.CancelledError:
+        if not lease_lost:
+            raise
+        # Задачу продолжает новый владелец аренды
+        return None
+    except Exception as e:
+        logger.error(f"Ingest job {job.id} failed: {e}", exc_info=True)
+        job.status = "failed"
+        job.error = str(e)
+        await asyncio.to_thread(store.save, job)
+        # Неопубликованные чанки невидимы, но занимают место
+        try:
+            await asyncio.to_thread(discard_batch, job)
+        except Exception as cleanup_error:
+            logger.warning(f"Job {job.id}: failed to discard batch: {cleanup_error}")
+    finally:
+        heartbeat_task.cancel()
+        run_task.cancel()
+        await asyncio.gather(heartbeat_task, run_task, return_exceptions=True)
+        await asyncio.to_thread(store.release, job_id, owner)
+    return job
+
+
+class IngestWorker:
+    """Пул asyncio-обработчиков задач загрузки документов."""
+
+    def __init__(self, workers: int | None = None, job_concurrency: int | None = None):
+        self.workers = workers or settings.ingest_workers
+        self.job_concurrency = job_concurrency or settings.ingest_job_concurrency
+        self.store = get_job_store()
+        self.owner = new_owner_id()
+        self._queue: asyncio.Queue | None = None
+        self._queued: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Запустить обработчики и периодический подбор задач с истекшей арендой."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker_loop(i)) for i in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._recovery_loop()))
+        logger.info(f"Ingest worker started: {self.workers} workers (owner {self.owner})")
+
+    async def stop(self) -> None:
+        """Остановить обработчики; прерванные задачи продолжатся после истечения аренды."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queued.clear()
+        logger.info("Ingest worker stopped")
+
+    def _enqueue(self, job_id: str) -> None:
+        if job_id not in self._queued:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def submit(self, job: IngestJob) -> IngestJob:
+        """
+        Поставить задачу в очередь.
+
+        Args:
+            job: Новая задача
+
+        Returns:
+            IngestJob: Сохраненная задача
+        """
+        await asyncio.to_thread(self.store.save, job)
+        if self._queue is None:
+            await self.start()
+        self._enqueue(job.id)
+        return job
+
+    async def _recovery_loop(self) -> None:
+        # Задачи умерших процессов (и прерванные при рестарте) без действующей аренды
+        while True:
+            try:
+                for job in await asyncio.to_thread(self.store.list_resumable):
+                    if job.id not in self._queued:
+                        logger.info(f"Resuming ingest job {job.id} ({job.source}, stage={job.stage})")
+                        self._enqueue(job.id)
+            except Exception as e:
+                logger.error(f"Failed to scan resumable ingest jobs: {e}", exc_info=True)
+            await asyncio.sleep(settings.ingest_job_lease_seconds)
+
+    async def _worker_loop(self, worker_id: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                logger.info(f"Worker {worker_id}: processing job {job_id}")
+                job = await run_claimed_job(self.store, job_id, self.owner, self.job_concurrency)
+                if job is None:
+                    logger.info(f"Worker {worker_id}: job {job_id} is finished or owned by another process")
+            except Exception as e:
+                # Задача без аренды вернется в очередь через _recovery_loop
+                logger.error(f"Worker {worker_id}: job {job_id} failed to run: {e}", exc_info=True)
+                await asyncio.sleep(ERROR_BACKOFF_SECONDS)
+            finally:
+                self._queued.discard(job_id)
+                self._queue.task_done()
+
+
+# Singleton instance
+_worker: IngestWorker | None = None
+
+
+def get_ingest_worker() -> IngestWorker:
+    """
+    Получить пул обработчиков загрузки (singleton).
+
+    Returns:
+        IngestWorker: Экземпляр пула
+    """
+    global _worker
+
+    if _worker is None:
+        _worker = IngestWorker()
+
+    return _worker
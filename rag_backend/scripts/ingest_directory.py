@@ -0,0 +1,262 @@
+"""
+Пакетная загрузка каталога в базу знаний (например, транскриптов из
+data/knowledge/transcripts, которые пишет download_transcripts.py).
+
+Манифест хэшей (JSON) хранит состояние каждого файла: неизмененные файлы
+пропускаются, измененные атомарно заменяют прежнюю версию источника,
+прерванные задачи продолжаются с места остановки при следующем запуске.
+Файлы обрабатываются тем же конвейером, что и загрузка через API
+(jobs.ingest.run_ingest_job). Задачи сохраняются в общее хранилище и арендуются
+(jobs.worker.run_claimed_job): пока CLI жив, API-процессы их не выполняют.
+
+Запуск из rag_backend:
+    python -m scripts.ingest_directory data/knowledge/transcripts --type transcript --author "..." --workers 4
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+
+from config.settings import settings
+from jobs.store import IngestJob, get_job_store, new_owner_id
+from jobs.worker import run_claimed_job
+from utils.document_loader import is_supported_format
+from utils.logger import logger
+
+
+# Имя манифеста по умолчанию (в корне загружаемого каталога)
+MANIFEST_NAME = ".ingest_manifest.json"
+
+# Размер блока при подсчете хэша
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: Path) -> str:
+    """
+    SHA-256 содержимого файла (читается блоками).
+
+    Args:
+        path: Путь к файлу
+
+    Returns:
+        str: Хэш в hex
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while block := file.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Состояние файлов каталога: путь -> sha256, размер, mtime, задача, статус."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f).get("files", {})
+        self._lock = asyncio.Lock()
+
+    def is_unchanged(self, key: str, stat: os.stat_result) -> bool:
+        """Опубликован ли файл с теми же размером и mtime (без чтения содержимого)."""
+        entry = self.entries.get(key)
+        return bool(
+            entry and entry.get("status") == "done"
+            and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime
+        )
+
+    async def update(self, key: str, **fields: Any) -> None:
+        """Обновить запись и сразу записать манифест на диск (атомарно)."""
+        async with self._lock:
+            self.entries.setdefault(key, {}).update(fields, updated_at=time.time())
+            await asyncio.to_thread(self._write)
+
+    def _write(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.entries}, f, ensure_ascii=False, indent=2)
+        tmp_path.replace(self.path)
+
+
+@dataclass
+class DirectoryFile:
+    """Файл каталога, подлежащий загрузке"""
+    key: str  # Путь относительно каталога (он же source в базе знаний)
+    path: Path
+    stat: os.stat_result
+
+
+def scan_directory(root: Path, pattern: str, manifest_path: Path) -> List[DirectoryFile]:
+    """
+    Поддерживаемые файлы каталога по glob-шаблону.
+
+    Args:
+        root: Каталог
+        pattern: Шаблон (например, "**/*.txt")
+        manifest_path: Путь манифеста (исключается из выборки)
+
+    Returns:
+        List[DirectoryFile]: Файлы в порядке путей
+    """
+    files = []
+    for path in sorted(root.glob(pattern)):
+        if not path.is_file() or path == manifest_path or not is_supported_format(path):
+            continue
+        files.append(DirectoryFile(path.relative_to(root).as_posix(), path, path.stat()))
+    return files
+
+
+class DirectoryIngest:
+    """Инкрементальная загрузка файлов каталога с ограниченным параллелизмом."""
+
+    def __init__(
+        self,
+        manifest: Manifest,
+        extra_metadata: Dict[str, Any],
+        workers: int,
+        job_concurrency: int,
+        force: bool = False
+    ):
+        self.manifest = manifest
+        self.extra_metadata = extra_metadata
+        self.job_concurrency = job_concurrency
+        self.force = force
+        self.store = get_job_store()
+        self.owner = new_owner_id()
+        self._semaphore = asyncio.Semaphore(workers)
+        self.counts = {"skipped": 0, "ingested": 0, "resumed": 0, "busy": 0, "failed": 0}
+
+    async def _resumable_job(self, entry: Dict[str, Any], sha256: str) -> Optional[IngestJob]:
+        # Задача прошлого запуска по тому же содержимому, прерванная до публикации
+        if entry.get("sha256") != sha256 or not entry.get("job_id"):
+            return None
+        job = await asyncio.to_thread(self.store.get, entry["job_id"])
+        if job is None or job.status == "failed":
+            return None
+        return job
+
+    async def process(self, item: DirectoryFile) -> None:
+        """Загрузить файл, если он новый или изменился."""
+        async with self._semaphore:
+            entry = self.manifest.entries.get(item.key, {})
+            if not self.force and self.manifest.is_unchanged(item.key, item.stat):
+                self.counts["skipped"] += 1
+                return
+
+            sha256 = await asyncio.to_thread(file_sha256, item.path)
+            file_state = {"sha256": sha256, "size": item.stat.st_size, "mtime": item.stat.st_mtime}
+            if not self.force and entry.get("status") == "done" and entry.get("sha256") == sha256:
+                # Изменился только mtime
+                await self.manifest.update(item.key, **file_state)
+                self.counts["skipped"] += 1
+                return
+
+            job = await self._resumable_job(entry, sha256)
+            if job is not None and job.status == "done":
+                # Задачу успел завершить обработчик API после перезапуска сервера
+                await self.manifest.update(item.key, **file_state, status="done")
+                self.counts["skipped"] += 1
+                return
+            resumed = job is not None
+            if job is None:
+                job = IngestJob(
+                    filename=item.path.name,
+                    file_path=str(item.path.resolve()),
+                    source=item.key,
+                    # Источник принадлежит каталогу: прежние чанки (в том числе при потерянном
+                    # манифесте) заменяются при публикации
+                    metadata={"replace": True, "extra_metadata": self.extra_metadata}
+                )
+                await asyncio.to_thread(self.store.save, job)
+            await self.manifest.update(item.key, **file_state, job_id=job.id, status="running")
+
+            logger.info(f"{'Resuming' if resumed else 'Ingesting'} {item.key} (job {job.id})")
+            job = await run_claimed_job(self.store, job.id, self.owner, self.job_concurrency)
+            if job is None:
+                # Задачу выполняет другой процесс (API или параллельный запуск CLI)
+                logger.info(f"{item.key}: job is owned by another process, leaving it running")
+                self.counts["busy"] += 1
+                return
+            if job.status == "failed":
+                await self.manifest.update(item.key, status="failed", error=job.error)
+                self.counts["failed"] += 1
+                return
+
+            await self.manifest.update(
+                item.key, status="done", published_sha256=sha256, chunks=job.total_chunks, error=None
+            )
+            self.counts["resumed" if resumed else "ingested"] += 1
+
+    async def run(self, files: List[DirectoryFile]) -> Dict[str, int]:
+        """
+        Обработать файлы каталога.
+
+        Args:
+            files: Файлы (scan_directory)
+
+        Returns:
+            Dict[str, int]: Счетчики skipped / ingested / resumed / busy / failed
+        """
+        await asyncio.gather(*(self.process(item) for item in files))
+        return self.counts
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Incremental bulk ingest of a directory into the knowledge base")
+    parser.add_argument("directory", type=Path, help="Directory to ingest")
+    parser.add_argument("--pattern", default="**/*", help="Glob pattern relative to the directory (default: **/*)")
+    parser.add_argument("--manifest", type=Path, help=f"Manifest path (default: <directory>/{MANIFEST_NAME})")
+    parser.add_argument("--workers", type=int, default=settings.ingest_workers, help="Files processed concurrently")
+    parser.add_argument(
+        "--job-concurrency", type=int, default=settings.ingest_job_concurrency,
+        help="Embedding batches in flight per file"
+    )
+    parser.add_argument("--author", help="Author metadata for every chunk")
+    parser.add_argument("--type", dest="doc_type", help="Type metadata for every chunk (e.g. transcript)")
+    parser.add_argument("--force", action="store_true", help="Re-ingest files even if unchanged")
+    return parser.parse_args(argv)
+
+
+async def main(argv: List[str] | None = None) -> int:
+    """
+    Точка входа CLI.
+
+    Returns:
+        int: Код выхода (1 — были ошибки)
+    """
+    args = parse_args(argv)
+    root = args.directory.resolve()
+    if not root.is_dir():
+        logger.error(f"Not a directory: {root}")
+        return 2
+
+    manifest_path = (args.manifest or root / MANIFEST_NAME).resolve()
+    manifest = Manifest(manifest_path)
+    extra_metadata = {
+        key: value for key, value in (("author", args.author), ("type", args.doc_type)) if value
+    }
+
+    files = scan_directory(root, args.pattern, manifest_path)
+    logger.info(f"Found {len(files)} supported files in {root}")
+
+    started = time.monotonic()
+    ingest = DirectoryIngest(
+        manifest, extra_metadata, max(1, args.workers), max(1, args.job_concurrency), force=args.force
+    )
+    counts = await ingest.run(files)
+    logger.info(f"Directory ingest finished in {time.monotonic() - started:.1f}s: {counts}")
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,121 @@
+"""
+Дельта-синхронизация доски: since приходит из API с часовым поясом (UTC),
+колонки updated_at/deleted_at — timestamptz.
+"""
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import asyncio
+import os
+import uuid
+
+import pytest
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from database.async_repositories import AsyncBoardRepository
+from database.models import BoardIdea
+
+
+class _Result:
+    def __init__(self, value=None):
+        self._value = value
+
+    def scalar_one(self):
+        return self._value
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return []
+
+
+class _RecordingSession:
+    """Сессия, компилирующая запросы диалектом asyncpg вместо выполнения."""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(str(statement.compile(dialect=asyncpg.dialect())))
+        return _Result(datetime.now(timezone.utc))
+
+
+def test_changes_since_binds_since_as_timestamptz():
+    session = _RecordingSession()
+    since = datetime.now(timezone.utc) - timedelta(minutes=5)
+
+    ideas, deleted, _ = asyncio.run(AsyncBoardRepository(session).changes_since(since))
+
+    assert ideas == [] and deleted == []
+    filters = [sql for sql in session.statements if "$1" in sql]
+    assert len(filters) == 2
+    for sql in filters:
+        assert "$1::TIMESTAMP WITH TIME ZONE" in sql
+
+
+class _BulkSession:
+    """Сессия для bulk_apply: запоминает порядок запросов, DELETE ... RETURNING находит все ID."""
+
+    def __init__(self, existing):
+        self.existing = existing
+        self.statements = []
+
+    async def execute(self, statement, params=None):
+        sql = str(statement.compile(dialect=asyncpg.dialect()))
+        self.statements.append(sql)
+        rows = [SimpleNamespace(id=idea_id, status="todo") for idea_id in self.existing]
+        return _Rows(rows if sql.startswith("DELETE FROM board_ideas ") else [])
+
+    async def scalars(self, statement, params=None):
+        self.statements.append(str(statement.compile(dialect=asyncpg.dialect())))
+        return _Rows([BoardIdea(id=row["id"], title=row["title"], status=row["status"]) for row in params or []])
+
+    async def commit(self):
+        pass
+
+
+class _Rows:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return self._rows
+
+    @property
+    def rowcount(self):
+        return len(self._rows)
+
+
+def test_bulk_apply_deletes_before_recreating_same_id():
+    idea_id = uuid.uuid4()
+    session = _BulkSession([idea_id])
+
+    ideas, deleted, not_found = asyncio.run(AsyncBoardRepository(session).bulk_apply(
+        [{"id": idea_id, "title": "Recreated"}], {}, [idea_id]
+    ))
+
+    assert deleted == [idea_id] and not_found == []
+    assert [idea.id for idea in ideas] == [idea_id]
+    kinds = [sql.split(" RETURNING")[0].split(" WHERE")[0].split(" (")[0] for sql in session.statements]
+    assert kinds.index("DELETE FROM board_ideas") < kinds.index("INSERT INTO board_ideas")
+    # Заново созданная идея не должна остаться в tombstones
+    assert kinds[-1] == "DELETE FROM board_idea_tombstones"
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_ASYNC_URL"), reason="TEST_POSTGRES_ASYNC_URL is not set")
+def test_changes_since_with_aware_datetime_on_postgres():
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    async def run():
+        engine = create_async_engine(os.environ["TEST_POSTGRES_ASYNC_URL"])
+        try:
+            async with AsyncSession(engine) as session:
+                since = datetime.now(timezone.utc) - timedelta(days=1)
+                return await AsyncBoardRepository(session).changes_since(since)
+        finally:
+            await engine.dispose()
+
+    ideas, deleted, server_time = asyncio.run(run())
+    assert isinstance(ideas, list) and isinstance(deleted, list)
+    assert server_time.tzinfo is not None
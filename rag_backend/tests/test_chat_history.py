@@ -0,0 +1,94 @@
+"""
+История треда: страница читает последние партиции, а если она не заполнена —
+более ранние партиции и архив user_chats_archive.
+"""
+
+from datetime import date, datetime, timezone
+import asyncio
+import re
+import uuid
+
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from database.async_repositories import AsyncChatRepository
+from database.models import UserChat, UserChatArchive
+
+
+class _Result:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self._rows
+
+
+class _ScriptedSession:
+    """Отдает заранее заданные строки по очереди и запоминает скомпилированные запросы."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(str(statement.compile(dialect=asyncpg.dialect())))
+        return _Result(self.results.pop(0))
+
+
+def _message(content: str, created_at: datetime) -> UserChat:
+    return UserChat(id=uuid.uuid4(), user_id="user", thread_id="thread", role="user",
+                    content=content, extra_metadata={}, created_at=created_at)
+
+
+def _archived(content: str, created_at: datetime) -> dict:
+    return {"id": str(uuid.uuid4()), "role": "user", "content": content,
+            "metadata": {}, "created_at": created_at.isoformat()}
+
+
+def test_full_page_reads_only_the_recent_window():
+    recent = [_message(str(i), datetime(2026, 10, 10 - i, tzinfo=timezone.utc)) for i in range(2)]
+    session = _ScriptedSession(recent)
+
+    history = asyncio.run(AsyncChatRepository(session).get_history("user", "thread", limit=2))
+
+    assert [m.content for m in history] == ["1", "0"]
+    assert len(session.statements) == 1
+    assert "greatest" in session.statements[0] and "date_trunc" in session.statements[0]
+
+
+def test_short_page_falls_back_to_archive():
+    recent = [_message("recent", datetime(2026, 10, 1, tzinfo=timezone.utc))]
+    archive = UserChatArchive(user_id="user", thread_id="thread", month=date(2025, 1, 1), message_count=2, messages=[
+        _archived("old-1", datetime(2025, 1, 1, tzinfo=timezone.utc)),
+        _archived("old-2", datetime(2025, 1, 2, tzinfo=timezone.utc)),
+    ])
+    session = _ScriptedSession(recent, [], [archive])
+
+    history = asyncio.run(AsyncChatRepository(session).get_history("user", "thread", limit=3))
+
+    assert [m.content for m in history] == ["old-1", "old-2", "recent"]
+    assert "user_chats_archive" in session.statements[2]
+
+
+def test_archive_respects_cursor():
+    archive = UserChatArchive(user_id="user", thread_id="thread", month=date(2025, 1, 1), message_count=2, messages=[
+        _archived("old-1", datetime(2025, 1, 1, tzinfo=timezone.utc)),
+        _archived("old-2", datetime(2025, 1, 2, tzinfo=timezone.utc)),
+    ])
+    before = (datetime(2025, 1, 1, 12, tzinfo=timezone.utc), uuid.uuid4())
+    session = _ScriptedSession([], [], [archive])
+
+    history = asyncio.run(AsyncChatRepository(session).get_history("user", "thread", limit=5, before=before))
+
+    assert [m.content for m in history] == ["old-1"]
+
+
+def test_cursor_window_binds_timestamptz():
+    before = (datetime(2026, 10, 1, tzinfo=timezone.utc), uuid.uuid4())
+    session = _ScriptedSession([_message("m", datetime(2026, 9, 30, tzinfo=timezone.utc))])
+
+    asyncio.run(AsyncChatRepository(session).get_history("user", "thread", limit=1, before=before))
+
+    assert re.search(r"date_trunc\(\$\d+::VARCHAR, \$\d+::TIMESTAMP WITH TIME ZONE\)", session.statements[0])
@@ -0,0 +1,89 @@
+"""
+Возобновление задачи загрузки: строки батча, записанные до фиксации прогресса,
+не публикуются повторно.
+"""
+
+from types import ModuleType, SimpleNamespace
+import asyncio
+import json
+import sys
+
+from config.settings import settings
+from jobs import ingest
+from jobs.store import IngestJob
+
+
+class FakeVectorStore:
+    """knowledge_base в памяти: строки (batch_id, chunk_index, visible)."""
+
+    def __init__(self):
+        self.rows = []
+        self.embeddings = SimpleNamespace(embed_documents=lambda texts: [[0.0] for _ in texts])
+
+    def add_embeddings(self, texts, embeddings, metadatas, batch_id, visible):
+        for metadata in metadatas:
+            self.rows.append({"batch_id": batch_id, "chunk_index": metadata["chunk_index"], "visible": visible})
+
+
+def _run_resumed(tmp_path, monkeypatch, job: IngestJob, rows) -> FakeVectorStore:
+    store = FakeVectorStore()
+    store.rows.extend(rows)
+
+    def discard_batch(job):
+        before = len(store.rows)
+        store.rows = [r for r in store.rows if r["batch_id"] != job.id or r["visible"]]
+        return before - len(store.rows)
+
+    def discard_unfinished_batches(job, indexes):
+        before = len(store.rows)
+        store.rows = [r for r in store.rows if r["batch_id"] != job.id or r["chunk_index"] not in indexes]
+        return before - len(store.rows)
+
+    def finalize_job(job):
+        for row in store.rows:
+            if row["batch_id"] == job.id:
+                row["visible"] = True
+
+    connection = ModuleType("database.connection")
+    connection.get_vector_store = lambda: store
+    monkeypatch.setitem(sys.modules, "database.connection", connection)
+    monkeypatch.setattr(ingest, "discard_batch", discard_batch)
+    monkeypatch.setattr(ingest, "discard_unfinished_batches", discard_unfinished_batches)
+    monkeypatch.setattr(ingest, "finalize_job", finalize_job)
+    monkeypatch.setattr(ingest, "parse_and_chunk", lambda job, on_stage: 4)
+    monkeypatch.setattr(settings, "ingest_jobs_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "ingest_batch_size", 2)
+
+    # Чанки уже нарезаны прошлым запуском
+    chunks_path = tmp_path / job.id / "chunks.jsonl"
+    chunks_path.parent.mkdir(parents=True)
+    with open(chunks_path, "w", encoding="utf-8") as f:
+        for i in range(4):
+            f.write(json.dumps({"content": f"chunk {i}", "metadata": {"chunk_index": i}}) + "\n")
+
+    asyncio.run(ingest.run_ingest_job(job, lambda job: None, concurrency=1))
+    return store
+
+
+def test_resume_without_recorded_progress_drops_partial_rows(tmp_path, monkeypatch):
+    job = IngestJob(filename="a.txt", file_path="/tmp/a.txt", source="a.txt", id="job")
+    # Первый батч записан, но stored_batches сохранить не успели
+    partial = [{"batch_id": "job", "chunk_index": i, "visible": False} for i in (0, 1)]
+
+    store = _run_resumed(tmp_path, monkeypatch, job, partial)
+
+    assert job.status == "done"
+    assert sorted(r["chunk_index"] for r in store.rows) == [0, 1, 2, 3]
+
+
+def test_resume_keeps_recorded_batches(tmp_path, monkeypatch):
+    job = IngestJob(
+        filename="a.txt", file_path="/tmp/a.txt", source="a.txt", id="job",
+        metadata={"stored_batches": [0]}
+    )
+    rows = [{"batch_id": "job", "chunk_index": i, "visible": False} for i in (0, 1, 2)]
+
+    store = _run_resumed(tmp_path, monkeypatch, job, rows)
+
+    assert sorted(r["chunk_index"] for r in store.rows) == [0, 1, 2, 3]
+    assert job.stored_chunks == 4
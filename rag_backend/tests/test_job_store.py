@@ -0,0 +1,77 @@
+"""
+Аренда задач загрузки в SQLite-хранилище: задачу выполняет один владелец,
+после истечения аренды ее может забрать другой процесс.
+"""
+
+import asyncio
+
+from jobs import worker as worker_module
+from jobs.store import IngestJob, SQLiteJobStore
+
+
+def _store(tmp_path) -> SQLiteJobStore:
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+    store.save(IngestJob(filename="a.txt", file_path="/tmp/a.txt", source="a.txt", id="job"))
+    return store
+
+
+def test_claim_is_exclusive_until_lease_expires(tmp_path):
+    store = _store(tmp_path)
+
+    assert store.claim("job", "worker-1", 60) is not None
+    assert store.claim("job", "worker-2", 60) is None
+    assert store.claim("job", "worker-1", 60) is not None  # продление
+    assert store.list_resumable() == []
+
+    store.claim("job", "worker-1", -1)  # аренда истекла
+    assert [job.id for job in store.list_resumable()] == ["job"]
+    assert store.claim("job", "worker-2", 60) is not None
+
+
+def test_save_keeps_lease_and_finished_jobs_are_not_claimed(tmp_path):
+    store = _store(tmp_path)
+    job = store.claim("job", "worker-1", 60)
+
+    job.stage = "embed"
+    store.save(job)
+    assert store.claim("job", "worker-2", 60) is None
+
+    job.status = "done"
+    store.save(job)
+    store.release("job", "worker-1")
+    assert store.claim("job", "worker-2", 60) is None
+    assert store.list_resumable() == []
+
+
+def test_worker_survives_store_errors(monkeypatch):
+    class FlakyStore:
+        def __init__(self):
+            self.claims = []
+
+        def save(self, job):
+            pass
+
+        def list_resumable(self):
+            return []
+
+        def claim(self, job_id, owner, lease_seconds):
+            self.claims.append(job_id)
+            if len(self.claims) == 1:
+                raise RuntimeError("database is locked")
+            return None
+
+    monkeypatch.setattr(worker_module, "ERROR_BACKOFF_SECONDS", 0)
+    monkeypatch.setattr(worker_module, "get_job_store", FlakyStore)
+
+    async def scenario():
+        pool = worker_module.IngestWorker(workers=1, job_concurrency=1)
+        for job_id in ("first", "second"):
+            await pool.submit(IngestJob(filename="a.txt", file_path="/tmp/a.txt", source="a.txt", id=job_id))
+        await asyncio.wait_for(pool._queue.join(), 5)
+        alive = not pool._tasks[0].done()
+        await pool.stop()
+        return pool.store.claims, alive
+
+    claims, alive = asyncio.run(scenario())
+    assert claims == ["first", "second"]
+    assert alive
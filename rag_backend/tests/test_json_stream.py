@@ -0,0 +1,17 @@
+"""
+Толерантный разбор JSON из ответа LLM.
+"""
+
+from utils.json_stream import IncrementalJSONParser, parse_json_tolerant
+
+
+def test_raw_control_characters_inside_strings():
+    text = 'Ответ:\n{"script_outline": "line1\nline2\tend", "hook": "x"}'
+
+    assert parse_json_tolerant(text) == {"script_outline": "line1\nline2\tend", "hook": "x"}
+
+
+def test_truncated_string_with_newline_is_completed():
+    parser = IncrementalJSONParser().feed('{"hook": "a", "script_outline": "line1\nli')
+
+    assert parser.result() == {"hook": "a", "script_outline": "line1\nli"}
@@ -0,0 +1,46 @@
+"""
+Снимок графа знаний: связи указывают только на узлы, вошедшие в снимок.
+"""
+
+from types import ModuleType
+import sys
+
+from utils import knowledge_graph
+
+
+class FakeConnection:
+    """Возвращает заранее заданные строки для каждого запроса снимка."""
+
+    def __init__(self, results):
+        self.results = results
+        self.statements = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def connect(self):
+        return self
+
+    def execute(self, statement, params):
+        self.statements.append(str(statement))
+        return self.results[statement]
+
+
+def test_links_are_limited_to_snapshot_nodes(monkeypatch):
+    conn = FakeConnection({
+        knowledge_graph.NODES_SQL: [("a", "text a", "book"), ("b", "text b", "book")],
+        # "c" не вошел в узлы: между запросами опубликовался новый батч
+        knowledge_graph.SOURCE_LINKS_SQL: [("a", "b"), ("b", "c")],
+        knowledge_graph.KNN_LINKS_SQL: [("a", "b", 0.9), ("c", "a", 0.8), ("a", "c", 0.7)],
+    })
+    connection = ModuleType("database.connection")
+    connection.engine = connection.retrieval_engine = conn
+    monkeypatch.setitem(sys.modules, "database.connection", connection)
+
+    snapshot = knowledge_graph.build_graph_snapshot(limit=2, neighbors=2)
+
+    assert [(link["source"], link["target"], link["type"]) for link in snapshot.links] == [("a", "b", "source")]
+    assert all("ORDER BY created_at DESC, id DESC" in statement for statement in conn.statements)
@@ -0,0 +1,60 @@
+"""
+Write-behind очередь чата: пакет, который не записывается, уходит в dead-letter
+файл и не блокирует очередь, barrier() и остановку.
+"""
+
+import asyncio
+import json
+
+from config.settings import settings
+from database import write_behind
+from database.write_behind import ChatWriteBehind
+
+
+def test_failing_batch_is_dead_lettered_and_does_not_block(tmp_path, monkeypatch):
+    dead_letter_path = tmp_path / "dead.jsonl"
+    monkeypatch.setattr(settings, "chat_dead_letter_path", str(dead_letter_path))
+    monkeypatch.setattr(settings, "chat_write_max_retries", 2)
+    monkeypatch.setattr(write_behind, "RETRY_DELAY_SECONDS", 0)
+
+    def failing_write(batch):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(write_behind, "write_batch", failing_write)
+
+    async def run():
+        writer = ChatWriteBehind(flush_interval=0.01)
+        await writer.start()
+        writer.add("user", "thread", "user", "hello")
+        assert await writer.barrier("user", "thread", timeout=2)
+        await writer.stop()
+        return writer.stats()
+
+    stats = asyncio.run(run())
+
+    assert stats["pending"] == 0 and stats["dead_lettered"] == 1
+    records = [json.loads(line) for line in dead_letter_path.read_text(encoding="utf-8").splitlines()]
+    assert [record["content"] for record in records] == ["hello"]
+    assert records[0]["reason"] == "database is down"
+
+
+def test_messages_added_after_final_flush_are_written_on_stop(monkeypatch):
+    written = []
+    monkeypatch.setattr(write_behind, "write_batch", lambda batch: written.extend(row["content"] for row in batch))
+
+    async def run():
+        writer = ChatWriteBehind(flush_interval=0.01)
+        await writer.start()
+        writer.add("user", "thread", "user", "first")
+        # Фоновый сброс уже завершился, а ответ в чате еще дописывает сообщение
+        writer._stopping = True
+        writer._wakeup.set()
+        await writer._task
+        writer.add("user", "thread", "assistant", "late")
+        await writer.stop()
+        return writer.stats()
+
+    stats = asyncio.run(run())
+
+    assert written == ["first", "late"]
+    assert stats["pending"] == 0 and stats["dead_lettered"] == 0
@@ -1,16 +1,19 @@
 """
 RAG Retriever - инструмент для векторного поиска в базе знаний.
-Использует Supabase Vector Store с pgvector.
+Поиск идет через match_documents (pgvector) в retrieval-пуле соединений.
 """
 
 from typing import List, Dict, Any
 from langchain_core.documents import Document
 
-from database.connection import get_vector_store, get_embeddings, get_supabase_client
+from database.connection import get_vector_store, get_embeddings
 from config.settings import settings
 from utils.logger import logger
 
 
+# Ключ configurable: эмбеддинг запроса, посчитанный заранее (пакетно для нескольких запросов)
+QUERY_EMBEDDING_CONFIG_KEY = "query_embedding"
+
 class RAGRetriever:
     """
     Retriever для поиска релевантных документов в векторной базе.
@@ -69,44 +72,32 @@ class RAGRetriever:
         self,
         query: str,
         top_k: int | None = None,
-        filter_metadata: Dict[str, Any] | None = None
+        filter_metadata: Dict[str, Any] | None = None,
+        query_embedding: List[float] | None = None
     ) -> List[tuple[Document, float]]:
         """
-        Поиск с оценками релевантности (прямой вызов RPC для надежности).
+        Поиск с оценками релевантности (match_documents через retrieval-пул:
+        ANN-запросы не занимают OLTP-соединения и идут на реплику, если она задана).
+        query_embedding — готовый эмбеддинг запроса (без повторного вызова модели).
         """
         top_k = top_k or self.top_k
         
-        logger.info(f"RAG search with scores (RPC): query='{query[:50]}...', top_k={top_k}")
+        logger.info(f"RAG search with scores: query='{query[:50]}...', top_k={top_k}")
         
         try:
             # Создаем embedding запроса
-            query_embedding = self.embeddings.embed_query(query)
-            
-            # Параметры для RPC функции match_documents
-            params = {
-                "query_embedding": query_embedding,
-                "match_threshold": self.similarity_threshold,
-                "match_count": top_k,
-                "filter": filter_metadata or {}
-            }
+            if query_embedding is None:
+                query_embedding = self.embeddings.embed_query(query)
             
-            # Выполняем RPC запрос напрямую через клиент Supabase
-            client = get_supabase_client()
-            response = client.rpc("match_documents", params).execute()
-            
-            data = response.data
-            
-            results = []
-            for item in data:
-                content = item.get("content")
-                metadata = item.get("metadata")
-                score = item.get("similarity")
-                
-                doc = Document(page_content=content, metadata=metadata)
-                results.append((doc, score))
+            results = self.vector_store.similarity_search_by_vector_with_scores(
+                query_embedding,
+                k=top_k,
+                filter=filter_metadata,
+                threshold=self.similarity_threshold
+            )
             
             logger.info(
-                f"Found {len(results)} documents via RPC"
+                f"Found {len(results)} documents via match_documents"
             )
             
             return results
@@ -159,16 +150,26 @@ class RAGRetriever:
         query: str,
         top_k: int | None = None,
         filter_metadata: Dict[str, Any] | None = None,
-        use_scores: bool = True
+        use_scores: bool = True,
+        extract_chapter: bool = True,
+        query_embedding: List[float] | None = None
     ) -> tuple[str, List[Dict[str, Any]]]:
         """
         Поиск и форматирование в одном методе. Добавлена авто-фильтрация и поддержка базовых фильтров.
+        extract_chapter=False пропускает LLM-извлечение главы (остается regex-фильтр).
+        query_embedding — готовый эмбеддинг запроса (пакетная обработка).
         """
         # Объединяем входящие фильтры
         final_filter = filter_metadata or {}
 
         # Автоматическое определение главы из запроса пользователя (NLP-подход)
-        if "chapter" not in final_filter:
+        if "chapter" not in final_filter and not extract_chapter:
+            import re
+            chapter_match = re.search(r"(?i)(?:глава|главе|главу|часть|раздел|chapter|part|section)\s*(?:номер|№|#)?\s*(\d+)", query)
+            if chapter_match:
+                final_filter["chapter"] = str(chapter_match.group(1))
+                logger.info(f"Regex-filter detected (LLM extraction skipped): Chapter {final_filter['chapter']}")
+        elif "chapter" not in final_filter:
             try:
                 from utils.llm_factory import get_llm
                 from config.prompts import METADATA_EXTRACTOR_PROMPT
@@ -201,7 +202,7 @@ class RAGRetriever:
         # Поиск (сначала с фильтром, если он есть)
         results = []
         if use_scores:
-            results = self.search_with_scores(query, top_k, final_filter)
+            results = self.search_with_scores(query, top_k, final_filter, query_embedding)
         else:
             docs = self.search(query, top_k, final_filter)
             results = [(doc, None) for doc in docs]
@@ -211,7 +212,7 @@ class RAGRetriever:
             logger.warning(f"No results for chapter filter. Falling back to non-chapter search.")
             base_filter = {k: v for k, v in final_filter.items() if k != "chapter"}
             if use_scores:
-                results = self.search_with_scores(query, top_k, base_filter)
+                results = self.search_with_scores(query, top_k, base_filter, query_embedding)
             else:
                 docs = self.search(query, top_k, base_filter)
                 results = [(doc, None) for doc in docs]
@@ -224,7 +225,7 @@ class RAGRetriever:
                 passport_filter["author"] = final_filter["author"]
             
             if use_scores:
-                results = self.search_with_scores(query, top_k, passport_filter)
+                results = self.search_with_scores(query, top_k, passport_filter, query_embedding)
             else:
                 docs = self.search(query, top_k, passport_filter)
                 results = [(doc, None) for doc in docs]
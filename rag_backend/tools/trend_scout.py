@@ -0,0 +1,144 @@
+"""
+Поиск трендовых идей: веб-поиск + генерация идей LLM.
+Результаты поиска и идеи кэшируются по нормализованной теме,
+одновременные одинаковые запросы выполняются один раз.
+"""
+
+from typing import Any, Dict, Optional
+import json
+import re
+
+from config.prompts import TREND_SCOUT_SYSTEM_PROMPT
+from config.settings import settings
+from tools.web_search import get_search_provider
+from utils.cache import TTLCache, SingleFlight
+from utils.logger import logger
+
+
+DEFAULT_TOPIC = "viral youtube shorts trends 2025"
+
+SEARCH_UNAVAILABLE = "Data unavailable, use your internal knowledge about 2025 trends."
+
+
+def normalize_topic(topic: Optional[str]) -> str:
+    """
+    Нормализовать тему для ключа кэша: регистр, пробелы, пунктуация по краям.
+
+    Args:
+        topic: Тема пользователя
+
+    Returns:
+        str: Нормализованная тема
+    """
+    topic = (topic or "").strip() or DEFAULT_TOPIC
+    return re.sub(r"\s+", " ", topic.lower()).strip(" .,!?;:")
+
+
+class TrendScout:
+    """Конвейер поиска трендов с кэшем и single-flight."""
+
+    def __init__(self):
+        self.search_cache = TTLCache(settings.trend_cache_max_entries, settings.trend_search_cache_ttl_seconds)
+        self.ideas_cache = TTLCache(settings.trend_cache_max_entries, settings.trend_ideas_cache_ttl_seconds)
+        self._flight = SingleFlight()
+
+    async def search(self, topic: str) -> str:
+        """
+        Результаты веб-поиска по теме (JSON-строка для промпта).
+
+        Args:
+            topic: Нормализованная тема
+
+        Returns:
+            str: Результаты поиска или пометка о недоступности
+        """
+        cached = self.search_cache.get(topic)
+        if cached is not None:
+            return cached
+
+        async def run() -> str:
+            provider = get_search_provider()
+            try:
+                results = await provider.search(
+                    f"trending YouTube Shorts topics 2025 {topic}",
+                    max_results=settings.search_max_results
+                )
+            except Exception as e:
+                logger.warning(f"Search provider {provider.name} failed: {e}. Using LLM internal knowledge.")
+                return SEARCH_UNAVAILABLE
+            if not results:
+                return SEARCH_UNAVAILABLE
+            payload = json.dumps(results, ensure_ascii=False)
+            self.search_cache.set(topic, payload)
+            return payload
+
+        return await self._flight.do(("search", topic), run)
+
+    async def scout(self, topic: Optional[str]) -> Dict[str, Any]:
+        """
+        Трендовые идеи по теме.
+
+        Args:
+            topic: Тема пользователя (None — общие тренды)
+
+        Returns:
+            Dict[str, Any]: {"ideas": [{"title", "description"}, ...]}
+
+        Raises:
+            Exception: Ошибка LLM или парсинга (результат не кэшируется)
+        """
+        key = normalize_topic(topic)
+        cached = self.ideas_cache.get(key)
+        if cached is not None:
+            logger.info(f"Trend ideas cache hit: {key}")
+            return cached
+
+        async def run() -> Dict[str, Any]:
+            from langchain_core.prompts import ChatPromptTemplate
+            from langchain_core.output_parsers import JsonOutputParser
+            from api.schemas import TrendResponse
+            from utils.llm_factory import get_llm
+
+            search_results = await self.search(key)
+
+            parser = JsonOutputParser(pydantic_object=TrendResponse)
+            prompt = ChatPromptTemplate.from_messages([
+                ("system", TREND_SCOUT_SYSTEM_PROMPT),
+                ("user", "Тема пользователя: {topic}\nДанные из интернета: {search_results}")
+            ])
+            chain = prompt | get_llm(temperature=0.8) | parser
+            ideas = await chain.ainvoke({
+                "topic": topic or DEFAULT_TOPIC,
+                "search_results": search_results,
+                "format_instructions": parser.get_format_instructions()
+            })
+            self.ideas_cache.set(key, ideas)
+            return ideas
+
+        return await self._flight.do(("ideas", key), run)
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика кэшей."""
+        return {
+            "search": self.search_cache.stats(),
+            "ideas": self.ideas_cache.stats()
+        }
+
+
+# Singleton instance
+_trend_scout: TrendScout | None = None
+
+
+def get_trend_scout() -> TrendScout:
+    """
+    Получить конвейер поиска трендов (singleton).
+
+    Returns:
+        TrendScout: Экземпляр конвейера
+    """
+    global _trend_scout
+
+    if _trend_scout is None:
+        _trend_scout = TrendScout()
+
+    return _trend_scout
@@ -0,0 +1,94 @@
+"""
+Провайдеры веб-поиска.
+Асинхронный интерфейс SearchProvider; DuckDuckGo для продакшена
+и статическая заглушка для офлайн-тестов.
+"""
+
+from typing import Dict, List, Protocol
+import asyncio
+
+from config.settings import settings
+from utils.logger import logger
+
+
+class SearchProvider(Protocol):
+    """Интерфейс провайдера поиска."""
+
+    name: str
+
+    async def search(self, query: str, max_results: int = 5) -> List[Dict[str, str]]:
+        """
+        Выполнить поиск.
+
+        Args:
+            query: Поисковый запрос
+            max_results: Количество результатов
+
+        Returns:
+            List[Dict[str, str]]: Результаты (title, href, body)
+        """
+        ...
+
+
+class DuckDuckGoSearchProvider:
+    """Поиск через DuckDuckGo (синхронный клиент DDGS в отдельном потоке)."""
+
+    name = "duckduckgo"
+
+    async def search(self, query: str, max_results: int = 5) -> List[Dict[str, str]]:
+        return await asyncio.to_thread(self._search, query, max_results)
+
+    @staticmethod
+    def _search(query: str, max_results: int) -> List[Dict[str, str]]:
+        from duckduckgo_search import DDGS
+
+        logger.info(f"Searching web for: {query}")
+        with DDGS() as ddgs:
+            return [
+                {"title": r.get("title", ""), "href": r.get("href", ""), "body": r.get("body", "")}
+                for r in ddgs.text(query, max_results=max_results)
+            ]
+
+
+class StaticSearchProvider:
+    """Офлайн-заглушка: детерминированные результаты без сети."""
+
+    name = "static"
+
+    async def search(self, query: str, max_results: int = 5) -> List[Dict[str, str]]:
+        return [
+            {
+                "title": f"{query}: тренд #{i}",
+                "href": f"https://example.com/trends/{i}",
+                "body": f"Офлайн-результат #{i} для запроса «{query}»."
+            }
+            for i in range(1, max_results + 1)
+        ]
+
+
+PROVIDERS = {
+    DuckDuckGoSearchProvider.name: DuckDuckGoSearchProvider,
+    StaticSearchProvider.name: StaticSearchProvider,
+}
+
+# Singleton instance
+_provider: SearchProvider | None = None
+
+
+def get_search_provider() -> SearchProvider:
+    """
+    Получить провайдера поиска из настроек (singleton).
+
+    Returns:
+        SearchProvider: Провайдер
+    """
+    global _provider
+
+    if _provider is None:
+        provider_cls = PROVIDERS.get(settings.search_provider)
+        if provider_cls is None:
+            logger.warning(f"Unknown search provider '{settings.search_provider}', using static")
+            provider_cls = StaticSearchProvider
+        _provider = provider_cls()
+
+    return _provider
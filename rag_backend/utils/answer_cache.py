@@ -0,0 +1,249 @@
+"""
+Семантический кэш ответов продюсера.
+Ключ — эмбеддинг запроса; попадание — по косинусной близости в рамках
+области (персона, версия стратегии, версия корпуса).
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import List, Dict, Any, Tuple
+import math
+import operator
+import time
+
+from config.settings import settings
+from database.invalidation import CORPUS, STRATEGY, cache_namespace
+from utils.logger import logger
+
+
+ScopeKey = Tuple[str, int, int]
+
+
+@dataclass
+class CachedAnswer:
+    """Закэшированный ответ"""
+    query: str
+    embedding: List[float]  # Нормализованный вектор запроса
+    answer: str
+    sources: List[Dict[str, Any]]
+    created_at: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector))
+    if not norm:
+        return list(vector)
+    return [x / norm for x in vector]
+
+
+def _dot(a: List[float], b: List[float]) -> float:
+    return sum(map(operator.mul, a, b))
+
+
+class SemanticAnswerCache:
+    """
+    Кэш ответов с поиском по близости эмбеддингов.
+    Каждая область хранит не больше max_entries ответов (LRU),
+    число областей тоже ограничено.
+    """
+
+    def __init__(
+        self,
+        threshold: float | None = None,
+        max_entries_per_scope: int | None = None,
+        max_scopes: int | None = None,
+        ttl_seconds: int | None = None
+    ):
+        self.threshold = threshold or settings.answer_cache_similarity_threshold
+        self.max_entries = max_entries_per_scope or settings.answer_cache_max_entries_per_scope
+        self.max_scopes = max_scopes or settings.answer_cache_max_scopes
+        self.ttl_seconds = ttl_seconds or settings.answer_cache_ttl_seconds
+
+        self.strategy_version = 0
+        self.corpus_version = 0
+
+        self._scopes: OrderedDict[ScopeKey, OrderedDict[str, CachedAnswer]] = OrderedDict()
+        self._lock = Lock()
+        self._metrics = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._scope_hits: Dict[ScopeKey, int] = {}
+
+    def scope(self, persona: str | None) -> ScopeKey:
+        """
+        Получить ключ области для персоны с текущими версиями.
+
+        Args:
+            persona: Персона запроса (None — без фильтра)
+
+        Returns:
+            ScopeKey: (persona, strategy_version, corpus_version)
+        """
+        return (persona or "default", self.strategy_version, self.corpus_version)
+
+    def lookup(
+        self,
+        embedding: List[float],
+        scope: ScopeKey
+    ) -> Tuple[CachedAnswer, float] | None:
+        """
+        Найти ближайший закэшированный ответ в области.
+
+        Args:
+            embedding: Эмбеддинг запроса
+            scope: Ключ области
+
+        Returns:
+            (CachedAnswer, similarity) или None
+        """
+        vector = _normalize(embedding)
+        now = time.time()
+
+        with self._lock:
+            entries = self._scopes.get(scope)
+            best, best_score = None, -1.0
+            if entries:
+                expired = [k for k, e in entries.items() if now - e.created_at > self.ttl_seconds]
+                for key in expired:
+                    del entries[key]
+                    self._metrics["evictions"] += 1
+                for key, entry in entries.items():
+                    score = _dot(vector, entry.embedding)
+                    if score > best_score:
+                        best, best_score = key, score
+
+            if best is None or best_score < self.threshold:
+                self._metrics["misses"] += 1
+                return None
+
+            entry = entries[best]
+            entries.move_to_end(best)
+            self._scopes.move_to_end(scope)
+            entry.hits += 1
+            self._metrics["hits"] += 1
+            self._scope_hits[scope] = self._scope_hits.get(scope, 0) + 1
+
+        logger.info(f"Answer cache hit (similarity={best_score:.3f}): '{entry.query[:50]}'")
+        return entry, best_score
+
+    def store(
+        self,
+        query: str,
+        embedding: List[float],
+        scope: ScopeKey,
+        answer: str,
+        sources: List[Dict[str, Any]] | None = None
+    ) -> None:
+        """
+        Сохранить ответ в область.
+
+        Args:
+            query: Исходный запрос
+            embedding: Эмбеддинг запроса
+            scope: Ключ области
+            answer: Ответ ассистента
+            sources: Источники ответа
+        """
+        entry = CachedAnswer(
+            query=query,
+            embedding=_normalize(embedding),
+            answer=answer,
+            sources=sources or []
+        )
+
+        with self._lock:
+            entries = self._scopes.get(scope)
+            if entries is None:
+                entries = self._scopes[scope] = OrderedDict()
+            self._scopes.move_to_end(scope)
+
+            entries[query] = entry
+            entries.move_to_end(query)
+            self._metrics["stores"] += 1
+
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self._metrics["evictions"] += 1
+            while len(self._scopes) > self.max_scopes:
+                old_scope, old_entries = self._scopes.popitem(last=False)
+                self._scope_hits.pop(old_scope, None)
+                self._metrics["evictions"] += len(old_entries)
+
+    def _drop_stale_scopes(self) -> None:
+        stale = [
+            s for s in self._scopes
+            if s[1] != self.strategy_version or s[2] != self.corpus_version
+        ]
+        for scope in stale:
+            self._metrics["evictions"] += len(self._scopes.pop(scope))
+            self._scope_hits.pop(scope, None)
+
+    def bump_strategy_version(self) -> None:
+        """Стратегия изменилась: старые области больше недостижимы."""
+        with self._lock:
+            self.strategy_version += 1
+            self._drop_stale_scopes()
+        logger.info(f"Answer cache strategy version -> {self.strategy_version}")
+
+    def bump_corpus_version(self) -> None:
+        """База знаний изменилась: старые области больше недостижимы."""
+        with self._lock:
+            self.corpus_version += 1
+            self._drop_stale_scopes()
+        logger.info(f"Answer cache corpus version -> {self.corpus_version}")
+
+    def clear(self) -> None:
+        """Очистить кэш."""
+        with self._lock:
+            self._scopes.clear()
+            self._scope_hits.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики кэша: попадания/промахи и заполненность областей."""
+        with self._lock:
+            total = self._metrics["hits"] + self._metrics["misses"]
+            return {
+                **self._metrics,
+                "hit_rate": self._metrics["hits"] / total if total else 0.0,
+                "strategy_version": self.strategy_version,
+                "corpus_version": self.corpus_version,
+                "scopes": [
+                    {
+                        "persona": scope[0],
+                        "strategy_version": scope[1],
+                        "corpus_version": scope[2],
+                        "entries": len(entries),
+                        "hits": self._scope_hits.get(scope, 0)
+                    }
+                    for scope, entries in self._scopes.items()
+                ]
+            }
+
+
+# Singleton instance
+_answer_cache: SemanticAnswerCache | None = None
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """
+    Получить семантический кэш ответов (singleton).
+
+    Returns:
+        SemanticAnswerCache: Экземпляр кэша
+    """
+    global _answer_cache
+
+    if _answer_cache is None:
+        _answer_cache = SemanticAnswerCache()
+
+    return _answer_cache
+
+
+@cache_namespace(STRATEGY)
+def _on_strategy_change(generation: int, key: str | None) -> None:
+    get_answer_cache().bump_strategy_version()
+
+
+@cache_namespace(CORPUS)
+def _on_corpus_change(generation: int, key: str | None) -> None:
+    get_answer_cache().bump_corpus_version()
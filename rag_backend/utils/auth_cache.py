@@ -0,0 +1,108 @@
+"""
+Кэш аутентификации: session token → неизменяемый снимок пользователя.
+Горячие пути (SSE, опрос истории) не ходят в БД за пользователем;
+неверные токены кэшируются отдельно, чтобы перебор не нагружал БД.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
+import uuid
+
+from config.settings import settings
+from database.invalidation import AUTH, cache_namespace
+from utils.cache import TTLCache
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """Неизменяемый снимок пользователя (не привязан к сессии БД)"""
+    id: uuid.UUID
+    username: str
+    session_token: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+    @classmethod
+    def from_orm(cls, user: Any) -> "UserSnapshot":
+        """Снять снимок с ORM-объекта User."""
+        return cls(
+            id=user.id,
+            username=user.username,
+            session_token=user.session_token,
+            created_at=user.created_at
+        )
+
+
+class SessionTokenCache:
+    """TTL-кэш пользователей по токену с негативным кэшированием."""
+
+    def __init__(self):
+        self._users = TTLCache(settings.auth_cache_max_entries, settings.auth_cache_ttl_seconds)
+        self._invalid = TTLCache(settings.auth_cache_max_entries, settings.auth_negative_cache_ttl_seconds)
+
+    def get(self, token: str) -> tuple[bool, Optional[UserSnapshot]]:
+        """
+        Найти токен в кэше.
+
+        Args:
+            token: Session token
+
+        Returns:
+            tuple[bool, Optional[UserSnapshot]]: (найден в кэше, пользователь или None для неверного токена)
+        """
+        user = self._users.get(token)
+        if user is not None:
+            return True, user
+        if self._invalid.get(token):
+            return True, None
+        return False, None
+
+    def put(self, token: str, user: UserSnapshot) -> None:
+        """Запомнить пользователя по токену."""
+        self._users.set(token, user)
+
+    def put_invalid(self, token: str) -> None:
+        """Запомнить, что токен неверный."""
+        self._invalid.set(token, True)
+
+    def invalidate(self, token: Optional[str]) -> None:
+        """Сбросить токен (после смены токена пользователя)."""
+        if token:
+            self._users.pop(token)
+            self._invalid.pop(token)
+
+    def clear(self) -> None:
+        """Сбросить весь кэш."""
+        self._users.clear()
+        self._invalid.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика кэша."""
+        return {"valid": self._users.stats(), "invalid": self._invalid.stats()}
+
+
+# Singleton instance
+_auth_cache: SessionTokenCache | None = None
+
+
+def get_auth_cache() -> SessionTokenCache:
+    """
+    Получить кэш аутентификации (singleton).
+
+    Returns:
+        SessionTokenCache: Экземпляр кэша
+    """
+    global _auth_cache
+
+    if _auth_cache is None:
+        _auth_cache = SessionTokenCache()
+
+    return _auth_cache
+
+
+@cache_namespace(AUTH)
+def _on_auth_change(generation: int, key: str | None) -> None:
+    if key:
+        get_auth_cache().invalidate(key)
+    else:
+        get_auth_cache().clear()
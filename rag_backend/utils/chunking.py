@@ -1,10 +1,14 @@
 """
 Утилиты для разбивки документов на чанки.
-Используется RecursiveCharacterTextSplitter из LangChain.
+Используется RecursiveCharacterTextSplitter из LangChain; для загрузки —
+потоковый чанкер iter_chunks по страницам/абзацам с метаданными page/chapter/offset.
+Размер чанка измеряется в токенах или символах (settings.chunk_size_unit).
 """
 
+from dataclasses import dataclass
+from functools import lru_cache
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from typing import List
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 import tiktoken
 import re
 
@@ -12,6 +16,24 @@ from config.settings import settings
 from utils.logger import logger
 
 
+@lru_cache(maxsize=None)
+def get_encoding(model: str = "gpt-4o-mini") -> tiktoken.Encoding:
+    """
+    Токенизатор модели — один на процесс (загрузка BPE-таблиц дорогая).
+    
+    Args:
+        model: Модель для токенизации
+        
+    Returns:
+        tiktoken.Encoding: Токенизатор
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Fallback на cl100k_base (используется в GPT-4)
+        return tiktoken.get_encoding("cl100k_base")
+
+
 def get_token_count(text: str, model: str = "gpt-4o-mini") -> int:
     """
     Подсчитать количество токенов в тексте.
@@ -23,13 +45,51 @@ def get_token_count(text: str, model: str = "gpt-4o-mini") -> int:
     Returns:
         int: Количество токенов
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        # Fallback на cl100k_base (используется в GPT-4)
-        encoding = tiktoken.get_encoding("cl100k_base")
+    return len(get_encoding(model).encode(text, disallowed_special=()))
+
+
+def get_token_counts(texts: List[str], model: str = "gpt-4o-mini") -> List[int]:
+    """
+    Подсчитать токены сразу для списка текстов (encode_batch в несколько потоков).
     
-    return len(encoding.encode(text))
+    Args:
+        texts: Тексты для подсчета
+        model: Модель для токенизации
+        
+    Returns:
+        List[int]: Количество токенов для каждого текста
+    """
+    if not texts:
+        return []
+    if len(texts) == 1:
+        return [get_token_count(texts[0], model)]
+    encoded = get_encoding(model).encode_batch(
+        texts, num_threads=max(1, settings.tokenizer_threads), disallowed_special=()
+    )
+    return [len(tokens) for tokens in encoded]
+
+
+def chunk_sizing(
+    chunk_size: int | None = None,
+    chunk_overlap: int | None = None
+) -> Tuple[int, int, Callable[[str], int]]:
+    """
+    Размер чанка, перекрытие и функция длины для текущего режима (settings.chunk_size_unit).
+    
+    Args:
+        chunk_size: Размер чанка (по умолчанию из settings для режима)
+        chunk_overlap: Перекрытие (по умолчанию из settings для режима)
+        
+    Returns:
+        Tuple[int, int, Callable[[str], int]]: (размер, перекрытие, функция длины)
+    """
+    if settings.chunk_size_unit == "tokens":
+        return (
+            chunk_size or settings.chunk_size_tokens,
+            chunk_overlap or settings.chunk_overlap_tokens,
+            get_token_count
+        )
+    return chunk_size or settings.chunk_size, chunk_overlap or settings.chunk_overlap, len
 
 
 def chunk_text(
@@ -43,23 +103,25 @@ def chunk_text(
     
     Args:
         text: Исходный текст
-        chunk_size: Размер чанка в символах (по умолчанию из settings)
+        chunk_size: Размер чанка в единицах settings.chunk_size_unit (по умолчанию из settings)
         chunk_overlap: Перекрытие между чанками (по умолчанию из settings)
         add_metadata: Добавлять ли метаданные (номер чанка, токены)
         
     Returns:
         List[dict]: Список чанков с метаданными
     """
-    chunk_size = chunk_size or settings.chunk_size
-    chunk_overlap = chunk_overlap or settings.chunk_overlap
+    chunk_size, chunk_overlap, length_function = chunk_sizing(chunk_size, chunk_overlap)
     
-    logger.info(f"Chunking text: {len(text)} chars, chunk_size={chunk_size}, overlap={chunk_overlap}")
+    logger.info(
+        f"Chunking text: {len(text)} chars, chunk_size={chunk_size}, "
+        f"overlap={chunk_overlap} ({settings.chunk_size_unit})"
+    )
     
     # Создаем text splitter
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
-        length_function=len,
+        length_function=length_function,
         is_separator_regex=True,
         separators=[
             r"\n\s*[Гг]лава\s+\d+",       # Глава / глава
@@ -88,6 +150,7 @@ def chunk_text(
     # Добавляем метаданные к каждому чанку
     result = []
     current_chapter = None
+    token_counts = get_token_counts(chunks)
     
     for i, chunk in enumerate(chunks):
         # Пытаемся найти главу в начале чанка (увеличиваем окно поиска до 200 символов)
@@ -101,7 +164,7 @@ def chunk_text(
             "chunk_index": i,
             "total_chunks": len(chunks),
             "char_count": len(chunk),
-            "token_count": get_token_count(chunk),
+            "token_count": token_counts[i],
             "chapter": str(current_chapter) if current_chapter is not None else None
         }
         result.append(chunk_data)
@@ -152,6 +215,190 @@ def chunk_document(
     return chunks
 
 
+# Заголовок главы/части в начале абзаца
+CHAPTER_HEADING_RE = re.compile(r"^\s*(?:[Гг]лава|ГЛАВА|[Чч]асть|ЧАСТЬ|[Cc]hapter|CHAPTER)\s+(\d+)")
+
+# Границы абзацев внутри страницы
+PARAGRAPH_SPLIT_RE = re.compile(r"\n\s*\n")
+
+# Разделитель абзацев внутри чанка
+UNIT_SEPARATOR = "\n\n"
+
+
+@dataclass
+class _Unit:
+    """Абзац (или часть длинного абзаца) с положением в документе"""
+    text: str
+    page: Optional[int]
+    chapter: Optional[str]
+    offset: int
+    size: int  # Длина в единицах chunk_size_unit
+
+
+def _iter_units(
+    pages: Iterable[Tuple[Optional[int], str]],
+    chunk_size: int,
+    length_function: Callable[[str], int]
+) -> Iterator[Tuple[_Unit, bool]]:
+    """
+    Абзацы документа по порядку; длинные абзацы режутся по строкам/предложениям.
+    В режиме tokens абзацы страницы измеряются одним encode_batch.
+
+    Yields:
+        Tuple[_Unit, bool]: (абзац, начинается ли с него новая глава)
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=0,
+        length_function=length_function,
+        is_separator_regex=True,
+        separators=[r"\n", r"\. ", r" ", r""]
+    )
+    by_tokens = length_function is not len
+    chapter = None
+    page_offset = 0
+    for page, text in pages:
+        paragraphs = [p.strip() for p in PARAGRAPH_SPLIT_RE.split(text)]
+        paragraphs = [p for p in paragraphs if p]
+        sizes = get_token_counts(paragraphs) if by_tokens else [len(p) for p in paragraphs]
+        cursor = 0
+        for paragraph, size in zip(paragraphs, sizes):
+            heading = CHAPTER_HEADING_RE.match(paragraph)
+            if heading:
+                chapter = heading.group(1)
+            if size <= chunk_size:
+                pieces = [(paragraph, size)]
+            else:
+                parts = splitter.split_text(paragraph)
+                pieces = list(zip(parts, get_token_counts(parts) if by_tokens else [len(p) for p in parts]))
+            for i, (piece, piece_size) in enumerate(pieces):
+                position = text.find(piece, cursor)
+                if position >= 0:
+                    cursor = position + len(piece)
+                unit = _Unit(piece, page, chapter, page_offset + max(position, 0), piece_size)
+                yield unit, bool(heading) and i == 0
+        page_offset += len(text) + 1
+
+
+def iter_chunks(
+    pages: Iterable[Tuple[Optional[int], str]],
+    chunk_size: int | None = None,
+    chunk_overlap: int | None = None
+) -> Iterator[dict]:
+    """
+    Потоковая разбивка документа на чанки. Абзацы накапливаются до chunk_size,
+    соседние чанки перекрываются последними абзацами (в том числе через
+    границу страниц); с заголовка главы всегда начинается новый чанк.
+    В памяти держится текущий чанк и до settings.token_count_batch_size готовых,
+    для которых token_count считается одним encode_batch.
+
+    Args:
+        pages: (номер страницы или None, текст) — например, utils.document_loader.iter_pages
+        chunk_size: Размер чанка в единицах settings.chunk_size_unit (по умолчанию из settings)
+        chunk_overlap: Перекрытие между чанками (по умолчанию из settings)
+
+    Yields:
+        dict: content, chunk_index, char_count, token_count, chapter, page, page_end, char_offset
+    """
+    chunk_size, chunk_overlap, length_function = chunk_sizing(chunk_size, chunk_overlap)
+    separator_size = length_function(UNIT_SEPARATOR)
+    batch_size = max(1, settings.token_count_batch_size)
+
+    buffer: List[_Unit] = []
+    size = 0
+    fresh = False  # В буфере есть абзацы, еще не попавшие ни в один чанк
+    ready: List[dict] = []
+
+    def emit() -> None:
+        content = UNIT_SEPARATOR.join(unit.text for unit in buffer)
+        ready.append({
+            "content": content,
+            "chunk_index": len(ready),
+            "char_count": len(content),
+            "token_count": None,
+            "chapter": buffer[0].chapter,
+            "page": buffer[0].page,
+            "page_end": buffer[-1].page,
+            "char_offset": buffer[0].offset
+        })
+
+    def measure(units: List[_Unit]) -> int:
+        return sum(unit.size for unit in units) + separator_size * max(len(units) - 1, 0)
+
+    def overlap_tail() -> List[_Unit]:
+        tail, total = [], 0
+        for unit in reversed(buffer):
+            total += unit.size + separator_size
+            if total > chunk_overlap:
+                break
+            tail.insert(0, unit)
+        return tail
+
+    def flush(offset: int) -> List[dict]:
+        for chunk, tokens in zip(ready, get_token_counts([chunk["content"] for chunk in ready])):
+            chunk["token_count"] = tokens
+            chunk["chunk_index"] += offset
+        return ready
+
+    emitted = 0
+    for unit, starts_chapter in _iter_units(pages, chunk_size, length_function):
+        if starts_chapter and fresh:
+            emit()
+            buffer, size, fresh = [], 0, False
+        elif starts_chapter:
+            buffer, size = [], 0
+
+        added = unit.size + (separator_size if buffer else 0)
+        if buffer and size + added > chunk_size:
+            if fresh:
+                emit()
+                buffer = overlap_tail()
+            else:
+                buffer = []
+            size = measure(buffer)
+            if buffer and size + separator_size + unit.size > chunk_size:
+                buffer = []
+                size = 0
+            added = unit.size + (separator_size if buffer else 0)
+
+        buffer.append(unit)
+        size += added
+        fresh = True
+
+        if len(ready) >= batch_size:
+            yield from flush(emitted)
+            emitted += len(ready)
+            ready = []
+
+    if fresh:
+        emit()
+    yield from flush(emitted)
+
+
+def iter_document_chunks(
+    pages: Iterable[Tuple[Optional[int], str]],
+    source: str,
+    additional_metadata: dict | None = None
+) -> Iterator[dict]:
+    """
+    Потоковый аналог chunk_document: чанки с метаданными для сохранения в БД.
+
+    Args:
+        pages: (номер страницы или None, текст)
+        source: Название источника (например, "book.pdf")
+        additional_metadata: Дополнительные метаданные (author, type и т.д.)
+
+    Yields:
+        dict: {"content": ..., "metadata": {...}}
+    """
+    for chunk in iter_chunks(pages):
+        content = chunk.pop("content")
+        yield {
+            "content": content,
+            "metadata": {"source": source, **chunk, **(additional_metadata or {})}
+        }
+
+
 def estimate_chunks_count(text: str, chunk_size: int | None = None) -> int:
     """
     Оценить количество чанков без фактического разбиения.
@@ -163,5 +410,5 @@ def estimate_chunks_count(text: str, chunk_size: int | None = None) -> int:
     Returns:
         int: Примерное количество чанков
     """
-    chunk_size = chunk_size or settings.chunk_size
-    return max(1, len(text) // chunk_size)
+    chunk_size, _, length_function = chunk_sizing(chunk_size)
+    return max(1, length_function(text) // chunk_size)
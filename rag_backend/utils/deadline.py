@@ -0,0 +1,93 @@
+"""
+Бюджет времени запроса (deadline), передаваемый через config графа.
+Узлы проверяют остаток бюджета и деградируют по политике.
+"""
+
+from typing import Any, Dict, List
+import math
+import time
+
+from config.settings import settings
+from utils.logger import logger
+
+
+# Ключ в config["configurable"]; значение — момент истечения по time.monotonic()
+DEADLINE_CONFIG_KEY = "deadline"
+
+# Политика деградации: имя -> порог остатка бюджета (сек), ниже которого она срабатывает
+DEGRADATION_POLICY: Dict[str, str] = {
+    "skip_intent_classification": "degrade_router_below_seconds",
+    "skip_chapter_extraction": "degrade_chapter_extraction_below_seconds",
+    "shrink_top_k": "degrade_top_k_below_seconds",
+    "skip_passport": "degrade_passport_below_seconds",
+    "fast_model": "degrade_model_below_seconds",
+}
+
+
+def make_deadline(budget_seconds: float | None = None) -> float:
+    """
+    Рассчитать момент истечения бюджета.
+
+    Args:
+        budget_seconds: Бюджет в секундах (по умолчанию из settings)
+
+    Returns:
+        float: Значение time.monotonic(), после которого бюджет исчерпан
+    """
+    return time.monotonic() + (budget_seconds or settings.request_deadline_seconds)
+
+
+class Deadline:
+    """Остаток бюджета времени для текущего прогона графа."""
+
+    def __init__(self, expires_at: float | None = None):
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any] | None) -> "Deadline":
+        """
+        Извлечь deadline из RunnableConfig графа.
+
+        Args:
+            config: Конфиг LangGraph (может быть None)
+
+        Returns:
+            Deadline: Без ограничения, если deadline не передан
+        """
+        configurable = (config or {}).get("configurable", {}) or {}
+        return cls(configurable.get(DEADLINE_CONFIG_KEY))
+
+    def remaining(self) -> float:
+        """Оставшееся время в секундах (inf, если бюджет не задан)."""
+        if self.expires_at is None:
+            return math.inf
+        return self.expires_at - time.monotonic()
+
+    def should_degrade(self, degradation: str) -> bool:
+        """
+        Проверить, должна ли сработать деградация по политике.
+
+        Args:
+            degradation: Имя деградации из DEGRADATION_POLICY
+
+        Returns:
+            bool: True если остаток бюджета ниже порога
+        """
+        threshold = getattr(settings, DEGRADATION_POLICY[degradation])
+        remaining = self.remaining()
+        if remaining < threshold:
+            logger.warning(
+                f"⏱️ Deadline degradation '{degradation}': "
+                f"{remaining:.1f}s left < {threshold:.1f}s"
+            )
+            return True
+        return False
+
+
+def record_degradation(state: Dict[str, Any], degradation: str) -> None:
+    """Отметить сработавшую деградацию в данных текущего запуска (state["run"])."""
+    if state.get("run") is None:
+        state["run"] = {}
+    degradations: List[str] = state["run"].setdefault("degradations", [])
+    if degradation not in degradations:
+        degradations.append(degradation)
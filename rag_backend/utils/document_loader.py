@@ -3,14 +3,193 @@
 Поддерживает: PDF, DOCX, TXT.
 """
 
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from collections import deque
 from pathlib import Path
-from typing import List, Tuple
+from typing import Deque, Iterator, List, Optional, Tuple
+import codecs
+import multiprocessing
 import pypdf
 import docx
 
+from config.settings import settings
 from utils.logger import logger
 
 
+def _extract_page_range(file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """
+    Извлечь текст страниц [start, end) — выполняется в процессе пула,
+    каждый процесс открывает PDF сам.
+
+    Returns:
+        List[Tuple[int, str]]: (номер страницы с 1, текст)
+    """
+    reader = pypdf.PdfReader(file_path)
+    return [
+        (page_index + 1, reader.pages[page_index].extract_text() or "")
+        for page_index in range(start, end)
+    ]
+
+
+def _iter_pages_parallel(file_path: Path, total_pages: int) -> Iterator[Tuple[int, str]]:
+    """
+    Постраничное извлечение пулом процессов. Диапазоны страниц отправляются
+    скользящим окном (не больше 2 задач на процесс), результаты отдаются
+    в порядке страниц по мере готовности.
+    """
+    workers = max(1, settings.pdf_extract_workers)
+    pages_per_task = max(1, settings.pdf_pages_per_task)
+    ranges = deque(
+        (start, min(start + pages_per_task, total_pages))
+        for start in range(0, total_pages, pages_per_task)
+    )
+    # spawn: воркер сервера многопоточный, fork в нем небезопасен
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        in_flight: Deque[Future] = deque()
+        while ranges or in_flight:
+            while ranges and len(in_flight) < workers * 2:
+                start, end = ranges.popleft()
+                in_flight.append(pool.submit(_extract_page_range, str(file_path), start, end))
+            yield from in_flight.popleft().result()
+
+
+def iter_pdf_pages(file_path: Path | str) -> Iterator[Tuple[int, str]]:
+    """
+    Текст страниц PDF по порядку. Большие файлы извлекаются параллельно
+    (settings.pdf_parallel_extraction), маленькие и при сбое пула — последовательно.
+
+    Args:
+        file_path: Путь к PDF файлу
+
+    Yields:
+        Tuple[int, str]: (номер страницы с 1, текст)
+    """
+    file_path = Path(file_path)
+    reader = pypdf.PdfReader(file_path)
+    total_pages = len(reader.pages)
+    logger.info(f"PDF has {total_pages} pages")
+
+    if settings.pdf_parallel_extraction and total_pages >= settings.pdf_parallel_min_pages:
+        emitted = 0
+        try:
+            for page_num, page_text in _iter_pages_parallel(file_path, total_pages):
+                emitted = page_num
+                yield page_num, page_text
+            return
+        except (BrokenProcessPool, OSError) as e:
+            logger.warning(f"Parallel PDF extraction failed ({e}), continuing serially from page {emitted + 1}")
+        start = emitted
+    else:
+        start = 0
+
+    for page_index in range(start, total_pages):
+        yield page_index + 1, reader.pages[page_index].extract_text() or ""
+
+
+# Кодировки TXT в порядке проверки (latin-1 декодирует любой файл)
+TXT_ENCODINGS = ["utf-8", "cp1251", "latin-1"]
+
+# Блок TXT без пустых строк отдается частями такого размера
+MAX_TEXT_BLOCK_CHARS = 64 * 1024
+
+
+def detect_text_encoding(file_path: Path | str, block_size: int = 1024 * 1024) -> str:
+    """
+    Подобрать кодировку TXT, декодируя файл потоково (без загрузки целиком).
+
+    Args:
+        file_path: Путь к файлу
+        block_size: Размер читаемого блока
+
+    Returns:
+        str: Первая кодировка из TXT_ENCODINGS, которой файл декодируется
+    """
+    for encoding in TXT_ENCODINGS[:-1]:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(file_path, "rb") as file:
+                while block := file.read(block_size):
+                    decoder.decode(block)
+                decoder.decode(b"", final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return TXT_ENCODINGS[-1]
+
+
+def iter_text_blocks(file_path: Path | str, encoding: str | None = None) -> Iterator[str]:
+    """
+    Абзацы TXT файла (блоки между пустыми строками) по мере чтения.
+
+    Args:
+        file_path: Путь к файлу
+        encoding: Кодировка (None — определить)
+
+    Yields:
+        str: Текст блока
+    """
+    encoding = encoding or detect_text_encoding(file_path)
+    lines: List[str] = []
+    size = 0
+    with open(file_path, "r", encoding=encoding) as file:
+        for line in file:
+            if line.strip():
+                lines.append(line)
+                size += len(line)
+                if size < MAX_TEXT_BLOCK_CHARS:
+                    continue
+            if lines:
+                yield "".join(lines)
+                lines, size = [], 0
+    if lines:
+        yield "".join(lines)
+
+
+def iter_pages(file_path: Path | str) -> Iterator[Tuple[Optional[int], str]]:
+    """
+    Поток текста документа: страницы PDF или абзацы DOCX/TXT.
+    Документ целиком в памяти не собирается (кроме DOCX — его разбирает python-docx).
+
+    Args:
+        file_path: Путь к файлу
+
+    Yields:
+        Tuple[Optional[int], str]: (номер страницы или None, текст)
+
+    Raises:
+        ValueError: Если формат не поддерживается
+    """
+    file_path = Path(file_path)
+    if not file_path.exists():
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    extension = file_path.suffix.lower()
+    if extension == ".pdf":
+        for page_num, page_text in iter_pdf_pages(file_path):
+            if page_text.strip():
+                yield page_num, page_text
+    elif extension == ".docx":
+        doc = docx.Document(file_path)
+        for para in doc.paragraphs:
+            if para.text.strip():
+                yield None, para.text
+        for table in doc.tables:
+            for row in table.rows:
+                row_text = " | ".join(cell.text for cell in row.cells)
+                if row_text.strip():
+                    yield None, row_text
+    elif extension == ".txt":
+        for block in iter_text_blocks(file_path):
+            yield None, block
+    else:
+        raise ValueError(
+            f"Unsupported file format: {extension}. "
+            f"Supported: {', '.join(DocumentLoader.SUPPORTED_EXTENSIONS)}"
+        )
+
+
 class DocumentLoader:
     """Загрузчик документов различных форматов"""
     
@@ -32,24 +211,16 @@ class DocumentLoader:
         text_parts = []
         
         try:
-            with open(file_path, "rb") as file:
-                pdf_reader = pypdf.PdfReader(file)
-                total_pages = len(pdf_reader.pages)
-                
-                logger.info(f"PDF has {total_pages} pages")
-                
-                for page_num, page in enumerate(pdf_reader.pages, start=1):
-                    page_text = page.extract_text()
-                    
-                    if page_text.strip():
-                        # Добавляем маркер страницы для метаданных
-                        text_parts.append(f"\n[Page {page_num}]\n{page_text}")
-                
-                full_text = "\n".join(text_parts)
-                logger.info(f"Extracted {len(full_text)} characters from PDF")
-                
-                return full_text
-                
+            for page_num, page_text in iter_pdf_pages(file_path):
+                if page_text.strip():
+                    # Добавляем маркер страницы для метаданных
+                    text_parts.append(f"\n[Page {page_num}]\n{page_text}")
+            
+            full_text = "\n".join(text_parts)
+            logger.info(f"Extracted {len(full_text)} characters from PDF")
+            
+            return full_text
+            
         except Exception as e:
             logger.error(f"Error loading PDF {file_path}: {e}")
             raise
@@ -0,0 +1,113 @@
+"""
+Потоковое сохранение загруженных файлов.
+Файл пишется на диск блоками с инкрементальным SHA-256,
+поэтому память на загрузку ограничена размером блока.
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+import asyncio
+import hashlib
+import os
+import uuid
+
+from config.settings import settings
+
+
+class UploadTooLargeError(ValueError):
+    """Файл превышает допустимый размер загрузки."""
+
+
+@dataclass
+class StoredUpload:
+    """Файл, сохраненный во временный путь"""
+    temp_path: Path
+    sha256: str
+    size_bytes: int
+
+
+async def stream_upload_to_disk(
+    upload: Any,
+    dest_dir: str | Path | None = None,
+    max_bytes: int | None = None,
+    chunk_size: int | None = None
+) -> StoredUpload:
+    """
+    Записать UploadFile на диск блоками, считая SHA-256 на лету.
+
+    Args:
+        upload: UploadFile (любой объект с async read(size))
+        dest_dir: Каталог для временного файла
+        max_bytes: Максимальный размер файла
+        chunk_size: Размер блока чтения
+
+    Returns:
+        StoredUpload: Временный путь, хэш и размер
+
+    Raises:
+        UploadTooLargeError: Если файл больше max_bytes (временный файл удаляется)
+    """
+    dest_dir = Path(dest_dir or settings.documents_dir)
+    max_bytes = max_bytes or settings.max_upload_size_mb * 1024 * 1024
+    chunk_size = chunk_size or settings.upload_chunk_size
+
+    tmp_dir = dest_dir / ".incoming"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    temp_path = tmp_dir / f"{uuid.uuid4().hex}.part"
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, "wb") as f:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(
+                        f"File exceeds {max_bytes // (1024 * 1024)} MB upload limit"
+                    )
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    return StoredUpload(temp_path=temp_path, sha256=digest.hexdigest(), size_bytes=size)
+
+
+def versioned_path(filename: str, version: int, sha256: str, dest_dir: str | Path | None = None) -> Path:
+    """
+    Путь хранения версии файла: {dest_dir}/{stem}/v{version}-{sha[:12]}{suffix}.
+    Одноименные загрузки не перезаписывают друг друга.
+
+    Args:
+        filename: Исходное имя файла
+        version: Номер версии (с 1)
+        sha256: Хэш содержимого
+        dest_dir: Корневой каталог документов
+
+    Returns:
+        Path: Путь файла
+    """
+    name = Path(filename).name
+    stem, suffix = os.path.splitext(name)
+    return Path(dest_dir or settings.documents_dir) / stem / f"v{version}-{sha256[:12]}{suffix}"
+
+
+def commit_upload(stored: StoredUpload, target: Path) -> Path:
+    """
+    Переместить временный файл на постоянный путь (атомарно в пределах ФС).
+
+    Args:
+        stored: Результат stream_upload_to_disk
+        target: Постоянный путь
+
+    Returns:
+        Path: Постоянный путь
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(stored.temp_path, target)
+    return target
@@ -0,0 +1,203 @@
+"""
+Толерантный инкрементальный разбор JSON из ответа LLM.
+Текст сканируется один раз по мере поступления; в любой момент
+можно получить лучший вариант разбора: пролог/эпилог вокруг объекта
+отбрасываются, висячие запятые удаляются, оборванный хвост
+(строка, ключ без значения, незакрытые скобки) достраивается.
+"""
+
+from typing import Any, Dict, List, Optional, Type
+import json
+
+
+class IncrementalJSONParser:
+    """Однопроходный сканер первого JSON-объекта/массива в потоке текста."""
+
+    def __init__(self):
+        self._out: List[str] = []
+        self._stack: List[str] = []  # "{" или "["
+        self._expect_key: List[bool] = []  # для объектов: ждем ключ (до двоеточия)
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._done = False
+
+    @property
+    def done(self) -> bool:
+        """Верхнеуровневое значение полностью получено."""
+        return self._done
+
+    def feed(self, chunk: str) -> "IncrementalJSONParser":
+        """
+        Обработать очередной фрагмент текста.
+
+        Args:
+            chunk: Фрагмент ответа модели
+
+        Returns:
+            IncrementalJSONParser: self (для цепочек)
+        """
+        for ch in chunk:
+            if self._done:
+                break
+            if not self._started:
+                if ch in "{[":
+                    self._started = True
+                    self._open(ch)
+                continue
+
+            if self._in_string:
+                self._out.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._out.append(ch)
+            elif ch in "{[":
+                self._open(ch)
+            elif ch in "}]":
+                self._drop_trailing_comma()
+                self._close()
+            elif ch == ":":
+                if self._expect_key and self._stack[-1] == "{":
+                    self._expect_key[-1] = False
+                self._out.append(ch)
+            elif ch == ",":
+                if self._stack[-1] == "{":
+                    self._expect_key[-1] = True
+                self._out.append(ch)
+            elif ch in "\r\n\t":
+                self._out.append(" ")
+            else:
+                self._out.append(ch)
+        return self
+
+    def _open(self, ch: str) -> None:
+        self._stack.append(ch)
+        self._expect_key.append(ch == "{")
+        self._out.append(ch)
+
+    def _close(self) -> None:
+        opener = self._stack.pop()
+        self._expect_key.pop()
+        self._out.append("}" if opener == "{" else "]")
+        if not self._stack:
+            self._done = True
+
+    def _drop_trailing_comma(self) -> None:
+        i = len(self._out) - 1
+        while i >= 0 and self._out[i] == " ":
+            i -= 1
+        if i >= 0 and self._out[i] == ",":
+            del self._out[i:]
+
+    def text(self) -> Optional[str]:
+        """
+        Текущий буфер, достроенный до синтаксически законченного JSON.
+
+        Returns:
+            str или None, если JSON еще не начался
+        """
+        if not self._started:
+            return None
+        if self._done:
+            return "".join(self._out)
+
+        tail = list(self._out)
+        in_key = bool(self._expect_key) and self._expect_key[-1]
+        if self._in_string:
+            if self._escape:
+                tail.pop()
+            tail.append('"')
+
+        # Дочищаем оборванный хвост: запятая, двоеточие или ключ без значения
+        body = "".join(tail).rstrip()
+        if body.endswith(","):
+            body = body[:-1]
+        elif body.endswith(":"):
+            body += " null"
+        elif in_key and body.endswith('"'):
+            body += ": null"
+        elif body and body[-1] not in '{[]}"' and not body[-1].isdigit() and not body.endswith(("true", "false", "null")):
+            # Оборванный литерал (tru, fal, nul) или число вида "1." — отрезаем до последнего разделителя
+            cut = max(body.rfind(","), body.rfind(":"), body.rfind("["), body.rfind("{"))
+            body = body[:cut + 1] + (" null" if body[cut] == ":" else "")
+            body = body[:-1] if body.endswith(",") else body
+
+        closers = "".join("}" if opener == "{" else "]" for opener in reversed(self._stack))
+        return body + closers
+
+    def result(self) -> Any:
+        """
+        Лучший вариант разбора накопленного текста.
+
+        Returns:
+            Any: Разобранное значение
+
+        Raises:
+            ValueError: Если в тексте нет JSON или его не удалось восстановить
+        """
+        text = self.text()
+        if text is None:
+            raise ValueError("No JSON object found in model output")
+        try:
+            # LLM часто оставляет в строках сырые переводы строк и табуляции
+            return json.loads(text, strict=False)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Unrecoverable JSON in model output: {e}") from e
+
+
+def parse_json_tolerant(text: str) -> Any:
+    """
+    Разобрать JSON из ответа модели (с прологом, code fence, обрывом).
+
+    Args:
+        text: Ответ модели
+
+    Returns:
+        Any: Разобранное значение
+
+    Raises:
+        ValueError: Если JSON не найден
+    """
+    return IncrementalJSONParser().feed(text).result()
+
+
+def fit_to_model(data: Dict[str, Any], model: Type[Any]) -> Any:
+    """
+    Привести словарь к pydantic-модели со строковыми полями:
+    отсутствующие поля — пустая строка, списки склеиваются построчно,
+    вложенные объекты сериализуются.
+
+    Args:
+        data: Разобранный JSON
+        model: Класс pydantic-модели
+
+    Returns:
+        Экземпляр model
+
+    Raises:
+        ValueError: Если data — не объект
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected JSON object, got {type(data).__name__}")
+    values = {}
+    for name, field in model.model_fields.items():
+        value = data.get(name)
+        if field.annotation is str:
+            if value is None:
+                value = ""
+            elif isinstance(value, list):
+                value = "\n".join(v if isinstance(v, str) else json.dumps(v, ensure_ascii=False) for v in value)
+            elif isinstance(value, dict):
+                value = json.dumps(value, ensure_ascii=False)
+            else:
+                value = str(value)
+        values[name] = value
+    return model.model_validate(values)
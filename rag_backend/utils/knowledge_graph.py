@@ -0,0 +1,248 @@
+"""
+Построение графа знаний для 3D-визуализации.
+Связи строятся на стороне БД: цепочки чанков одного источника
+и семантические соседи через pgvector kNN. Результат кэшируется
+версионированным снимком.
+"""
+
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import List, Dict, Any
+import hashlib
+import time
+
+from sqlalchemy import text
+
+from config.settings import settings
+from database.invalidation import CORPUS, cache_namespace
+from utils.cache import TTLCache
+from utils.logger import logger
+
+
+# Блокировок сборки: ключи распределяются по фиксированному набору
+BUILD_LOCK_STRIPES = 16
+
+
+# Последние чанки автора (узлы графа); content обрезается в БД, чтобы не гонять полный текст.
+# Чанки одного батча имеют одинаковый created_at: id в сортировке делает набор узлов
+# одинаковым во всех трех запросах
+NODES_SQL = text("""
+    SELECT id, left(content, 200), metadata->>'source'
+    FROM knowledge_base
+    WHERE metadata->>'author' = :author AND visible
+    ORDER BY created_at DESC, id DESC
+    LIMIT :limit
+""")
+
+# Связи по источнику: каждый чанк связан с предыдущим чанком того же источника (O(n) ребер)
+SOURCE_LINKS_SQL = text("""
+    WITH nodes AS (
+        SELECT id, metadata->>'source' AS source,
+               COALESCE((metadata->>'chunk_index')::int, 0) AS chunk_index
+        FROM knowledge_base
+        WHERE metadata->>'author' = :author AND visible
+        ORDER BY created_at DESC, id DESC
+        LIMIT :limit
+    )
+    SELECT prev_id, id
+    FROM (
+        SELECT id, LAG(id) OVER (PARTITION BY source ORDER BY chunk_index, id) AS prev_id
+        FROM nodes
+    ) ordered
+    WHERE prev_id IS NOT NULL
+""")
+
+# Семантические соседи среди узлов снимка: точный kNN по материализованному
+# набору (не больше knowledge_graph_max_nodes), а не по всей таблице —
+# иначе почти все ближайшие соседи оказываются вне снимка
+KNN_LINKS_SQL = text("""
+    WITH nodes AS MATERIALIZED (
+        SELECT id, embedding
+        FROM knowledge_base
+        WHERE metadata->>'author' = :author AND visible
+        ORDER BY created_at DESC, id DESC
+        LIMIT :limit
+    )
+    SELECT nodes.id, neighbor.id, neighbor.similarity
+    FROM nodes
+    CROSS JOIN LATERAL (
+        SELECT candidate.id, 1 - (candidate.embedding <=> nodes.embedding) AS similarity
+        FROM nodes candidate
+        WHERE candidate.id <> nodes.id
+        ORDER BY candidate.embedding <=> nodes.embedding
+        LIMIT :neighbors
+    ) neighbor
+""")
+
+
+@dataclass
+class GraphSnapshot:
+    """Снимок графа знаний"""
+    version: str
+    nodes: List[Dict[str, Any]]
+    links: List[Dict[str, Any]]
+    built_at: float = field(default_factory=time.time)
+
+    def page(self, offset: int, page_size: int) -> Dict[str, Any]:
+        """
+        Страница снимка: узлы [offset, offset + page_size) и связи,
+        исходящие из этих узлов.
+
+        Args:
+            offset: Смещение по узлам
+            page_size: Размер страницы
+
+        Returns:
+            Dict[str, Any]: Ответ API
+        """
+        nodes = self.nodes[offset:offset + page_size]
+        node_ids = {node["id"] for node in nodes}
+        links = [link for link in self.links if link["source"] in node_ids]
+        next_offset = offset + page_size if offset + page_size < len(self.nodes) else None
+        return {
+            "version": self.version,
+            "nodes": nodes,
+            "links": links,
+            "total_nodes": len(self.nodes),
+            "next_offset": next_offset
+        }
+
+
+def build_graph_snapshot(
+    limit: int,
+    neighbors: int | None = None,
+    author: str = "Nikolay Velizhanin",
+    primary: bool = False
+) -> GraphSnapshot:
+    """
+    Построить снимок графа знаний.
+
+    Args:
+        limit: Количество последних чанков (узлов)
+        neighbors: Семантических соседей на узел (0 — без kNN-связей)
+        author: Автор, по которому фильтруются чанки
+        primary: Читать с основной БД, а не через retrieval-пул (реплику)
+
+    Returns:
+        GraphSnapshot: Узлы и связи
+    """
+    from database.connection import engine, retrieval_engine
+
+    neighbors = settings.knowledge_graph_neighbors if neighbors is None else neighbors
+    params = {"author": author, "limit": limit, "neighbors": neighbors}
+    started = time.perf_counter()
+
+    with (engine if primary else retrieval_engine).connect() as conn:
+        nodes = []
+        for row in conn.execute(NODES_SQL, params):
+            source = row[2] or "Chunk"
+            nodes.append({
+                "id": str(row[0]),
+                "name": source,
+                "val": 1,
+                "content": (row[1] or "") + "...",
+                "color": "#4f46e5" if "vtt" in source else "#10b981"
+            })
+
+        # Запросы выполняются по отдельности: между ними может опубликоваться новый батч,
+        # поэтому связи оставляем только между возвращенными узлами
+        node_ids = {node["id"] for node in nodes}
+        links = []
+        for prev_id, node_id in conn.execute(SOURCE_LINKS_SQL, params):
+            pair = (str(prev_id), str(node_id))
+            if pair[0] in node_ids and pair[1] in node_ids:
+                links.append({"source": pair[0], "target": pair[1], "type": "source"})
+
+        if neighbors > 0 and nodes:
+            seen = {(link["source"], link["target"]) for link in links}
+            for node_id, neighbor_id, similarity in conn.execute(KNN_LINKS_SQL, params):
+                pair = (str(node_id), str(neighbor_id))
+                # Без дублей (в т.ч. обратных и совпадающих со связями по источнику)
+                if pair[0] not in node_ids or pair[1] not in node_ids or pair in seen or pair[::-1] in seen:
+                    continue
+                seen.add(pair)
+                links.append({
+                    "source": pair[0],
+                    "target": pair[1],
+                    "type": "semantic",
+                    "similarity": round(float(similarity), 4)
+                })
+
+    digest = hashlib.sha256()
+    for node in nodes:
+        digest.update(node["id"].encode("utf-8"))
+    digest.update(str(len(links)).encode("utf-8"))
+
+    logger.info(
+        f"Knowledge graph built: {len(nodes)} nodes, {len(links)} links "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    return GraphSnapshot(version=digest.hexdigest()[:16], nodes=nodes, links=links)
+
+
+class GraphSnapshotCache:
+    """
+    Кэш снимков графа по (limit, neighbors, author) с TTL и LRU-вытеснением.
+    Сборка одного ключа выполняется одним потоком, остальные ждут результат.
+    Сразу после инвалидации снимки строятся по основной БД: реплика может
+    еще не содержать изменение, и устаревший снимок закэшировался бы на весь TTL.
+    """
+
+    def __init__(self, ttl_seconds: int | None = None, max_entries: int | None = None):
+        self.ttl_seconds = ttl_seconds or settings.knowledge_graph_cache_ttl_seconds
+        self._snapshots = TTLCache(
+            max_entries or settings.knowledge_graph_cache_max_entries, self.ttl_seconds
+        )
+        self._locks = [Lock() for _ in range(BUILD_LOCK_STRIPES)]
+        self._invalidated_at = 0.0
+
+    def get(self, limit: int, neighbors: int | None = None, author: str = "Nikolay Velizhanin") -> GraphSnapshot:
+        """
+        Получить снимок из кэша или построить новый.
+
+        Args:
+            limit: Количество узлов
+            neighbors: Семантических соседей на узел
+            author: Автор чанков
+
+        Returns:
+            GraphSnapshot: Снимок графа
+        """
+        key = (limit, neighbors, author)
+        with self._locks[hash(key) % len(self._locks)]:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None:
+                return snapshot
+            primary = time.time() - self._invalidated_at < settings.replica_max_lag_seconds
+            snapshot = build_graph_snapshot(limit, neighbors, author, primary=primary)
+            self._snapshots.set(key, snapshot)
+            return snapshot
+
+    def invalidate(self) -> None:
+        """Сбросить все снимки (после изменения базы знаний)."""
+        self._invalidated_at = time.time()
+        self._snapshots.clear()
+
+
+# Singleton instance
+_graph_cache: GraphSnapshotCache | None = None
+
+
+def get_graph_snapshot_cache() -> GraphSnapshotCache:
+    """
+    Получить кэш снимков графа (singleton).
+
+    Returns:
+        GraphSnapshotCache: Экземпляр кэша
+    """
+    global _graph_cache
+
+    if _graph_cache is None:
+        _graph_cache = GraphSnapshotCache()
+
+    return _graph_cache
+
+
+@cache_namespace(CORPUS)
+def _on_corpus_change(generation: int, key: str | None) -> None:
+    get_graph_snapshot_cache().invalidate()
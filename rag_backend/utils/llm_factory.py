@@ -3,20 +3,40 @@ from langchain_ollama import ChatOllama
 from config.settings import settings
 from utils.logger import logger
 
-def get_llm(temperature: float = None):
+
+# Ключ configurable: pydantic-модель, под которую генератор формирует JSON-ответ
+OUTPUT_SCHEMA_CONFIG_KEY = "output_schema"
+
+
+def get_llm(temperature: float = None, fast: bool = False, json_mode: bool = False):
     """
     Получить экземпляр LLM (OpenAI или Ollama) на основе настроек.
     Используется фабричный метод для избежания циклических импортов.
+
+    Для Ollama модель закрепляется в памяти через keep_alive, а num_ctx
+    фиксируется настройкой: так сервер не выгружает модель между запросами
+    и может переиспользовать KV-кэш общего префикса промпта.
+
+    fast=True выбирает меньшую модель (деградация при нехватке бюджета времени).
+
+    json_mode=True включает структурированный вывод: Ollama format="json"
+    (constrained decoding), OpenAI response_format json_object. Схему
+    ответа передает промпт (STRUCTURED_OUTPUT_PROMPT).
     """
     temp = temperature if temperature is not None else settings.temperature
-    
+    ollama_model = settings.ollama_fast_model if fast else settings.ollama_model
+    openai_model = settings.fast_llm_model if fast else settings.llm_model
+
     if settings.use_ollama:
-        logger.info(f"Using Ollama model: {settings.ollama_model}")
+        logger.info(f"Using Ollama model: {ollama_model}")
         try:
             return ChatOllama(
-                model=settings.ollama_model,
+                model=ollama_model,
                 temperature=temp,
                 base_url=settings.ollama_base_url,
+                keep_alive=settings.ollama_keep_alive,
+                num_ctx=settings.ollama_num_ctx,
+                **({"format": "json"} if json_mode else {}),
             )
         except Exception as e:
             logger.error(f"❌ Failed to initialize ChatOllama: {str(e)}", exc_info=True)
@@ -27,10 +47,12 @@ def get_llm(temperature: float = None):
                 openai_api_key="sk-proj-placeholder",
             )
     else:
-        logger.info(f"Using OpenAI model: {settings.llm_model}")
+        logger.info(f"Using OpenAI model: {openai_model}")
         return ChatOpenAI(
-            model=settings.llm_model,
+            model=openai_model,
             temperature=temp,
             max_tokens=settings.max_tokens,
             openai_api_key=settings.openai_api_key,
+            model_kwargs={"response_format": {"type": "json_object"}} if json_mode else {},
         )
+
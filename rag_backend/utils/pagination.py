@@ -0,0 +1,45 @@
+"""
+Курсоры для keyset-пагинации.
+Курсор — непрозрачная base64-строка с ключом последней выданной строки.
+"""
+
+from datetime import datetime
+from typing import Tuple
+import base64
+import json
+import uuid
+
+
+def encode_cursor(created_at: datetime, row_id: uuid.UUID | str) -> str:
+    """
+    Закодировать ключ (created_at, id) в курсор.
+
+    Args:
+        created_at: Время создания строки
+        row_id: ID строки
+
+    Returns:
+        str: Курсор
+    """
+    raw = json.dumps([created_at.isoformat(), str(row_id)])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """
+    Раскодировать курсор.
+
+    Args:
+        cursor: Курсор из encode_cursor
+
+    Returns:
+        Tuple[datetime, uuid.UUID]: Ключ (created_at, id)
+
+    Raises:
+        ValueError: Если курсор поврежден
+    """
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
@@ -0,0 +1,160 @@
+"""
+Раскладка промпта для переиспользования KV-кэша модели.
+Стабильные части (системный промпт, стратегия, паспорт) идут первыми,
+изменчивые (этап, RAG-контекст, история) — в конце.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import List, Dict, Any
+import hashlib
+
+from config.settings import settings
+from utils.chunking import get_token_count
+from utils.logger import logger
+
+
+@dataclass
+class PromptSegment:
+    """Фрагмент промпта"""
+    role: str
+    content: str
+    stable: bool
+
+
+@dataclass
+class PromptLayout:
+    """
+    Собирает сообщения для LLM так, чтобы байтово-стабильный префикс
+    не зависел от порядка добавления сегментов.
+    """
+    segments: List[PromptSegment] = field(default_factory=list)
+
+    def add_stable(self, role: str, content: str | None) -> "PromptLayout":
+        """Добавить сегмент, который не меняется между ходами треда."""
+        if content:
+            self.segments.append(PromptSegment(role=role, content=content, stable=True))
+        return self
+
+    def add_volatile(self, role: str, content: str | None) -> "PromptLayout":
+        """Добавить сегмент, который меняется от хода к ходу."""
+        if content:
+            self.segments.append(PromptSegment(role=role, content=content, stable=False))
+        return self
+
+    def _stable_messages(self) -> List[Dict[str, str]]:
+        """Стабильные сообщения: склеенный system-блок, затем прочие стабильные."""
+        messages = []
+        stable_system = [s.content for s in self.segments if s.stable and s.role == "system"]
+        if stable_system:
+            messages.append({"role": "system", "content": "\n\n".join(stable_system)})
+        messages.extend(
+            {"role": s.role, "content": s.content}
+            for s in self.segments if s.stable and s.role != "system"
+        )
+        return messages
+
+    def build(self) -> List[Dict[str, str]]:
+        """
+        Собрать сообщения: сначала стабильные сегменты, затем изменчивые.
+        Стабильные system-сегменты склеиваются в одно сообщение.
+
+        Returns:
+            List[Dict[str, str]]: Сообщения в формате role/content
+        """
+        return self._stable_messages() + [
+            {"role": s.role, "content": s.content}
+            for s in self.segments if not s.stable
+        ]
+
+    def stable_prefix(self) -> str:
+        """Текст стабильного префикса (в порядке сборки)."""
+        return "\n".join(f"{m['role']}:{m['content']}" for m in self._stable_messages())
+
+    def fingerprint(self) -> str:
+        """SHA-256 стабильного префикса."""
+        return hashlib.sha256(self.stable_prefix().encode("utf-8")).hexdigest()
+
+
+class PrefixCacheTracker:
+    """
+    Отслеживает стабильный префикс по тредам и оценивает,
+    сколько токенов prefill модель может не пересчитывать.
+    """
+
+    def __init__(self, max_threads: int | None = None):
+        self.max_threads = max_threads or settings.prompt_prefix_tracker_size
+        self._threads: OrderedDict[str, tuple[str, int]] = OrderedDict()
+        self._lock = Lock()
+        self.requests = 0
+        self.reused = 0
+        self.tokens_saved = 0
+
+    def record(self, thread_id: str, layout: PromptLayout) -> Dict[str, Any]:
+        """
+        Зафиксировать запрос треда и вернуть метрики префикса.
+
+        Args:
+            thread_id: ID треда
+            layout: Раскладка промпта текущего запроса
+
+        Returns:
+            Dict[str, Any]: stable_tokens, volatile_tokens, prefix_reused, prefill_tokens_saved
+        """
+        prefix = layout.stable_prefix()
+        fingerprint = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        stable_tokens = get_token_count(prefix) if prefix else 0
+        volatile_tokens = sum(
+            get_token_count(s.content) for s in layout.segments if not s.stable
+        )
+
+        with self._lock:
+            previous = self._threads.pop(thread_id, None)
+            self._threads[thread_id] = (fingerprint, stable_tokens)
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+
+            prefix_reused = previous is not None and previous[0] == fingerprint
+            saved = stable_tokens if prefix_reused else 0
+            self.requests += 1
+            self.reused += int(prefix_reused)
+            self.tokens_saved += saved
+
+        stats = {
+            "stable_tokens": stable_tokens,
+            "volatile_tokens": volatile_tokens,
+            "prefix_reused": prefix_reused,
+            "prefill_tokens_saved": saved,
+        }
+        logger.info(f"Prompt prefix stats for thread {thread_id}: {stats}")
+        return stats
+
+    def stats(self) -> Dict[str, Any]:
+        """Накопленные метрики по всем тредам."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "prefix_reused": self.reused,
+                "prefill_tokens_saved": self.tokens_saved,
+                "tracked_threads": len(self._threads),
+            }
+
+
+# Singleton instance
+_tracker: PrefixCacheTracker | None = None
+
+
+def get_prefix_tracker() -> PrefixCacheTracker:
+    """
+    Получить трекер префиксов (singleton).
+
+    Returns:
+        PrefixCacheTracker: Экземпляр трекера
+    """
+    global _tracker
+
+    if _tracker is None:
+        _tracker = PrefixCacheTracker()
+
+    return _tracker
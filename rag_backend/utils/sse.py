@@ -0,0 +1,163 @@
+"""
+Формирование SSE-потока.
+Токены склеиваются в кадры по интервалу или объему, события
+сериализуются быстрым JSON-кодировщиком (orjson, если установлен),
+при простое отправляется heartbeat, а при отключении клиента
+генератор событий отменяется (вместе с запуском графа).
+"""
+
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List
+import asyncio
+import json
+import time
+
+from config.settings import settings
+from utils.logger import logger
+
+try:
+    import orjson
+except ImportError:  # orjson опционален
+    orjson = None
+
+
+# SSE-комментарий: клиенты его игнорируют, прокси видят активность
+HEARTBEAT_FRAME = b": ping\n\n"
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+
+def encode_event(payload: Dict[str, Any]) -> bytes:
+    """
+    Сериализовать событие в SSE-кадр.
+
+    Args:
+        payload: Событие ({"type": ..., ...})
+
+    Returns:
+        bytes: Кадр "data: {json}\\n\\n"
+    """
+    if orjson is not None:
+        body = orjson.dumps(payload, default=str)
+    else:
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+    return b"data: " + body + b"\n\n"
+
+
+class TokenCoalescer:
+    """Буфер token-событий: отдает один кадр на пачку токенов."""
+
+    def __init__(self, flush_interval: float | None = None, flush_bytes: int | None = None):
+        self.flush_interval = (
+            flush_interval if flush_interval is not None else settings.sse_flush_interval_ms / 1000
+        )
+        self.flush_bytes = flush_bytes or settings.sse_flush_bytes
+        self._parts: List[str] = []
+        self._size = 0
+        self._started_at = 0.0
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._parts)
+
+    def add(self, content: str) -> bytes | None:
+        """Добавить токен; вернуть кадр, если набран порог по объему."""
+        if not self._parts:
+            self._started_at = time.monotonic()
+        self._parts.append(content)
+        self._size += len(content.encode("utf-8"))
+        if self._size >= self.flush_bytes:
+            return self.flush()
+        return None
+
+    def due_in(self) -> float | None:
+        """Через сколько секунд буфер нужно сбросить по времени (None — буфер пуст)."""
+        if not self._parts:
+            return None
+        return max(0.0, self._started_at + self.flush_interval - time.monotonic())
+
+    def flush(self) -> bytes:
+        """Отдать накопленные токены одним кадром (b"" — если буфер пуст)."""
+        if not self._parts:
+            return b""
+        frame = encode_event({"type": "token", "content": "".join(self._parts)})
+        self._parts = []
+        self._size = 0
+        return frame
+
+
+async def sse_stream(
+    events: AsyncIterator[Dict[str, Any]],
+    request: Any = None,
+    heartbeat_seconds: float | None = None,
+    coalescer: TokenCoalescer | None = None
+) -> AsyncGenerator[bytes, None]:
+    """
+    Превратить поток событий в SSE-кадры.
+
+    Args:
+        events: Асинхронный генератор событий-словарей
+        request: starlette Request — для проверки отключения клиента
+        heartbeat_seconds: Интервал heartbeat при простое
+        coalescer: Буфер токенов (по умолчанию из настроек)
+
+    Yields:
+        bytes: SSE-кадры
+    """
+    heartbeat_seconds = heartbeat_seconds or settings.sse_heartbeat_seconds
+    check_seconds = settings.sse_disconnect_check_seconds
+    coalescer = coalescer or TokenCoalescer()
+    iterator = events.__aiter__()
+    next_event: asyncio.Future | None = None
+    last_sent = time.monotonic()
+
+    try:
+        while True:
+            if next_event is None:
+                next_event = asyncio.ensure_future(iterator.__anext__())
+
+            timeout = min(heartbeat_seconds - (time.monotonic() - last_sent), check_seconds)
+            flush_due = coalescer.due_in()
+            if flush_due is not None:
+                timeout = min(timeout, flush_due)
+            await asyncio.wait({next_event}, timeout=max(0.0, timeout))
+
+            if request is not None and await request.is_disconnected():
+                logger.info("SSE client disconnected, cancelling stream")
+                return
+
+            frame = b""
+            if next_event.done():
+                finished, next_event = next_event, None
+                try:
+                    payload = finished.result()
+                except StopAsyncIteration:
+                    break
+                if payload.get("type") == "token":
+                    frame = coalescer.add(payload.get("content") or "") or b""
+                else:
+                    frame = coalescer.flush() + encode_event(payload)
+
+            if not frame and coalescer.due_in() == 0.0:
+                frame = coalescer.flush()
+            if not frame and time.monotonic() - last_sent >= heartbeat_seconds:
+                frame = HEARTBEAT_FRAME
+
+            if frame:
+                last_sent = time.monotonic()
+                yield frame
+
+        tail = coalescer.flush()
+        if tail:
+            yield tail
+    finally:
+        # Отмена ожидающего шага отменяет и работу внутри генератора событий (запуск графа)
+        if next_event is not None and not next_event.done():
+            next_event.cancel()
+            await asyncio.gather(next_event, return_exceptions=True)
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()